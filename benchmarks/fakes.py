@@ -0,0 +1,258 @@
+"""
+Stand-ins for the hardware facing modules (PyAudio, keyboard, pyautogui, pyperclip) so the
+real Recorder -> LocalTranscriber -> TextTyper -> HotkeyHandler path can run headless.
+
+install() has to be called before anything from src is imported.
+"""
+import collections
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+
+class FakeAudioSource:
+    # Feeds queued samples to the stream callback at ``speed`` times real time, silence when empty
+    def __init__(self, sample_rate=16000, speed=1.0):
+        self.sample_rate = sample_rate
+        self.speed = speed
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+        self.drained = threading.Event()
+        self.drained.set()
+
+    def queue(self, samples):
+        with self.lock:
+            self.pending.append(np.asarray(samples, dtype=np.int16))
+            self.drained.clear()
+
+    def read(self, frame_count):
+        out = np.zeros(frame_count, dtype=np.int16)
+        filled = 0
+        with self.lock:
+            while filled < frame_count and self.pending:
+                chunk = self.pending[0]
+                take = min(len(chunk), frame_count - filled)
+                out[filled:filled + take] = chunk[:take]
+                filled += take
+                if take == len(chunk):
+                    self.pending.popleft()
+                else:
+                    self.pending[0] = chunk[take:]
+            if not self.pending:
+                self.drained.set()
+        return out
+
+    def wait_drained(self, timeout=None):
+        return self.drained.wait(timeout)
+
+
+class FakeStream:
+    def __init__(self, source, callback, frames_per_buffer):
+        self.source = source
+        self.callback = callback
+        self.frames_per_buffer = frames_per_buffer
+        self.active = False
+        self.thread = None
+
+    def run(self):
+        block_seconds = self.frames_per_buffer / self.source.sample_rate / self.source.speed
+        next_time = time.monotonic()
+        while self.active:
+            data = self.source.read(self.frames_per_buffer)
+            self.callback(data.tobytes(), self.frames_per_buffer, None, 0)
+            next_time += block_seconds
+            time.sleep(max(next_time - time.monotonic(), 0))
+
+    def start_stream(self):
+        if not self.active:
+            self.active = True
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop_stream(self):
+        self.active = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.stop_stream()
+
+
+class FakeKeyboard:
+    # Only the parts of the keyboard module this project uses
+    def __init__(self):
+        self.hotkeys = []
+        self.hooks = []
+        self.pressed = set()
+        self.lock = threading.Lock()
+        self.KEY_DOWN = "down"
+        self.KEY_UP = "up"
+
+    def add_hotkey(self, hotkey, callback, suppress=False, trigger_on_release=False):
+        handle = (hotkey.lower(), callback, trigger_on_release)
+        with self.lock:
+            self.hotkeys.append(handle)
+        return handle
+
+    def remove_hotkey(self, handle):
+        with self.lock:
+            if handle in self.hotkeys:
+                self.hotkeys.remove(handle)
+
+    def unhook_all_hotkeys(self):
+        with self.lock:
+            self.hotkeys = []
+
+    def hook(self, callback):
+        with self.lock:
+            self.hooks.append(callback)
+        return callback
+
+    def unhook(self, callback):
+        with self.lock:
+            if callback in self.hooks:
+                self.hooks.remove(callback)
+
+    def unhook_all(self):
+        with self.lock:
+            self.hotkeys = []
+            self.hooks = []
+
+    def is_pressed(self, hotkey):
+        return hotkey.lower() in self.pressed
+
+    def get_hotkey_name(self, names):
+        return "+".join(sorted(names))
+
+    def trigger(self, hotkey, release, timeout=5.0):
+        # Hotkeys may be re-registered at any moment, wait until one is there
+        hotkey = hotkey.lower()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                callbacks = [callback for key, callback, on_release in self.hotkeys
+                             if key == hotkey and on_release == release]
+            if callbacks or time.monotonic() > deadline:
+                break
+            time.sleep(0.001)
+        if release:
+            self.pressed.discard(hotkey)
+        else:
+            self.pressed.add(hotkey)
+        for callback in callbacks:
+            callback()
+
+    def press(self, hotkey):
+        self.trigger(hotkey, release=False)
+
+    def release(self, hotkey):
+        self.trigger(hotkey, release=True)
+
+
+class FakeScreenOutput:
+    # Collects everything "typed" together with monotonic timestamps
+    def __init__(self, clipboard):
+        self.clipboard = clipboard
+        self.events = []
+        self.lock = threading.Lock()
+        self.PAUSE = 0
+
+    def record(self, text):
+        with self.lock:
+            self.events.append((time.monotonic(), text))
+
+    def write(self, text, interval=0.0):
+        self.record(text)
+
+    def typewrite(self, text, interval=0.0):
+        self.record(text)
+
+    def press(self, keys, presses=1, interval=0.0):
+        self.record("")
+
+    def hotkey(self, *keys):
+        if keys and keys[-1] == "v":
+            self.record(self.clipboard.text)
+        else:
+            self.record("")
+
+    def take_events(self):
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+
+class FakeClipboard:
+    def __init__(self):
+        self.text = ""
+
+    def copy(self, text):
+        self.text = text
+
+    def paste(self):
+        return self.text
+
+
+def install(speed=1.0):
+    source = FakeAudioSource(speed=speed)
+
+    pyaudio = types.ModuleType("pyaudio")
+    pyaudio.paInt16 = 8
+    pyaudio.paContinue = 0
+
+    class PyAudio:
+        def open(self, format=None, channels=1, rate=16000, input=True, frames_per_buffer=1024,
+                 stream_callback=None, start=True, input_device_index=None):
+            stream = FakeStream(source, stream_callback, frames_per_buffer)
+            if start:
+                stream.start_stream()
+            return stream
+
+        def get_sample_size(self, format):
+            return 2
+
+        def get_device_count(self):
+            return 1
+
+        def get_device_info_by_index(self, index):
+            return {"index": 0, "name": "Fake microphone", "maxInputChannels": 1, "defaultSampleRate": 16000.0}
+
+        def get_default_input_device_info(self):
+            return self.get_device_info_by_index(0)
+
+        def terminate(self):
+            pass
+
+    pyaudio.PyAudio = PyAudio
+
+    keyboard = FakeKeyboard()
+    keyboard_module = types.ModuleType("keyboard")
+    for name in ("add_hotkey", "remove_hotkey", "unhook_all_hotkeys", "hook", "unhook", "unhook_all",
+                 "is_pressed", "get_hotkey_name"):
+        setattr(keyboard_module, name, getattr(keyboard, name))
+    keyboard_module.KEY_DOWN = keyboard.KEY_DOWN
+    keyboard_module.KEY_UP = keyboard.KEY_UP
+
+    clipboard = FakeClipboard()
+    pyperclip = types.ModuleType("pyperclip")
+    pyperclip.copy = clipboard.copy
+    pyperclip.paste = clipboard.paste
+    pyperclip.PyperclipException = RuntimeError
+
+    screen = FakeScreenOutput(clipboard)
+    pyautogui = types.ModuleType("pyautogui")
+    pyautogui.PAUSE = 0
+    for name in ("write", "typewrite", "press", "hotkey"):
+        setattr(pyautogui, name, getattr(screen, name))
+
+    sys.modules["pyaudio"] = pyaudio
+    sys.modules["keyboard"] = keyboard_module
+    sys.modules["pyperclip"] = pyperclip
+    sys.modules["pyautogui"] = pyautogui
+    return source, keyboard, screen
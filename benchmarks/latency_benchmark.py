@@ -0,0 +1,305 @@
+"""
+End-to-end latency benchmark for Recorder -> LocalTranscriber -> TextTyper -> HotkeyHandler.
+
+Runs headless: PyAudio, keyboard, pyautogui and pyperclip are replaced by the stand-ins in
+fakes.py, WAV fixtures are fed through the real audio callback and every typed character is
+timestamped. Results are written as JSON so builds can be compared.
+
+    python benchmarks/latency_benchmark.py --mock --output bench.json
+    python benchmarks/latency_benchmark.py --models tiny:int8 base:int8 --fixtures path/to/wavs
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+import fakes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_RATE = 16000
+
+
+def load_wav(path):
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM fixtures are supported")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples.astype(np.int16)
+
+
+def synthesize_fixtures(directory, durations=(2, 6, 15)):
+    # Noise bursts with pauses in between, only meaningful together with --mock
+    rng = np.random.default_rng(0)
+    paths = []
+    for duration in durations:
+        pieces = []
+        remaining = duration
+        while remaining > 0:
+            burst = min(rng.uniform(0.8, 2.5), remaining)
+            pieces.append(rng.standard_normal(int(burst * SAMPLE_RATE)) * 0.2)
+            pause = min(rng.uniform(0.2, 0.7), max(remaining - burst, 0))
+            pieces.append(rng.standard_normal(int(pause * SAMPLE_RATE)) * 0.002)
+            remaining -= burst + pause
+        samples = (np.clip(np.concatenate(pieces), -1, 1) * 32767).astype(np.int16)
+        path = os.path.join(directory, f"synthetic_{duration}s.wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(samples.tobytes())
+        paths.append(path)
+    return paths
+
+
+def expected_text(path, duration, words_per_second=2.5):
+    # A sidecar .txt next to the fixture holds its transcript, otherwise make one up of the right length
+    sidecar = os.path.splitext(path)[0] + ".txt"
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            return f.read().strip()
+    words = max(int(duration * words_per_second), 1)
+    return " ".join(f"word{i}" for i in range(words))
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "count": int(len(values)),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def build_id():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def instrument(transcriber, decode_stats):
+    # Wrap the transcriber so the real-time factor of every decode is recorded
+    transcribe_audio = transcriber.transcribe_audio
+    finish_streaming = transcriber.finish_streaming
+
+    def timed_transcribe(audio, *args, **kwargs):
+        start = time.perf_counter()
+        text = transcribe_audio(audio, *args, **kwargs)
+        decode_stats.append((len(audio) / SAMPLE_RATE, time.perf_counter() - start))
+        return text
+
+    def timed_finish(session, audio, *args, **kwargs):
+        start = time.perf_counter()
+        text = finish_streaming(session, audio, *args, **kwargs)
+        decode_stats.append((len(audio) / SAMPLE_RATE, time.perf_counter() - start))
+        return text
+
+    transcriber.transcribe_audio = timed_transcribe
+    transcriber.finish_streaming = timed_finish
+
+
+def make_mock_transcriber(real_time_factor):
+    from src.transcriber import Transcriber
+
+    class MockTranscriber(Transcriber):
+        # Deterministic stand-in for the model: sleeps in proportion to the audio and returns next_text
+        def __init__(self):
+            self.next_text = ""
+
+        def transcribe_audio(self, audio, trace=None):
+            time.sleep(len(audio) / SAMPLE_RATE * real_time_factor)
+            return self.next_text + " " if self.next_text else ""
+
+        def set_backend(self, backend):
+            pass
+
+        def stop(self):
+            pass
+
+    return MockTranscriber()
+
+
+def run_utterance(source, keyboard, screen, ready, samples, hotkey, timeout):
+    # One second of silence first so the pre-roll is filled like it would be in real use
+    source.queue(np.zeros(SAMPLE_RATE, dtype=np.int16))
+    source.wait_drained()
+    screen.take_events()
+    ready.clear()
+
+    keyboard.press(hotkey)
+    source.queue(samples)
+    source.wait_drained()
+    release_time = time.monotonic()
+    keyboard.release(hotkey)
+    finished = ready.wait(timeout)
+    done_time = time.monotonic()
+
+    events = [(timestamp, text) for timestamp, text in screen.take_events() if text]
+    result = {
+        "audio_seconds": len(samples) / SAMPLE_RATE,
+        "timed_out": not finished,
+        "release_to_done": done_time - release_time,
+        "release_to_first_char": None,
+        "typed_chars": sum(len(text) for _, text in events),
+        "typing_chars_per_second": None,
+    }
+    if events:
+        result["release_to_first_char"] = events[0][0] - release_time
+        typing_time = events[-1][0] - events[0][0]
+        if typing_time > 0:
+            result["typing_chars_per_second"] = result["typed_chars"] / typing_time
+    return result
+
+
+def run_config(name, transcriber, fixtures, args, source, keyboard, screen):
+    from src.hotkeyhandler import HotkeyHandler
+    from src.recorder import Recorder
+    from src.texttyper import TextTyper
+    from src.whisperqueue import WhisperQueue
+
+    # Only needs to know when the pipeline went idle
+    message_queue = WhisperQueue(log_messages=False)
+    ready = threading.Event()
+    message_queue.subscribe(lambda message: ready.set() if message.status == "ready" else None)
+    decode_stats = []
+    instrument(transcriber, decode_stats)
+    recorder = Recorder(buffer=True, message_queue=message_queue)
+    text_typer = TextTyper(output_mode=args.output_mode, paste_threshold=args.paste_threshold, delay=args.typing_delay)
+    handler = HotkeyHandler(hotkey=args.hotkey, retype_hotkey="f2", recorder=recorder, transcriber=transcriber,
+                            texttyper=text_typer, message_queue=message_queue, streaming=args.streaming,
+                            trace_file=args.trace_file)
+
+    utterances = []
+    try:
+        for repeat in range(args.warmup + args.repeats):
+            for path, samples in fixtures:
+                if hasattr(transcriber, "next_text"):
+                    transcriber.next_text = expected_text(path, len(samples) / SAMPLE_RATE)
+                result = run_utterance(source, keyboard, screen, ready, samples, args.hotkey, args.timeout)
+                if repeat >= args.warmup:
+                    result["fixture"] = os.path.basename(path)
+                    utterances.append(result)
+    finally:
+        handler.stop()
+
+    decode_stats = decode_stats[len(fixtures) * args.warmup:]
+    return {
+        "transcriber": name,
+        "release_to_first_char": percentiles([u["release_to_first_char"] for u in utterances
+                                              if u["release_to_first_char"] is not None]),
+        "release_to_done": percentiles([u["release_to_done"] for u in utterances]),
+        "real_time_factor": percentiles([elapsed / seconds for seconds, elapsed in decode_stats if seconds > 0]),
+        "typing_chars_per_second": percentiles([u["typing_chars_per_second"] for u in utterances
+                                                if u["typing_chars_per_second"] is not None]),
+        "typing_backend": text_typer.backend.metrics.as_dict(),
+        "timeouts": sum(u["timed_out"] for u in utterances),
+        "peak_rss_mb": peak_rss_mb(),
+        "utterances": utterances,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end latency benchmark.')
+    parser.add_argument('--fixtures', type=str, default=None,
+                        help='Directory of 16-bit WAV fixtures (synthetic noise fixtures are generated if omitted)')
+    parser.add_argument('--models', nargs='*', default=[],
+                        help='Model configurations as model_size:compute_type, e.g. tiny:int8 base:float32')
+    parser.add_argument('--mock', action='store_true', default=False,
+                        help='Benchmark with a deterministic mock transcriber instead of a model')
+    parser.add_argument('--mock_rtf', type=float, default=0.05, help='Real-time factor the mock transcriber simulates')
+    parser.add_argument('--device', type=str, default='cpu', help='Device to run the models on')
+    parser.add_argument('--cpu_threads', type=int, default=0, help='CPU threads per model (0 = library default)')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed passes over all fixtures')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed passes over all fixtures')
+    parser.add_argument('--speed', type=float, default=4.0, help='How much faster than real time audio is fed')
+    parser.add_argument('--streaming', action='store_true', default=False, help='Benchmark streaming transcription')
+    parser.add_argument('--output_mode', type=str, default='type', choices=['type', 'paste'])
+    parser.add_argument('--paste_threshold', type=int, default=0)
+    parser.add_argument('--typing_delay', type=str, default='human', choices=['human', 'none'])
+    parser.add_argument('--hotkey', type=str, default='f4')
+    parser.add_argument('--timeout', type=float, default=300, help='Seconds to wait for one utterance')
+    parser.add_argument('--trace_file', type=str, default=None, help='Also write per-utterance stage traces here')
+    parser.add_argument('--output', type=str, default=None, help='Write the JSON results here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', default=False, help='Show the application output')
+    args = parser.parse_args()
+
+    source, keyboard, screen = fakes.install(speed=args.speed)
+    sys.path.insert(0, ROOT)
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        if args.fixtures:
+            paths = sorted(os.path.join(args.fixtures, name) for name in os.listdir(args.fixtures)
+                           if name.lower().endswith(".wav"))
+        else:
+            paths = synthesize_fixtures(fixture_dir)
+        fixtures = [(path, load_wav(path)) for path in paths]
+
+        configs = []
+        if args.mock or not args.models:
+            configs.append(("mock", lambda: make_mock_transcriber(args.mock_rtf)))
+        for spec in args.models:
+            model_size, _, compute_type = spec.partition(":")
+
+            def make_local(model_size=model_size, compute_type=compute_type or "int8"):
+                from src.localtranscriber import LocalTranscriber
+                transcriber = LocalTranscriber(model_size=model_size, compute_type=compute_type, language="en",
+                                               device=args.device, cpu_threads=args.cpu_threads, vad_filter=False)
+                transcriber.start()
+                return transcriber
+
+            configs.append((f"{model_size}:{compute_type or 'int8'}", make_local))
+
+        results = []
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            for name, factory in configs:
+                results.append(run_config(name, factory(), fixtures, args, source, keyboard, screen))
+
+    report = {
+        "build": build_id(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "verbose")},
+        "fixtures": [{"name": os.path.basename(path), "seconds": len(samples) / SAMPLE_RATE}
+                     for path, samples in fixtures],
+        "configs": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
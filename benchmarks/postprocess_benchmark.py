@@ -0,0 +1,134 @@
+"""
+Benchmark for the transcript post-processor (spoken commands and replacements) with large rule sets.
+
+Generates random replacement dictionaries of increasing size and measures how long it takes to
+compile them, to process whole transcripts and to feed a transcript word by word as live typing
+does. For comparison the same rules are also applied the straightforward way, one regular
+expression per rule. Results are written as JSON so builds can be compared.
+
+    python benchmarks/postprocess_benchmark.py --rules 100 1000 10000 100000 --output post.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+
+from latency_benchmark import ROOT, build_id, peak_rss_mb, percentiles
+
+
+def random_word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+
+
+def make_rules(count, rng):
+    # Phrases of one to four words, like a domain vocabulary
+    rules = {}
+    while len(rules) < count:
+        phrase = " ".join(random_word(rng) for _ in range(rng.randint(1, 4)))
+        rules[phrase] = phrase.title().replace(" ", "")
+    return rules
+
+
+def make_transcripts(rules, count, words, rng, match_rate=0.1):
+    phrases = list(rules)
+    commands = ["new line", "period", "comma", "delete that", "cap next"]
+    transcripts = []
+    for _ in range(count):
+        parts = []
+        while len(parts) < words:
+            roll = rng.random()
+            if roll < match_rate:
+                parts.append(rng.choice(phrases))
+            elif roll < match_rate * 1.5:
+                parts.append(rng.choice(commands))
+            else:
+                parts.append(random_word(rng) + rng.choice(["", "", "", ",", "."]))
+        transcripts.append(" ".join(parts))
+    return transcripts
+
+
+def naive_process(patterns, text):
+    for pattern, replacement in patterns:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def time_calls(function, items):
+    seconds = []
+    for item in items:
+        start = time.perf_counter()
+        function(item)
+        seconds.append((time.perf_counter() - start) * 1000)
+    return percentiles(seconds)
+
+
+def run_rule_count(count, args, rng):
+    from src.postprocessor import PostProcessor
+
+    rules = make_rules(count, rng)
+    transcripts = make_transcripts(rules, args.transcripts, args.words, rng)
+    start = time.perf_counter()
+    processor = PostProcessor(rules, spoken_commands=True)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def stream(text):
+        # One feed per word, like committed words in live typing
+        session = processor.session()
+        words = text.split()
+        for index, word in enumerate(words):
+            session.feed(word + " ", final=index == len(words) - 1)
+
+    result = {
+        "rules": count,
+        "build_ms": build_ms,
+        "automaton_states": len(processor.automaton.goto),
+        "process_ms": time_calls(processor.process, transcripts),
+        "stream_ms": time_calls(stream, transcripts),
+    }
+    if count <= args.naive_limit:
+        start = time.perf_counter()
+        patterns = [(re.compile(r"\b" + re.escape(phrase) + r"\b", re.IGNORECASE), replacement)
+                    for phrase, replacement in rules.items()]
+        result["naive_build_ms"] = (time.perf_counter() - start) * 1000
+        result["naive_process_ms"] = time_calls(lambda text: naive_process(patterns, text), transcripts)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Post-processing benchmark with large rule sets.')
+    parser.add_argument('--rules', nargs='+', type=int, default=[100, 1000, 10000, 100000],
+                        help='Replacement dictionary sizes to benchmark')
+    parser.add_argument('--transcripts', type=int, default=50, help='Transcripts per dictionary size')
+    parser.add_argument('--words', type=int, default=200, help='Words per transcript')
+    parser.add_argument('--naive_limit', type=int, default=10000,
+                        help='Largest dictionary also run with one regular expression per rule')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help='Write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+
+    rng = random.Random(args.seed)
+    results = [run_rule_count(count, args, rng) for count in args.rules]
+    report = {
+        "build": build_id(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
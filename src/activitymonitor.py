@@ -0,0 +1,60 @@
+import contextlib
+import threading
+import time
+
+import keyboard
+
+
+class ActivityMonitor:
+    """
+    Counts key presses the user made, as opposed to the keystrokes TextTyper sends.
+
+    Our own keystrokes also reach the keyboard hook, sometimes a little late, so everything
+    seen while TextTyper is producing output and for ``grace_seconds`` afterwards is ignored.
+    So are the application's hotkeys (see set_hotkeys), pressing them doesn't type anything.
+    """
+
+    def __init__(self, grace_seconds=0.2):
+        self.grace_seconds = grace_seconds
+        # (hotkey, its keys, its last key) for every hotkey of the application
+        self.hotkeys = []
+        self.user_serial = 0
+        self.output_depth = 0
+        self.output_until = 0.0
+        self.lock = threading.Lock()
+        self.hook = keyboard.hook(self.on_event)
+
+    @contextlib.contextmanager
+    def output(self):
+        with self.lock:
+            self.output_depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.output_depth -= 1
+                self.output_until = time.monotonic() + self.grace_seconds
+
+    def set_hotkeys(self, *hotkeys):
+        hotkeys = [(hotkey, [key.strip().lower() for key in hotkey.split("+")]) for hotkey in hotkeys if hotkey]
+        self.hotkeys = [(hotkey, set(keys), keys[-1]) for hotkey, keys in hotkeys]
+
+    def is_hotkey(self, event):
+        name = (event.name or "").lower()
+        for hotkey, keys, last_key in self.hotkeys:
+            # Modifiers of a hotkey on their own, its last key only while the whole combination is held
+            if name in keys and (name != last_key or keyboard.is_pressed(hotkey)):
+                return True
+        return False
+
+    def on_event(self, event):
+        if event.event_type != keyboard.KEY_DOWN or self.is_hotkey(event):
+            return
+        with self.lock:
+            if self.output_depth == 0 and time.monotonic() > self.output_until:
+                self.user_serial += 1
+
+    def stop(self):
+        if self.hook is not None:
+            keyboard.unhook(self.hook)
+            self.hook = None
@@ -0,0 +1,101 @@
+import tempfile
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Preallocated float32 sample buffer behind the Recorder.
+
+    While idle it keeps only the last ``preroll_seconds`` of audio, while capturing it grows
+    to hold the whole utterance. Instead of wrapping around, the live region slides towards
+    the end of the array and is moved back to the front once the end is reached, so the
+    captured audio is always one contiguous block that can be handed out as a view.
+
+    A capture that outgrows ``ram_budget_mb`` continues in a memory-mapped temporary file, which
+    the OS can write out instead of swapping. Once a capture holds ``max_seconds`` of audio,
+    further samples are dropped and ``limit_reached`` is set.
+    """
+
+    def __init__(self, sample_rate=16000, preroll_seconds=1.0, initial_seconds=30, ram_budget_mb=0, max_seconds=0):
+        self.sample_rate = sample_rate
+        self.preroll_samples = int(preroll_seconds * sample_rate)
+        self.initial_capacity = max(int(initial_seconds * sample_rate), 4 * self.preroll_samples, 1)
+        self.ram_budget_samples = int(ram_budget_mb * 1024 * 1024 / 4) if ram_budget_mb else None
+        self.max_samples = int(max_seconds * sample_rate) if max_seconds else None
+        self.data = np.empty(self.initial_capacity, dtype=np.float32)
+        self.start = 0
+        self.end = 0
+        self.recording = False
+        self.spilled = False
+        self.limit_reached = False
+
+    def __len__(self):
+        return self.end - self.start
+
+    def write(self, samples):
+        if self.recording and self.max_samples is not None and self.end - self.start + len(samples) > self.max_samples:
+            self.limit_reached = True
+            samples = samples[:max(self.max_samples - (self.end - self.start), 0)]
+        n = len(samples)
+        if self.end + n > len(self.data):
+            self._make_room(n)
+        scale = 1.0 / 32768.0 if samples.dtype == np.int16 else 1.0
+        # Convert straight into the preallocated slot, no temporary arrays in the audio thread
+        written = self.data[self.end:self.end + n]
+        np.multiply(samples, scale, out=written, dtype=np.float32)
+        self.end += n
+        if not self.recording and self.end - self.start > self.preroll_samples:
+            self.start = self.end - self.preroll_samples
+        return written
+
+    def _make_room(self, n):
+        length = self.end - self.start
+        if self.recording or length + n > len(self.data) // 2:
+            # Grow into a fresh array so views already handed out by snapshot() stay valid
+            capacity = max(2 * len(self.data), length + n)
+            if self.recording and self.max_samples is not None:
+                capacity = max(min(capacity, self.max_samples), length + n)
+            new_data = self.allocate(capacity)
+            new_data[:length] = self.data[self.start:self.end]
+            self.data = new_data
+        else:
+            # Idle pre-roll only: slide the last few samples back to the front
+            self.data[:length] = self.data[self.start:self.end]
+        self.start = 0
+        self.end = length
+
+    def allocate(self, capacity):
+        if self.ram_budget_samples is None or capacity <= self.ram_budget_samples:
+            return np.empty(capacity, dtype=np.float32)
+        self.spilled = True
+        if self.max_samples is not None:
+            # Room for the whole capture at once, so it is never copied from file to file
+            capacity = max(capacity, self.max_samples)
+        # The file is sparse and already unlinked, the mapping keeps its own handle after it is closed
+        with tempfile.TemporaryFile(prefix="capture-") as f:
+            return np.memmap(f, dtype=np.float32, mode="w+", shape=(capacity,))
+
+    def start_capture(self, keep_preroll=True):
+        if not keep_preroll:
+            self.start = self.end
+        self.recording = True
+
+    def snapshot(self):
+        # Zero-copy view of everything captured so far
+        return self.data[self.start:self.end]
+
+    def stop_capture(self):
+        # Hand the backing array over to the caller and start the next capture in a new one
+        audio = self.data[self.start:self.end]
+        self.data = np.empty(self.initial_capacity, dtype=np.float32)
+        self.start = 0
+        self.end = 0
+        self.recording = False
+        self.spilled = False
+        self.limit_reached = False
+        return audio
+
+    def clear(self):
+        self.start = 0
+        self.end = 0
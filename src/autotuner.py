@@ -0,0 +1,223 @@
+import concurrent.futures
+import gc
+import os
+import platform
+import re
+import statistics
+import time
+
+import numpy as np
+
+from .startupprofile import lazy_import
+
+faster_whisper = lazy_import("faster_whisper")
+ctranslate2 = lazy_import("ctranslate2")
+
+SAMPLE_RATE = 16000
+# In order of preference when two candidates are equally fast
+COMPUTE_TYPES = {
+    "cpu": ["int8", "int8_float32", "int16", "float32"],
+    "cuda": ["int8_float16", "float16", "int8", "int8_float32", "float32"],
+}
+# The most precise type, its transcript is the reference when no reference text is given
+REFERENCE_COMPUTE_TYPE = "float32"
+# Recordings transcribed at once in every round, like two utterances waiting in the pipeline
+BURST = 2
+
+
+def default_compute_type(device):
+    return "int8" if device == "cpu" else "float16"
+
+
+def cpu_name():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def hardware_id(device):
+    # Tuning results only carry over to the same processor, core count and device
+    hardware = f"{cpu_name()} x{os.cpu_count()}"
+    if device != "cpu":
+        hardware += f" {device}"
+    return hardware
+
+
+def tuning_key(model_size, device):
+    return f"{model_size}|{hardware_id(device)}"
+
+
+def tuned_settings(config_manager, model_size, device):
+    # The stored compute_type, cpu_threads and num_workers for this model and machine, None if not tuned yet
+    return (config_manager.get_setting("autotune") or {}).get(tuning_key(model_size, device))
+
+
+def save_tuning(config_manager, model_size, device, result):
+    tunings = dict(config_manager.get_setting("autotune") or {})
+    tunings[tuning_key(model_size, device)] = result
+    config_manager.update_setting("autotune", tunings)
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    reference = normalize_words(reference)
+    hypothesis = normalize_words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    # Word level edit distance, one row at a time
+    previous = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, 1):
+        current = [i]
+        for j, other in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def synthetic_clip(seconds=8.0):
+    # Voiced, speech-like bursts with pauses. Only good for timing, pass a real recording to check accuracy
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 1.5 * t), 0, None)
+    noise = np.random.default_rng(0).normal(0, 0.01, len(t))
+    return (0.1 * voice * envelope + noise).astype(np.float32)
+
+
+def load_clip(path=None):
+    if path is None:
+        return synthetic_clip()
+    return faster_whisper.decode_audio(path, sampling_rate=SAMPLE_RATE)
+
+
+def candidate_threads(device):
+    # cpu_threads is per worker, so more workers split the cores between them
+    if device != "cpu":
+        return [(0, 1), (0, 2)]
+    cores = os.cpu_count() or 1
+    combinations = []
+    for workers in (1, 2):
+        for threads in (cores // workers, cores // (2 * workers)):
+            if threads >= 1 and (threads, workers) not in combinations:
+                combinations.append((threads, workers))
+    return combinations
+
+
+def transcribe(model, audio, language):
+    # Fixed temperature, fallbacks on one candidate but not another would make the timings incomparable
+    segments, _ = model.transcribe(audio, language=language, vad_filter=False, without_timestamps=True,
+                                   temperature=0.0)
+    return "".join(segment.text for segment in segments).strip()
+
+
+def timed_transcribe(model, audio, language):
+    start = time.perf_counter()
+    transcribe(model, audio, language)
+    return time.perf_counter() - start
+
+
+def measure(model_size, device, compute_type, cpu_threads, num_workers, audio, language, repeats):
+    """
+    Load the model with these settings and time transcriptions of ``audio``.
+
+    Every round transcribes the clip alone and then ``BURST`` copies at once, so extra workers
+    are only chosen when they help with recordings that queue up.
+
+    :return: The transcript and the mean latency in seconds.
+    """
+    model = faster_whisper.WhisperModel(model_size, device=device, compute_type=compute_type,
+                                        cpu_threads=cpu_threads, num_workers=num_workers)
+    try:
+        # Also the warm up run
+        text = transcribe(model, audio, language)
+        latencies = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=BURST) as executor:
+            for _ in range(repeats):
+                latencies.append(timed_transcribe(model, audio, language))
+                burst = [executor.submit(timed_transcribe, model, audio, language) for _ in range(BURST)]
+                latencies.extend(future.result() for future in burst)
+    finally:
+        del model
+        gc.collect()
+    return text, statistics.mean(latencies)
+
+
+def transcribe_reference(model_size, device, compute_type, audio, language):
+    model = faster_whisper.WhisperModel(model_size, device=device, compute_type=compute_type)
+    try:
+        return transcribe(model, audio, language)
+    finally:
+        del model
+        gc.collect()
+
+
+def autotune(model_size, device, language="en", clip=None, reference_text=None, tolerance=0.05, repeats=3,
+             message_queue=None):
+    """
+    Find the fastest compute_type, cpu_threads and num_workers for ``model_size`` on this machine.
+
+    All supported compute types are timed first, then the thread and worker combinations of the
+    fastest one. Candidates whose transcript differs from the reference by more than ``tolerance``
+    (word error rate) are never picked.
+
+    :param clip: Audio file to benchmark on, a synthetic clip is used if not given.
+    :param reference_text: Correct transcript of ``clip``, by default the float32 transcript.
+    :return: The chosen settings and all measurements.
+    """
+    def report(message):
+        print(message)
+        if message_queue is not None:
+            message_queue.send_message("info", "Autotuner", message)
+
+    audio = load_clip(clip)
+    supported = ctranslate2.get_supported_compute_types(device)
+    compute_types = [compute_type for compute_type in COMPUTE_TYPES.get(device, COMPUTE_TYPES["cuda"])
+                     if compute_type in supported]
+    combinations = candidate_threads(device)
+    if reference_text is None:
+        reference_text = transcribe_reference(model_size, device, REFERENCE_COMPUTE_TYPE, audio, language)
+        if not normalize_words(reference_text):
+            report("No speech in the reference transcript, only the speed is compared")
+    measurements = []
+
+    def run(compute_type, cpu_threads, num_workers):
+        try:
+            text, latency = measure(model_size, device, compute_type, cpu_threads, num_workers, audio, language,
+                                    repeats)
+        except (ValueError, RuntimeError) as e:
+            report(f"{compute_type}, {cpu_threads} threads, {num_workers} workers: failed ({e})")
+            return
+        measurements.append({"compute_type": compute_type, "cpu_threads": cpu_threads, "num_workers": num_workers,
+                             "latency_seconds": round(latency, 4),
+                             "word_error_rate": round(word_error_rate(reference_text, text), 4)})
+        report(f"{compute_type}, {cpu_threads} threads, {num_workers} workers: {latency * 1000:.0f} ms, "
+               f"WER {measurements[-1]['word_error_rate']:.1%}")
+
+    def fastest():
+        accurate = [m for m in measurements if m["word_error_rate"] <= tolerance]
+        if not accurate:
+            raise RuntimeError("No compute type transcribed the clip within the accuracy tolerance")
+        return min(accurate, key=lambda m: m["latency_seconds"])
+
+    # Same threads and workers for every type first, the other combinations only for the fastest type
+    for compute_type in compute_types:
+        run(compute_type, *combinations[0])
+    fastest_type = fastest()["compute_type"]
+    for cpu_threads, num_workers in combinations[1:]:
+        run(fastest_type, cpu_threads, num_workers)
+
+    best = fastest()
+    result = {key: best[key] for key in ("compute_type", "cpu_threads", "num_workers", "latency_seconds",
+                                         "word_error_rate")}
+    report(f"Fastest for {model_size} on {hardware_id(device)}: {result['compute_type']}, "
+           f"{result['cpu_threads']} threads, {result['num_workers']} workers")
+    return result, measurements
@@ -0,0 +1,131 @@
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".webm", ".opus")
+SAMPLE_RATE = 16000
+
+# One transcriber per worker process, created by init_worker
+worker_transcriber = None
+
+
+def find_audio_files(files=None, directory=None):
+    paths = [os.path.abspath(path) for path in files or []]
+    if directory:
+        for root, _, names in os.walk(directory):
+            paths.extend(os.path.abspath(os.path.join(root, name)) for name in names
+                         if name.lower().endswith(AUDIO_EXTENSIONS))
+    return sorted(set(paths))
+
+
+def completed_files(output_path):
+    # Files that already have a result in the output of an earlier, interrupted run
+    done = set()
+    if not output_path or not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Half-written last line of a run that was killed
+                continue
+            if "error" not in record:
+                done.add(record.get("file"))
+    return done
+
+
+def init_worker(model_size, compute_type, language, device, cpu_threads):
+    global worker_transcriber
+    from .localtranscriber import LocalTranscriber
+    worker_transcriber = LocalTranscriber(model_size=model_size, compute_type=compute_type, language=language,
+                                          device=device, cpu_threads=cpu_threads)
+    worker_transcriber.start()
+
+
+def transcribe_file(path):
+    from faster_whisper import decode_audio
+    try:
+        audio = decode_audio(path, sampling_rate=SAMPLE_RATE)
+        duration = len(audio) / SAMPLE_RATE
+        start = time.perf_counter()
+        text = worker_transcriber.transcribe_audio(audio)
+        seconds = time.perf_counter() - start
+    except Exception as e:
+        return {"file": path, "error": str(e), "worker": os.getpid()}
+    return {
+        "file": path,
+        "text": text.strip(),
+        "audio_seconds": round(duration, 3),
+        "transcribe_seconds": round(seconds, 3),
+        "real_time_factor": round(seconds / duration, 4) if duration > 0 else None,
+        "worker": os.getpid(),
+    }
+
+
+def run_bulk(paths, model_size, compute_type, language, device, workers=1, cpu_threads=0, output=None,
+             resume=False):
+    """
+    Transcribe audio files on a pool of worker processes, each with its own model.
+
+    Results are written as one JSON line per file as soon as that file is done, so an
+    interrupted run can be resumed: with ``resume`` the files already in ``output`` are skipped.
+
+    :param cpu_threads: Threads per worker, 0 splits the cores evenly between the workers.
+    :return: Summary of the run.
+    """
+    workers = max(workers, 1)
+    if cpu_threads <= 0:
+        cpu_threads = max((os.cpu_count() or 1) // workers, 1)
+    skipped = 0
+    if resume:
+        done = completed_files(output)
+        skipped = len([path for path in paths if path in done])
+        paths = [path for path in paths if path not in done]
+    print(f"Transcribing {len(paths)} files ({skipped} already done) with {workers} workers, "
+          f"{cpu_threads} threads each", file=sys.stderr)
+
+    out = open(output, "a" if resume else "w", encoding="utf-8") if output else sys.stdout
+    audio_seconds = 0.0
+    errors = 0
+    start = time.perf_counter()
+    # spawn, so no worker inherits threads or locks from this process
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker,
+        initargs=(model_size, compute_type, language, device, cpu_threads))
+    interrupted = False
+    try:
+        futures = [executor.submit(transcribe_file, path) for path in paths]
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if "error" in record:
+                errors += 1
+            else:
+                audio_seconds += record["audio_seconds"]
+    except KeyboardInterrupt:
+        print("Interrupted, run again with --resume to continue.", file=sys.stderr)
+        interrupted = True
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        if not interrupted:
+            # Waiting here would hold up Ctrl + C until every running file is done
+            executor.shutdown(wait=True, cancel_futures=True)
+        if out is not sys.stdout:
+            out.close()
+    wall_seconds = time.perf_counter() - start
+    summary = {
+        "files": len(paths),
+        "skipped": skipped,
+        "errors": errors,
+        "audio_seconds": round(audio_seconds, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "real_time_factor": round(wall_seconds / audio_seconds, 4) if audio_seconds > 0 else None,
+    }
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
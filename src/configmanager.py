@@ -1,9 +1,62 @@
 import json
+import os
+import tempfile
+import threading
 
 class ConfigManager:
+    DEFAULT_SETTINGS = {
+        "model_size": "large-v2",
+        "device": "cuda",
+        "compute_type": "float16",
+        "language": "en",
+        "hotkey": "f4",
+        "type_hotkey": "f2",
+        "cancel_hotkey": "f8",
+        # "queue", "finish_fast" or "abort" the text still being typed when a new recording starts
+        "new_recording_policy": "queue",
+        "buffer": True,
+        "preroll_seconds": 1.0,
+        "recorder_vad": True,
+        "streaming": False,
+        "live_typing": False,
+        "live_commit_lag": 1,
+        "max_pending": 4,
+        "output_mode": "type",
+        "paste_threshold": 0,
+        # "pyautogui", "xtest" (X11, needs python-xlib) or "auto", and "human" or "none" delays between keystrokes
+        "typing_backend": "pyautogui",
+        "typing_delay": "human",
+        "model_cache_mb": 4096,
+        "trace_file": "traces.jsonl",
+        "backend": "local",
+        "server_socket": None,
+        "stream_idle_minutes": 10,
+        "model_idle_minutes": 30,
+        "draft_model_size": None,
+        "draft_compute_type": "int8",
+        "batch_size": 4,
+        "batch_wait": 0.0,
+        # Fastest compute_type, cpu_threads and num_workers per model and machine, written by the autotuner
+        "autotune": {},
+        "autotune_clip": None,
+        # Index or part of the name of the microphone, None for the system default
+        "input_device": None,
+        "block_ms": 20,
+        "resample_mode": "callback",
+        "capture_ram_mb": 32,
+        "max_capture_minutes": 30,
+        # Post-processing: "new line", "period", "delete that" ... and spoken phrase -> text replacements
+        "spoken_commands": False,
+        "replacements": {},
+        "replacements_file": None,
+    }
+
     def __init__(self, config_file='settings.json'):
         self.config_file = config_file
         self.settings = self.load_config()
+        self.lock = threading.Lock()
+        # (keys, callback) pairs, replaced rather than changed so notifying needs no lock
+        self.subscribers = []
 
 
     def load_config(self):
@@ -11,24 +64,57 @@ class ConfigManager:
             with open(self.config_file, 'r') as f:
                 return json.load(f)
         except FileNotFoundError:
-            return {
-                "model_size": "large-v2",
-                "device": "cuda",
-                "compute_type": "float16",
-                "language": "en",
-                "hotkey": "f4",
-                "type_hotkey": "f2",
-                "buffer": True,
-            }
+            return dict(self.DEFAULT_SETTINGS)
 
     def save_settings(self, settings):
-        with open(self.config_file, 'w') as f:
-            json.dump(settings, f)
+        # Written next to the old file and swapped in, a crash never leaves a half-written settings.json
+        directory = os.path.dirname(os.path.abspath(self.config_file))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.settings-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(settings, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.config_file)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
         self.settings = settings
 
     def get_setting(self, key):
-        return self.settings.get(key)
+        # Settings files written by older versions may not have newer keys yet
+        return self.settings.get(key, self.DEFAULT_SETTINGS.get(key))
 
     def update_setting(self, key, value):
-        self.settings[key] = value
-        self.save_settings(self.settings)
+        return self.update_settings({key: value})
+
+    def update_settings(self, changes):
+        """
+        Change several settings with a single write of the settings file.
+
+        Subscribers are told about the keys whose value actually changed, once per call.
+
+        :return: The changed settings.
+        """
+        with self.lock:
+            changed = {key: value for key, value in changes.items() if self.get_setting(key) != value}
+            if changed:
+                self.save_settings({**self.settings, **changed})
+        if changed:
+            for keys, callback in self.subscribers:
+                relevant = {key: value for key, value in changed.items() if keys is None or key in keys}
+                if relevant:
+                    try:
+                        callback(relevant)
+                    except Exception as e:
+                        print(f"Error applying settings {sorted(relevant)}: {e}")
+        return changed
+
+    def subscribe(self, callback, keys=None):
+        # callback(changes) is called with the changed subset of ``keys``, or of all settings if None
+        subscription = (frozenset(keys) if keys is not None else None, callback)
+        self.subscribers = self.subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers = [s for s in self.subscribers if s is not subscription]
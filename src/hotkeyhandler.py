@@ -1,86 +1,198 @@
-import threading
-import keyboard
 import time
+from .idlemanager import IdleManager
+from .inputstatemachine import InputStateMachine
+from .latencytrace import TraceWriter, UtteranceTrace
+from .localagreement import LocalAgreement
+from .pipeline import OutputChunk, TranscriptionPipeline, Utterance
 from .whisperqueue import WhisperQueue
 
 
 class HotkeyHandler:
 
-    def __init__(self, hotkey, retype_hotkey, recorder, transcriber, texttyper, message_queue: WhisperQueue = WhisperQueue()):
+    def __init__(self, hotkey, retype_hotkey, recorder, transcriber, texttyper, message_queue: WhisperQueue = WhisperQueue(), streaming=False,
+                 live_typing=False, live_commit_lag=1, max_pending=4, trace_file=None, stream_idle_minutes=10,
+                 model_idle_minutes=30, batch_size=4, batch_wait=0.0, post_processor=None, cancel_hotkey=None,
+                 new_recording_policy="queue"):
         self.hotkey = hotkey
         self.retype_hotkey = retype_hotkey
+        self.cancel_hotkey = cancel_hotkey
+        # What happens to text still being typed when a new recording starts: "queue", "finish_fast" or "abort"
+        self.new_recording_policy = new_recording_policy
         self.recorder = recorder
         self.transcriber = transcriber
         self.text_typer = texttyper
         self.transcription = ""
         self.message_queue = message_queue
+        self.streaming = streaming
+        self.stream_session = None
+        self.live_typing = live_typing
+        self.live_commit_lag = live_commit_lag
+        self.live_agreement = None
+        self.current_sequence = None
+        self.current_trace = None
+        trace_writer = TraceWriter(trace_file) if trace_file else None
+        self.pipeline = TranscriptionPipeline(transcriber, texttyper, message_queue, max_pending=max_pending,
+                                              on_transcribed=self.set_transcription, on_idle=self.pipeline_idle,
+                                              on_stage=self.pipeline_stage, trace_writer=trace_writer,
+                                              batch_size=batch_size, batch_wait=batch_wait,
+                                              post_processor=post_processor)
+        # Hotkey events are handled one at a time on the input thread
+        self.input = InputStateMachine(hotkey, retype_hotkey, on_press=self.start_recording,
+                                       on_release=self.stop_recording, on_retype=self.retype_transcription,
+                                       message_queue=message_queue, cancel_hotkey=cancel_hotkey,
+                                       on_cancel=self.cancel_typing)
+        # Long captures are transcribed at pauses once they spill to disk, and ended at the maximum length
+        recorder.on_spill = lambda: self.input.call(self.start_chunked_transcription)
+        recorder.on_limit = self.capture_limit_reached
+        self.idle_manager = IdleManager(recorder, transcriber, message_queue, stream_idle_minutes=stream_idle_minutes,
+                                        model_idle_minutes=model_idle_minutes)
+        self.update_activity_hotkeys()
         self.running = False
-        self.thread = None
-        self.keyboard_lock = threading.Lock()
         self.start()
 
-    def start_recording(self):
+    def start_recording(self, pressed_at=None):
         if not self.recorder.is_recording:
-            print("getting  lock")
-            self.keyboard_lock.acquire()
+            trace = UtteranceTrace()
+            trace.mark("hotkey_press", pressed_at)
+            # Restarts the stream and starts reloading the model if they were idled away
+            self.idle_manager.activity()
             self.message_queue.send_message("recording", "HotkeyHandler", "Capturing audio...")
-            self.recorder.start_audio_capture()
-
-    def stop_recording(self):
-        print("releasing lock")
-        if self.keyboard_lock.locked():
-            self.keyboard_lock.release()
-        audio = self.recorder.stop_audio_capture()
-        self.message_queue.send_message("transcribing", "HotkeyHandler", "Transcribing audio...")
-        self.transcription = self.transcriber.transcribe_audio(audio)
-        self.type_transcription()
-
-    def type_transcription(self):
-        self.message_queue.send_message("typing", "HotkeyHandler", "Typing out transcription...")
-        self.text_typer.type_text(self.transcription)
-        self.message_queue.send_message("ready", "HotkeyHandler", "Done typing transcription")
+            self.recorder.start_audio_capture(trace=trace)
+            self.current_sequence = self.pipeline.next_sequence()
+            trace.sequence = self.current_sequence
+            self.current_trace = trace
+            self.preempt_typing()
+            if self.live_typing:
+                self.start_live_typing()
+            elif self.streaming:
+                # Decode confirmed parts of the speech while the key is still held
+                self.stream_session = self.transcriber.start_streaming(self.recorder.snapshot)
+
+    def stop_recording(self, released_at=None):
+        if self.current_trace is not None:
+            self.current_trace.mark("key_release", released_at)
+        # Streaming sessions index into the untrimmed recording, everything else gets only the speech
+        trim = self.stream_session is None
+        audio = self.recorder.stop_audio_capture(trim=trim, trace=self.current_trace)
+        if self.current_sequence is None:
+            return
+        # Heavy work happens on the pipeline workers, the input thread just hands the audio over
+        utterance = Utterance(self.current_sequence, audio, stream_session=self.stream_session,
+                              agreement=self.live_agreement, trace=self.current_trace,
+                              vad_filter=not self.recorder.last_capture_trimmed if trim else None)
+        self.current_sequence = None
+        self.current_trace = None
+        self.stream_session = None
+        self.live_agreement = None
+        self.pipeline.submit(utterance)
+
+    def start_live_typing(self):
+        # Bound to this recording, a partial that arrives late must not touch the next one's agreement
+        agreement = self.live_agreement = LocalAgreement(self.live_commit_lag)
+        sequence = self.current_sequence
+        trace = self.current_trace
+        self.stream_session = self.transcriber.start_streaming(
+            self.recorder.snapshot, on_partial=lambda text: self.live_partial(agreement, sequence, text, trace))
+        if self.stream_session is None:
+            # Transcriber can't stream, fall back to typing everything at release
+            self.live_agreement = None
+
+    def start_chunked_transcription(self):
+        if self.current_sequence is None or self.stream_session is not None:
+            return
+        # Everything up to the last pause is transcribed while recording, release only decodes the rest
+        self.stream_session = self.transcriber.start_streaming(self.recorder.snapshot)
+        if self.stream_session is not None:
+            self.message_queue.send_message("info", "HotkeyHandler",
+                                            "Long recording, continuing on disk and transcribing at pauses")
+
+    def capture_limit_reached(self):
+        self.message_queue.send_message("limit", "HotkeyHandler",
+                                        f"Maximum recording length of {self.recorder.max_capture_minutes:g} minutes "
+                                        f"reached, transcribing")
+        self.input.end_capture()
+
+    def preempt_typing(self):
+        # Output of earlier recordings that is still being typed makes way for this one
+        if self.new_recording_policy == "abort" and self.pipeline.abort(before=self.current_sequence):
+            self.message_queue.send_message("info", "HotkeyHandler", "New recording, dropped the text still being typed")
+        elif self.new_recording_policy == "finish_fast" and self.pipeline.hurry(before=self.current_sequence):
+            self.message_queue.send_message("info", "HotkeyHandler", "New recording, typing the rest without delays")
+
+    def cancel_typing(self):
+        # A recording that is running keeps going, everything before it is dropped
+        if self.pipeline.abort(before=self.current_sequence):
+            self.message_queue.send_message("info", "HotkeyHandler", "Typing cancelled")
+
+    def live_partial(self, agreement, sequence, text, trace=None):
+        words = agreement.insert(text.split())
+        if words:
+            # Typed in order by the pipeline's typing stage while the key is still held
+            self.pipeline.emit(OutputChunk(sequence, " ".join(words) + " ", final=False, trace=trace))
+
+    def set_hotkeys(self, hotkey, retype_hotkey, cancel_hotkey=None):
+        self.hotkey = hotkey
+        self.retype_hotkey = retype_hotkey
+        self.cancel_hotkey = cancel_hotkey
+        self.input.set_hotkeys(hotkey, retype_hotkey, cancel_hotkey)
+        self.update_activity_hotkeys()
+
+    def update_activity_hotkeys(self):
+        # Pressing one of our hotkeys isn't the user typing, it must not make pending corrections skip
+        if self.text_typer.activity_monitor is not None:
+            self.text_typer.activity_monitor.set_hotkeys(self.hotkey, self.retype_hotkey, self.cancel_hotkey)
+
+    def set_transcriber(self, transcriber):
+        # Recordings already being transcribed finish on the previous transcriber
+        self.transcriber = transcriber
+        self.pipeline.transcriber = transcriber
+        self.idle_manager.transcriber = transcriber
+
+    def set_transcription(self, text):
+        self.transcription = text
+
+    def pipeline_stage(self, stage):
+        self.input.notify(stage)
+        self.idle_manager.touch()
+
+    def pipeline_idle(self):
+        self.input.notify("idle")
+        self.idle_manager.touch()
+        if not self.recorder.is_recording:
+            self.message_queue.send_message("ready", "HotkeyHandler", "Done typing transcription")
 
     def retype_transcription(self):
         self.message_queue.send_message("typing", "HotkeyHandler", "Retyping transcription (safe)")
-        self.text_typer.safe_type_text(self.transcription)
-        self.message_queue.send_message("ready", "HotkeyHandler", "Done retyping transcription")
+        self.pipeline.submit_text(self.transcription, safe=True)
 
     def start(self):
         if not self.running:
             self.running = True
-            self.register_hotkeys()
-            self.start_heartbeat()
+            self.input.start()
             self.message_queue.send_message("ready", "HotkeyHandler", "Ready for hotkeys.")
 
     def stop(self):
         if self.running:
             self.running = False
-            with self.keyboard_lock:
-                keyboard.unhook_all_hotkeys()
+            self.input.stop()
+            self.idle_manager.stop()
+            self.message_queue.send_message("info", "HotkeyHandler", f"Input: {self.input.metrics.summary()}")
+            self.message_queue.send_message("info", "HotkeyHandler",
+                                            f"Typing ({self.text_typer.backend.name}): "
+                                            f"{self.text_typer.backend.metrics.summary()}")
             self.recorder.stop_audio_capture()
+            if self.stream_session is not None:
+                self.stream_session.cancel()
+                self.stream_session = None
+            if self.current_sequence is not None:
+                self.pipeline.cancel(self.current_sequence)
+                self.current_sequence = None
+                self.current_trace = None
+            self.pipeline.stop()
+            self.text_typer.stop()
             self.recorder.stream.close()
             self.recorder.p.terminate()
             self.message_queue.send_message("disabled", "HotkeyHandler", "HotkeyHandler stopped.")
-    def register_hotkeys(self):
-        with self.keyboard_lock:
-            # Register hotkeys
-            keyboard.add_hotkey(self.hotkey, self.start_recording, suppress=True)
-            keyboard.add_hotkey(self.hotkey, self.stop_recording, trigger_on_release=True, suppress=True)
-            keyboard.add_hotkey(self.retype_hotkey, self.retype_transcription, suppress=True)
-    def start_heartbeat(self):
-        # TODO: permanent fix hotkeys getting unregistered
-        def fix_hotkeys():
-            while self.running:
-
-                time.sleep(5)
-                # start_time = time.time()
-                with self.keyboard_lock:
-                    keyboard.unhook_all_hotkeys()
-                self.register_hotkeys()
-                # print(f"Time taken to register hotkeys: {time.time() - start_time:.6f} seconds")
-
-        threading.Thread(target=fix_hotkeys).start()
-
 
     def __del__(self):
         self.stop()
@@ -89,6 +201,8 @@ class HotkeyHandler:
     def main(self):
         print(f"Press and hold {self.hotkey} and start speaking. Release to type.")
         print(f"Press {self.retype_hotkey} to retype the most recent speech. Press Ctrl + C to exit")
+        if self.cancel_hotkey:
+            print(f"Press {self.cancel_hotkey} to stop typing.")
 
         self.start()  # Start the HotkeyHandler in its own thread
 
@@ -0,0 +1,132 @@
+import collections
+import gc
+import threading
+import time
+
+ACTIVE = 0
+STREAM_STOPPED = 1
+MODEL_UNLOADED = 2
+
+
+class IdleManager:
+    """
+    Powers down in tiers when the hotkey isn't used for a while.
+
+    After ``stream_idle_minutes`` the always-on microphone stream is stopped, after
+    ``model_idle_minutes`` the model is dropped from memory (faster_whisper keeps its converted
+    files in the on-disk cache, so reloading skips the download). The next hotkey press restarts
+    the stream right away and reloads the model in the background while the user is speaking.
+    A tier set to 0 is never entered. The thread only wakes up when a tier is due.
+    """
+
+    def __init__(self, recorder, transcriber, message_queue=None, stream_idle_minutes=10, model_idle_minutes=30):
+        self.recorder = recorder
+        self.transcriber = transcriber
+        self.message_queue = message_queue
+        self.stream_idle_seconds = stream_idle_minutes * 60
+        self.model_idle_seconds = model_idle_minutes * 60
+        self.tier = ACTIVE
+        self.last_activity = time.monotonic()
+        self.resume_costs = collections.deque(maxlen=50)
+        self.lock = threading.Lock()
+        # Held while the model is unloaded, outside of self.lock, a reload waits for it to finish
+        self.unload_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.seconds_until_next_tier())
+            self.wake.clear()
+            if self.stopped:
+                break
+            self.check()
+
+    def seconds_until_next_tier(self):
+        with self.lock:
+            tiers = [(STREAM_STOPPED, self.stream_idle_seconds), (MODEL_UNLOADED, self.model_idle_seconds)]
+            deadlines = [self.last_activity + seconds for tier, seconds in tiers if seconds > 0 and tier > self.tier]
+            if not deadlines:
+                return None
+            return max(min(deadlines) - time.monotonic(), 0)
+
+    def set_timeouts(self, stream_idle_minutes, model_idle_minutes):
+        with self.lock:
+            self.stream_idle_seconds = stream_idle_minutes * 60
+            self.model_idle_seconds = model_idle_minutes * 60
+        # Recompute the next deadline
+        self.wake.set()
+
+    def touch(self):
+        # Pipeline work counts as activity too, but needs nothing resumed
+        with self.lock:
+            self.last_activity = time.monotonic()
+        self.wake.set()
+
+    def activity(self):
+        # Called on every hotkey press before the capture starts
+        with self.lock:
+            self.last_activity = time.monotonic()
+            previous_tier = self.tier
+            self.tier = ACTIVE
+            if previous_tier != ACTIVE:
+                cost = {"tier": previous_tier, "stream_ms": None, "model_s": None}
+                self.resume_costs.append(cost)
+                start = time.perf_counter()
+                if self.recorder.resume():
+                    cost["stream_ms"] = (time.perf_counter() - start) * 1000.0
+                    self.send_info(f"Microphone stream resumed in {cost['stream_ms']:.0f} ms")
+                if previous_tier >= MODEL_UNLOADED:
+                    # The model loads while the user is still speaking
+                    threading.Thread(target=self.reload_model, args=(cost,), daemon=True).start()
+        self.wake.set()
+
+    def reload_model(self, cost):
+        start = time.perf_counter()
+        try:
+            with self.unload_lock:
+                self.transcriber.resume()
+        except Exception as e:
+            print(f"Error reloading model: {e}")
+            return
+        cost["model_s"] = time.perf_counter() - start
+        self.send_info(f"Model reloaded in {cost['model_s']:.1f} s")
+
+    def check(self):
+        # Holds the lock while deciding and suspending so a press can't slip in between
+        with self.lock:
+            if self.recorder.is_recording:
+                self.last_activity = time.monotonic()
+                return
+            idle = time.monotonic() - self.last_activity
+            if self.tier < STREAM_STOPPED and 0 < self.stream_idle_seconds <= idle:
+                if self.recorder.suspend():
+                    self.send_info(f"Idle for {idle / 60:.0f} min, microphone stream stopped")
+                self.tier = STREAM_STOPPED
+            unload = False
+            if self.tier < MODEL_UNLOADED and 0 < self.model_idle_seconds <= idle:
+                # Taken before the lock is released, so a press right after this reloads only once the unload is done
+                if self.unload_lock.acquire(blocking=False):
+                    self.tier = MODEL_UNLOADED
+                    unload = True
+                else:
+                    # Still reloading after the last press, which counts as activity
+                    self.last_activity = time.monotonic()
+        if unload:
+            # Slow, a hotkey press meanwhile must not wait for it
+            try:
+                self.transcriber.unload()
+                gc.collect()
+            finally:
+                self.unload_lock.release()
+            self.send_info(f"Idle for {idle / 60:.0f} min, model unloaded")
+
+    def send_info(self, message):
+        if self.message_queue is not None:
+            self.message_queue.send_message("info", "IdleManager", message)
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
@@ -0,0 +1,288 @@
+import collections
+import queue
+import threading
+import time
+
+import keyboard
+
+IDLE = "idle"
+RECORDING = "recording"
+TRANSCRIBING = "transcribing"
+TYPING = "typing"
+
+
+class InputMetrics:
+    def __init__(self, history=100):
+        self.press_to_capture_ms = collections.deque(maxlen=history)
+        self.duplicate_events = 0
+        self.dropped_events = 0
+        self.rehooks = 0
+
+    def snapshot(self):
+        latencies = sorted(self.press_to_capture_ms)
+        return {
+            "press_to_capture_ms_p50": latencies[len(latencies) // 2] if latencies else None,
+            "press_to_capture_ms_max": latencies[-1] if latencies else None,
+            "duplicate_events": self.duplicate_events,
+            "dropped_events": self.dropped_events,
+            "rehooks": self.rehooks,
+        }
+
+    def summary(self):
+        snapshot = self.snapshot()
+        latency = snapshot["press_to_capture_ms_p50"]
+        latency = f"{latency:.1f} ms" if latency is not None else "n/a"
+        return (f"press->capture p50 {latency}, duplicates {snapshot['duplicate_events']}, "
+                f"dropped {snapshot['dropped_events']}, re-hooks {snapshot['rehooks']}")
+
+
+class InputStateMachine:
+    """
+    Turns hotkey events into idle/recording/transcribing/typing transitions on a single thread.
+
+    The keyboard hook callbacks only timestamp the event and queue it, so they return
+    immediately. Everything else, including (re-)registering the hotkeys, runs on the event
+    thread, which means no locks are needed between the callbacks. A watchdog checks every
+    ``watchdog_interval`` seconds whether the hooks still work and only re-registers them when
+    they don't.
+    """
+
+    def __init__(self, hotkey, retype_hotkey, on_press, on_release, on_retype, message_queue=None,
+                 debounce_seconds=0.03, retype_debounce_seconds=0.5, watchdog_interval=2.0, missed_press_grace=0.5,
+                 cancel_hotkey=None, on_cancel=None):
+        self.hotkey = hotkey
+        self.retype_hotkey = retype_hotkey
+        self.cancel_hotkey = cancel_hotkey
+        self.hotkey_key = hotkey.split("+")[-1].strip().lower()
+        self.on_press = on_press
+        self.on_release = on_release
+        self.on_retype = on_retype
+        self.on_cancel = on_cancel
+        self.message_queue = message_queue
+        self.debounce_seconds = debounce_seconds
+        self.retype_debounce_seconds = retype_debounce_seconds
+        self.watchdog_interval = watchdog_interval
+        self.missed_press_grace = missed_press_grace
+        self.state = IDLE
+        self.metrics = InputMetrics()
+        self.events = queue.Queue()
+        self.calls = queue.Queue()
+        # Set when a capture was ended without the key being released, presses are key repeat until it is
+        self.awaiting_release = False
+        self.hotkey_handles = []
+        self.pending_hotkeys = None
+        self.raw_hook = None
+        self.last_press = 0.0
+        self.last_release = 0.0
+        self.last_retype = 0.0
+        self.last_cancel = 0.0
+        self.last_raw_press = 0.0
+        self.released_checks = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.watchdog_thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.post("register")
+        self.watchdog_thread = threading.Thread(target=self.watchdog, daemon=True)
+        self.watchdog_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.post("unregister")
+        self.events.put(None)
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def post(self, kind):
+        # Called from the keyboard hook thread, the pipeline and the watchdog
+        self.events.put((kind, time.monotonic()))
+
+    def call(self, callback):
+        # Runs callback on the event thread, in order with the hotkey events
+        self.calls.put(callback)
+        self.post("call")
+
+    def end_capture(self):
+        # Ends the recording as if the hotkey was released, e.g. at the maximum capture length
+        self.post("limit")
+
+    def notify(self, stage):
+        # Progress reported by the pipeline: "transcribing", "typing" or "idle"
+        self.post(stage)
+
+    def run(self):
+        handlers = {
+            "press": self.handle_press,
+            "release": self.handle_release,
+            "retype": self.handle_retype,
+            "cancel": self.handle_cancel,
+            TRANSCRIBING: self.handle_stage,
+            TYPING: self.handle_stage,
+            IDLE: self.handle_stage,
+            "check": self.check_hooks,
+            "register": self.register_hotkeys,
+            "unregister": self.unregister_hotkeys,
+            "rebind": self.rebind_hotkeys,
+            "call": self.handle_call,
+            "limit": self.handle_limit,
+        }
+        while True:
+            event = self.events.get()
+            if event is None:
+                break
+            kind, timestamp = event
+            try:
+                handlers[kind](kind, timestamp)
+            except Exception as e:
+                print(f"Error handling input event {kind}: {e}")
+
+    def handle_press(self, kind, timestamp):
+        if self.state == RECORDING or self.awaiting_release:
+            # Key repeat while the hotkey is held
+            self.metrics.duplicate_events += 1
+            return
+        if timestamp - self.last_release < self.debounce_seconds:
+            self.metrics.duplicate_events += 1
+            return
+        self.last_press = timestamp
+        self.released_checks = 0
+        self.state = RECORDING
+        self.on_press(timestamp)
+        self.metrics.press_to_capture_ms.append((time.monotonic() - timestamp) * 1000.0)
+
+    def handle_release(self, kind, timestamp):
+        if self.awaiting_release:
+            # The real release of a capture that was already ended
+            self.awaiting_release = False
+            return
+        if self.state != RECORDING:
+            # The matching press was debounced or lost
+            self.metrics.duplicate_events += 1
+            return
+        self.last_release = timestamp
+        self.state = TRANSCRIBING
+        self.on_release(timestamp)
+
+    def handle_retype(self, kind, timestamp):
+        if timestamp - self.last_retype < self.retype_debounce_seconds:
+            self.metrics.duplicate_events += 1
+            return
+        self.last_retype = timestamp
+        self.on_retype()
+
+    def handle_cancel(self, kind, timestamp):
+        if timestamp - self.last_cancel < self.retype_debounce_seconds:
+            self.metrics.duplicate_events += 1
+            return
+        self.last_cancel = timestamp
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+    def handle_call(self, kind, timestamp):
+        self.calls.get_nowait()()
+
+    def handle_limit(self, kind, timestamp):
+        if self.state == RECORDING:
+            self.handle_release(kind, timestamp)
+            self.awaiting_release = True
+
+    def handle_stage(self, kind, timestamp):
+        # A new recording may already be running while an older one is still in the pipeline
+        if self.state != RECORDING:
+            self.state = kind
+
+    def hook_press(self):
+        self.post("press")
+
+    def hook_release(self):
+        self.post("release")
+
+    def hook_retype(self):
+        self.post("retype")
+
+    def hook_cancel(self):
+        self.post("cancel")
+
+    def observe(self, event):
+        # Raw hook, sees the hotkey even when the hotkey registration itself has stopped firing
+        if event.event_type == keyboard.KEY_DOWN and (event.name or "").lower() == self.hotkey_key:
+            if keyboard.is_pressed(self.hotkey):
+                self.last_raw_press = time.monotonic()
+
+    def set_hotkeys(self, hotkey, retype_hotkey, cancel_hotkey=None):
+        # Swapped on the event thread, so no event is handled with half of the change applied
+        self.pending_hotkeys = (hotkey, retype_hotkey, cancel_hotkey)
+        self.post("rebind")
+
+    def rebind_hotkeys(self, kind, timestamp):
+        if self.pending_hotkeys is None:
+            return
+        self.hotkey, self.retype_hotkey, self.cancel_hotkey = self.pending_hotkeys
+        self.hotkey_key = self.hotkey.split("+")[-1].strip().lower()
+        self.pending_hotkeys = None
+        # A recording that is running now ends through the watchdog, the old release is no longer hooked
+        self.register_hotkeys()
+
+    def register_hotkeys(self, kind=None, timestamp=None):
+        self.unregister_hotkeys()
+        if self.stop_event.is_set():
+            return
+        self.hotkey_handles = [
+            keyboard.add_hotkey(self.hotkey, self.hook_press, suppress=True),
+            keyboard.add_hotkey(self.hotkey, self.hook_release, trigger_on_release=True, suppress=True),
+            keyboard.add_hotkey(self.retype_hotkey, self.hook_retype, suppress=True),
+        ]
+        if self.cancel_hotkey:
+            self.hotkey_handles.append(keyboard.add_hotkey(self.cancel_hotkey, self.hook_cancel, suppress=True))
+        self.raw_hook = keyboard.hook(self.observe)
+
+    def unregister_hotkeys(self, kind=None, timestamp=None):
+        if self.hotkey_handles:
+            # remove_hotkey can't tell apart the press and release registrations of the same hotkey
+            keyboard.unhook_all_hotkeys()
+            self.hotkey_handles = []
+        if self.raw_hook is not None:
+            try:
+                keyboard.unhook(self.raw_hook)
+            except (KeyError, ValueError):
+                pass
+            self.raw_hook = None
+
+    def watchdog(self):
+        while not self.stop_event.wait(self.watchdog_interval):
+            self.post("check")
+
+    def check_hooks(self, kind, timestamp):
+        failure = None
+        registered = getattr(keyboard, "_hotkeys", None)
+        if self.awaiting_release and not keyboard.is_pressed(self.hotkey):
+            # The release itself was lost
+            self.awaiting_release = False
+        if registered is not None and any(handle not in registered for handle in self.hotkey_handles):
+            failure = "hotkeys were unregistered"
+        elif self.state == RECORDING:
+            if keyboard.is_pressed(self.hotkey):
+                self.released_checks = 0
+            else:
+                # Two checks in a row, a release that is simply still queued must not count
+                self.released_checks += 1
+                if self.released_checks >= 2:
+                    failure = "release was missed"
+                    self.metrics.dropped_events += 1
+                    self.handle_release("release", timestamp)
+        elif (self.state != RECORDING and not self.awaiting_release
+              and self.last_raw_press > max(self.last_press, self.last_release) + self.missed_press_grace):
+            failure = "press was missed"
+            self.metrics.dropped_events += 1
+            self.last_press = self.last_raw_press
+        if failure is not None:
+            self.metrics.rehooks += 1
+            self.register_hotkeys()
+            if self.message_queue is not None:
+                self.message_queue.send_message("info", "InputStateMachine",
+                                                f"Re-registered hotkeys, {failure} ({self.metrics.summary()})")
@@ -0,0 +1,73 @@
+import json
+import logging
+import logging.handlers
+import time
+
+STAGES = (
+    "hotkey_press",
+    "capture_started",
+    "key_release",
+    "capture_stopped",
+    "transcribe_start",
+    "first_segment",
+    "transcribe_end",
+    "first_char",
+    "typing_done",
+)
+
+
+class UtteranceTrace:
+    """
+    Monotonic timestamps for the stages of one dictation, from hotkey press to typing done.
+    """
+
+    def __init__(self, sequence=None):
+        self.sequence = sequence
+        self.started = time.time()
+        self.marks = {}
+
+    def mark(self, stage, timestamp=None):
+        # Only the first time counts, e.g. the first of several typed chunks
+        if stage not in self.marks:
+            self.marks[stage] = time.monotonic() if timestamp is None else timestamp
+
+    def elapsed(self, start, end):
+        if start in self.marks and end in self.marks:
+            return (self.marks[end] - self.marks[start]) * 1000.0
+        return None
+
+    def to_dict(self):
+        origin = self.marks.get("hotkey_press", min(self.marks.values(), default=0.0))
+        return {
+            "sequence": self.sequence,
+            "started": self.started,
+            "stages_ms": {stage: round((self.marks[stage] - origin) * 1000.0, 3)
+                          for stage in STAGES if stage in self.marks},
+        }
+
+    def summary(self):
+        parts = []
+        for label, start, end in (("press->capture", "hotkey_press", "capture_started"),
+                                  ("release->first char", "key_release", "first_char"),
+                                  ("decode", "transcribe_start", "transcribe_end"),
+                                  ("typing", "first_char", "typing_done")):
+            value = self.elapsed(start, end)
+            if value is not None:
+                parts.append(f"{label} {value:.0f} ms")
+        return ", ".join(parts) or "no timings"
+
+
+class TraceWriter:
+    # Appends one JSON line per utterance, rotating the file so it never grows without bound
+    def __init__(self, path="traces.jsonl", max_bytes=1024 * 1024, backup_count=3):
+        self.logger = logging.getLogger(f"whisperspeechtyping.traces.{path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                           encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+    def write(self, trace):
+        self.logger.info(json.dumps(trace.to_dict()))
@@ -0,0 +1,35 @@
+class LocalAgreement:
+    """
+    Local-agreement commit policy for live typing.
+
+    A word is committed once two consecutive partial transcriptions agree on it and it is
+    not one of the last ``commit_lag`` words of the newest one. Committed words are final:
+    later hypotheses that disagree with them are ignored so nothing typed is ever taken back.
+    """
+
+    def __init__(self, commit_lag=1):
+        self.commit_lag = max(commit_lag, 0)
+        self.previous = []
+        self.committed = []
+
+    def insert(self, words):
+        # Returns the words that became committed with this hypothesis. Only the part after
+        # the committed words is compared, disagreements about typed words can't be fixed anyway.
+        agreed = len(self.committed)
+        limit = min(len(self.previous), len(words) - self.commit_lag)
+        while agreed < limit and self.previous[agreed] == words[agreed]:
+            agreed += 1
+        self.previous = list(words)
+        new_words = words[len(self.committed):agreed]
+        self.committed.extend(new_words)
+        return new_words
+
+    def flush(self, words):
+        # Whatever the final transcription has beyond the committed words
+        remaining = words[len(self.committed):]
+        self.committed.extend(remaining)
+        self.previous = list(words)
+        return remaining
+
+    def committed_text(self):
+        return " ".join(self.committed)
@@ -1,63 +1,246 @@
+import bisect
 import threading
 
-from faster_whisper import WhisperModel
+from .modelregistry import model_registry
+from .startupprofile import lazy_import, startup_profiler
+from .streamingsession import StreamingSession
 from .transcriber import Transcriber
 from .whisperqueue import WhisperQueue
 import numpy as np
 
+# Takes longer to import than the whole UI, it is only needed once the model loads on its own thread
+faster_whisper = lazy_import("faster_whisper")
+
+SAMPLE_RATE = 16000
+# Whisper's window, BatchedInferencePipeline cuts every clip off after this
+MAX_BATCH_CLIP_SECONDS = 30
+
 
 class LocalTranscriber(Transcriber):
-    def __init__(self, model_size, compute_type, language, device, message_queue: WhisperQueue = None):
+    def __init__(self, model_size, compute_type, language, device, message_queue: WhisperQueue = None, cpu_threads=0,
+                 num_workers=1, vad_filter=True, draft_model_size=None, draft_compute_type="int8"):
         self.model_size = model_size
         self.compute_type = compute_type
+        # Optional small model whose transcript is typed first and corrected once the main model is done
+        self.draft_model_size = draft_model_size
+        self.draft_compute_type = draft_compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        # Not needed when the Recorder already trimmed the audio to the detected speech
+        self.vad_filter = vad_filter
         self.language = language
         self.device = device
         self.message_queue = message_queue
         self.model = None
+        self.draft_model = None
+        self.batched_pipeline = None
         self.start_lock = threading.Lock()
+        self.draft_lock = threading.Lock()
         threading.Thread(target=self.start).start()
 
-    def transcribe_audio(self, audio):
-        if self.model is None:
-            self.start()
-        segments, _ = self.model.transcribe(audio, vad_filter=True, without_timestamps=True, language=self.language)
-        segments_list = list(segments)
-        if len(segments_list) != 0:
-            full_transcription = "".join(segment.text for segment in segments_list)
-            # Check if the last character is not a whitespace
-            if full_transcription and not full_transcription[-1].isspace():
-                full_transcription += ' '
-
-            # Remove leading whitespace
-            return full_transcription.lstrip()
+    def transcribe_audio(self, audio, language=None, trace=None, vad_filter=None):
+        if isinstance(audio, np.ndarray):
+            audio = self.prepare_audio(audio)
+            if audio.size == 0:
+                print("Error transcribing. Blank audio?")
+                return ""
+        # Local reference, the idle manager may unload the model at any time
+        full_transcription = self.decode(self.model or self.start(), audio, language=language, trace=trace,
+                                         vad_filter=vad_filter)
+        if full_transcription:
+            return self.format_transcription(full_transcription)
         print("Error transcribing. Blank audio?")
         return ""
 
+    def prepare_audio(self, audio):
+        # Raw samples from the Recorder, skip faster_whisper's decode/resample path
+        if audio.dtype == np.int16:
+            audio = audio.astype(np.float32) * (1.0 / 32768.0)
+        return np.ascontiguousarray(audio, dtype=np.float32)
+
+    def format_transcription(self, text):
+        # Check if the last character is not a whitespace
+        if text and not text[-1].isspace():
+            text += ' '
+
+        # Remove leading whitespace
+        return text.lstrip()
+
+    def transcribe_draft(self, audio, trace=None, vad_filter=None):
+        if self.draft_model_size is None:
+            return None
+        audio = self.prepare_audio(audio)
+        if audio.size == 0:
+            return ""
+        text = self.decode(self.draft_model or self.start_draft(), audio, trace=trace, vad_filter=vad_filter)
+        return self.format_transcription(text) if text else ""
+
+    def transcribe_chunk(self, audio, prompt=None, language=None, trace=None):
+        # Streaming works on the untrimmed recording, pre-roll and pauses included, so it always needs the VAD
+        return self.decode(self.model or self.start(), audio, prompt=prompt, language=language, trace=trace,
+                           vad_filter=True)
+
+    def transcribe_batch(self, audios, traces=None, vad_filters=None):
+        traces = traces or [None] * len(audios)
+        vad_filters = [self.vad_filter if vad_filter is None else vad_filter
+                       for vad_filter in vad_filters or [None] * len(audios)]
+        prepared = [self.prepare_audio(audio) for audio in audios]
+        results = [None] * len(prepared)
+        # Longer recordings would be truncated, they and empty ones go through transcribe_audio
+        batchable = [i for i, audio in enumerate(prepared) if 0 < len(audio) <= MAX_BATCH_CLIP_SECONDS * SAMPLE_RATE]
+        if len(batchable) > 1:
+            try:
+                texts = self.decode_batch([prepared[i] for i in batchable], [traces[i] for i in batchable],
+                                          [vad_filters[i] for i in batchable])
+                for i, text in zip(batchable, texts):
+                    results[i] = self.format_transcription(text) if text else ""
+            except Exception as e:
+                print(f"Batched transcription failed, transcribing one at a time: {e}")
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self.transcribe_audio(prepared[i], trace=traces[i], vad_filter=vad_filters[i])
+        return results
+
+    def speech_bounds(self, audio):
+        # First and last sample of speech according to faster_whisper's Silero VAD, None if there is none
+        speech = faster_whisper.vad.get_speech_timestamps(audio, faster_whisper.vad.VadOptions(
+            min_silence_duration_ms=160))
+        if not speech:
+            return None
+        return speech[0]["start"], speech[-1]["end"]
+
+    def decode_batch(self, audios, traces, vad_filters=None):
+        model = self.model or self.start()
+        if self.batched_pipeline is None or self.batched_pipeline.model is not model:
+            self.batched_pipeline = faster_whisper.BatchedInferencePipeline(model)
+        vad_filters = vad_filters or [self.vad_filter] * len(audios)
+        for trace in traces:
+            if trace is not None:
+                trace.mark("transcribe_start")
+        # One clip per recording, laid out back to back in a single array. Clip timestamps turn off the
+        # pipeline's own VAD, recordings that need it are cut to their speech here, silent ones get no clip
+        starts = []
+        clips = []
+        position = 0
+        for audio, vad_filter in zip(audios, vad_filters):
+            starts.append(position / SAMPLE_RATE)
+            bounds = self.speech_bounds(audio) if vad_filter else (0, len(audio))
+            if bounds is not None:
+                clips.append({"start": (position + bounds[0]) / SAMPLE_RATE,
+                              "end": (position + bounds[1]) / SAMPLE_RATE})
+            position += len(audio)
+        segments = []
+        if clips:
+            segments, _ = self.batched_pipeline.transcribe(np.concatenate(audios), language=self.language,
+                                                           vad_filter=False, clip_timestamps=clips,
+                                                           batch_size=len(clips), without_timestamps=True)
+        texts = [[] for _ in audios]
+        for segment in segments:
+            # Segment times are relative to the concatenated audio
+            index = max(bisect.bisect_right(starts, segment.start + 1e-3) - 1, 0)
+            if traces[index] is not None:
+                traces[index].mark("first_segment")
+            texts[index].append(segment.text)
+        for trace in traces:
+            if trace is not None:
+                trace.mark("transcribe_end")
+        return ["".join(text).strip() for text in texts]
 
+    def decode(self, model, audio, prompt=None, language=None, trace=None, vad_filter=None):
+        if trace is not None:
+            trace.mark("transcribe_start")
+        vad_filter = self.vad_filter if vad_filter is None else vad_filter
+        segments, _ = model.transcribe(audio, vad_filter=vad_filter, without_timestamps=True,
+                                       language=language or self.language,
+                                       initial_prompt=prompt)
+        texts = []
+        for segment in segments:
+            if trace is not None:
+                trace.mark("first_segment")
+            texts.append(segment.text)
+        if trace is not None:
+            trace.mark("transcribe_end")
+        return "".join(texts).strip()
 
-    # TODO: start and stop methods to release resources
+    def start_streaming(self, source, on_partial=None):
+        return StreamingSession(self, lambda: self.prepare_audio(source()), on_partial=on_partial)
+
+    def finish_streaming(self, session, audio, trace=None):
+        text = session.finish(self.prepare_audio(audio), trace=trace)
+        if text:
+            return self.format_transcription(text)
+        print("Error transcribing. Blank audio?")
+        return ""
 
     def set_backend(self, backend):
         pass
     def stop(self):
+        # The model stays in the process-wide registry, a new transcriber with the same settings reuses it
         self.model = None
-        pass
+        self.draft_model = None
+
+    def unload(self):
+        # Cold state, faster_whisper keeps the converted model in its on-disk cache for the reload
+        with self.start_lock:
+            self.model = None
+            model_registry.release(self.model_size, self.device, self.compute_type, cpu_threads=self.cpu_threads,
+                                   num_workers=self.num_workers)
+        with self.draft_lock:
+            if self.draft_model is not None:
+                self.draft_model = None
+                model_registry.release(self.draft_model_size, self.device, self.draft_compute_type,
+                                       cpu_threads=self.cpu_threads, num_workers=self.num_workers)
+
+    def resume(self):
+        self.start()
 
     def start(self):
+        if self.draft_model_size is not None:
+            # The small model loads first so drafts are available as early as possible
+            self.start_draft()
         with self.start_lock:
-            print("Loading model...")
             if self.model is not None:
-                return
+                return self.model
+            self.model = model_registry.get(self.model_size, self.device, self.compute_type, self.load_model,
+                                            cpu_threads=self.cpu_threads, num_workers=self.num_workers)
+            stats = model_registry.stats()
+            if self.message_queue is not None:
+                self.message_queue.send_message("info", "LocalTranscriber",
+                                                f"Model cache: {stats['hits']} hits, {stats['misses']} misses, "
+                                                f"{stats['total_load_time']:.1f} s spent loading")
+            print("Model ready.")
+            return self.model
+
+    def start_draft(self):
+        with self.draft_lock:
+            if self.draft_model is None:
+                self.draft_model = model_registry.get(
+                    self.draft_model_size, self.device, self.draft_compute_type,
+                    lambda: self.load_model(self.draft_model_size, self.draft_compute_type),
+                    cpu_threads=self.cpu_threads, num_workers=self.num_workers)
+            return self.draft_model
+
+    def load_model(self, model_size=None, compute_type=None):
+        print("Loading model...")
+        model_size = model_size or self.model_size
+        compute_type = compute_type or self.compute_type
+        WhisperModel = faster_whisper.WhisperModel
+        with startup_profiler.phase(f"load model {model_size}"):
             try:
-                self.model = WhisperModel(self.model_size, compute_type=self.compute_type, device=self.device)
+                model = WhisperModel(model_size, compute_type=compute_type, device=self.device,
+                                     cpu_threads=self.cpu_threads, num_workers=self.num_workers)
             except ValueError as e:
                 print(e)
-                print("Computation type not supported. Defaulting to float32")
-                self.compute_type = "float32"
-                self.model = WhisperModel(self.model_size, compute_type=self.compute_type, device=self.device)
-            # Warm up the model
-            print("Starting model...")
+                # int8 is supported on every CPU and much faster there than float32
+                compute_type = "int8" if self.device == "cpu" else "float32"
+                print(f"Computation type not supported. Defaulting to {compute_type}")
+                model = WhisperModel(model_size, compute_type=compute_type, device=self.device,
+                                     cpu_threads=self.cpu_threads, num_workers=self.num_workers)
+        # Warm up the model
+        print("Starting model...")
+        with startup_profiler.phase("warm up model"):
             silent_audio = np.zeros(160, dtype=np.float32)
-            segments, _ = self.model.transcribe(silent_audio, vad_filter=False, without_timestamps=True, language=self.language)
+            segments, _ = model.transcribe(silent_audio, vad_filter=False, without_timestamps=True,
+                                           language=self.language)
             list(segments)
-            print("Model ready.")
\ No newline at end of file
+        return model
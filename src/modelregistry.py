@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Rough size of the weights in MB at float16, used to keep the cache within its memory budget
+MODEL_SIZES_MB = {
+    "tiny": 75, "tiny.en": 75,
+    "base": 145, "base.en": 145,
+    "small": 485, "small.en": 485,
+    "medium": 1530, "medium.en": 1530,
+    "large": 3090, "large-v1": 3090, "large-v2": 3090, "large-v3": 3090,
+    "distil-large-v2": 1510, "distil-large-v3": 1510,
+}
+COMPUTE_TYPE_FACTORS = {
+    "float32": 2.0,
+    "int8": 0.5, "int8_float32": 0.5, "int8_float16": 0.5, "int8_bfloat16": 0.5,
+}
+
+
+def estimate_model_mb(model_size, compute_type):
+    return MODEL_SIZES_MB.get(model_size, 1530) * COMPUTE_TYPE_FACTORS.get(compute_type, 1.0)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded WhisperModels, shared by all LocalTranscriber instances.
+
+    Models are keyed by (model_size, device, compute_type, cpu_threads, num_workers) and stay
+    loaded after the transcriber that loaded them stops. The least recently used models are
+    dropped once the estimated size of all cached models exceeds ``memory_budget_mb``.
+    """
+
+    def __init__(self, memory_budget_mb=4096):
+        self.memory_budget_mb = memory_budget_mb
+        self.models = OrderedDict()
+        self.load_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_times = []
+
+    def get(self, model_size, device, compute_type, loader, cpu_threads=0, num_workers=1):
+        key = (model_size, device, compute_type, cpu_threads, num_workers)
+        with self.lock:
+            model = self._lookup(key)
+            if model is not None:
+                return model
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+        # Only one thread loads a given model, others wait for it instead of loading it twice
+        with load_lock:
+            with self.lock:
+                model = self._lookup(key)
+                if model is not None:
+                    return model
+                self.misses += 1
+            start_time = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start_time
+            with self.lock:
+                self.load_times.append(load_time)
+                self.models[key] = (model, estimate_model_mb(model_size, compute_type))
+                self._evict_over_budget()
+            print(f"Loaded {model_size} ({device}, {compute_type}) in {load_time:.2f} s")
+            return model
+
+    def _lookup(self, key):
+        entry = self.models.get(key)
+        if entry is None:
+            return None
+        self.models.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def _evict_over_budget(self):
+        if not self.memory_budget_mb:
+            return
+        # Never evict the most recently used model, even if it alone is over budget
+        while len(self.models) > 1 and self.cached_mb() > self.memory_budget_mb:
+            key, _ = self.models.popitem(last=False)
+            self.evictions += 1
+            print(f"Evicted {key[0]} ({key[1]}, {key[2]}) from the model cache")
+
+    def cached_mb(self):
+        return sum(size for _, size in self.models.values())
+
+    def release(self, model_size, device, compute_type, cpu_threads=0, num_workers=1):
+        with self.lock:
+            self.models.pop((model_size, device, compute_type, cpu_threads, num_workers), None)
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+    def set_memory_budget(self, memory_budget_mb):
+        with self.lock:
+            self.memory_budget_mb = memory_budget_mb
+            self._evict_over_budget()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "cached_models": [key[0] for key in self.models],
+                "cached_mb": self.cached_mb(),
+                "load_times": list(self.load_times),
+                "total_load_time": sum(self.load_times),
+            }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,418 @@
+import collections
+import itertools
+import queue
+import threading
+import time
+
+from .texttyper import TypingJob
+from .whisperqueue import WhisperQueue
+
+
+class Utterance:
+    def __init__(self, sequence, audio, stream_session=None, agreement=None, trace=None, vad_filter=None):
+        self.sequence = sequence
+        self.audio = audio
+        # True if the audio still has its silence and needs the transcriber's VAD, None leaves it to the transcriber
+        self.vad_filter = vad_filter
+        self.stream_session = stream_session
+        self.agreement = agreement
+        self.trace = trace
+
+
+class OutputChunk:
+    def __init__(self, sequence, text, final=True, safe=False, trace=None, replaces=None, draft=False):
+        self.sequence = sequence
+        self.text = text
+        self.final = final
+        self.safe = safe
+        self.trace = trace
+        self.draft = draft
+        # What was actually typed, the text after post-processing
+        self.typed_text = None
+        # Draft chunk this text corrects in place, its checkpoint is set once it has been typed
+        self.replaces = replaces
+        self.checkpoint = None
+
+
+class CorrectionStats:
+    # How often the main model's transcript differed from the draft, and what fixing it cost
+    def __init__(self, history=100):
+        self.counts = collections.Counter()
+        self.decode_seconds = collections.deque(maxlen=history)
+        self.edit_seconds = collections.deque(maxlen=history)
+
+    def record(self, result, edit_seconds):
+        self.counts[result] += 1
+        if result == "corrected":
+            self.edit_seconds.append(edit_seconds)
+
+    def summary(self):
+        drafts = sum(self.counts.values())
+        decode = sum(self.decode_seconds) / len(self.decode_seconds) if self.decode_seconds else 0.0
+        edit = sum(self.edit_seconds) / len(self.edit_seconds) if self.edit_seconds else 0.0
+        return (f"{self.counts['corrected']}/{drafts} drafts corrected, {self.counts['skipped']} skipped, "
+                f"main model {decode:.2f} s, edit {edit * 1000:.0f} ms on average")
+
+
+class TranscriptionPipeline:
+    """
+    Capture -> transcription -> typing, each stage on its own thread with a bounded queue in between.
+    The input thread never waits on a full queue, submit() leaves that to a handoff thread.
+
+    Every utterance gets a sequence number when its capture starts. The typing stage only types
+    chunks of the oldest unfinished utterance, so output order always matches capture order even
+    when live typing produces text for a newer utterance early.
+
+    If the transcriber has a draft model, its transcript is typed right away and the utterance is
+    passed on to a correction stage, which runs the main model and fixes the typed draft in place.
+
+    A post_processor (see postprocessor.py) rewrites every text right before it is typed. Live
+    typing chunks of one utterance share a session, so commands split across chunks still match.
+
+    Typing runs as a TypingJob. abort() drops the output of older utterances, including the text
+    being typed, and hurry() types it without delays, so a new recording never waits behind them.
+    """
+
+    def __init__(self, transcriber, text_typer, message_queue: WhisperQueue = None, max_pending=4,
+                 on_transcribed=None, on_idle=None, on_stage=None, trace_writer=None, batch_size=4, batch_wait=0.0,
+                 post_processor=None):
+        self.transcriber = transcriber
+        self.text_typer = text_typer
+        self.message_queue = message_queue or WhisperQueue()
+        self.on_transcribed = on_transcribed
+        self.on_idle = on_idle
+        self.on_stage = on_stage
+        self.trace_writer = trace_writer
+        self.post_processor = post_processor
+        self.post_sessions = {}
+        # Checkpoint after the last typed utterance, "delete that" only reaches back into it if it still matches
+        self.last_checkpoint = None
+        # Utterances waiting at the same time are decoded together, up to batch_size of them.
+        # batch_wait > 0 also waits that long for more, at the cost of latency for single utterances
+        self.batch_size = max(batch_size, 1)
+        self.batch_wait = batch_wait
+        self.transcription_queue = queue.Queue(maxsize=max_pending)
+        self.typing_queue = queue.Queue(maxsize=max_pending * 4)
+        self.correction_queue = queue.Queue(maxsize=max_pending)
+        # Unbounded, (target queue, item, stage name) from the input thread, or None to stop
+        self.handoff_queue = queue.Queue()
+        self.correction_stats = CorrectionStats()
+        self.sequence_counter = itertools.count()
+        self.last_sequence = -1
+        # Utterances before these sequence numbers are dropped / typed without delays
+        self.discard_before = 0
+        self.fast_before = 0
+        self.typing_job = None
+        self.job_lock = threading.Lock()
+        self.next_sequence_to_type = 0
+        self.held_chunks = {}
+        self.in_flight = 0
+        self.in_flight_lock = threading.Lock()
+        self.transcription_thread = threading.Thread(target=self.transcription_worker, daemon=True)
+        self.typing_thread = threading.Thread(target=self.typing_worker, daemon=True)
+        self.correction_thread = threading.Thread(target=self.correction_worker, daemon=True)
+        self.handoff_thread = threading.Thread(target=self.handoff_worker, daemon=True)
+        self.handoff_thread.start()
+        self.transcription_thread.start()
+        self.typing_thread.start()
+        self.correction_thread.start()
+
+    def next_sequence(self):
+        with self.in_flight_lock:
+            self.in_flight += 1
+            self.last_sequence = next(self.sequence_counter)
+            return self.last_sequence
+
+    def submit(self, utterance):
+        # Called from the hotkey thread, so only hand the audio over and return, even if the queue is full
+        self.handoff_queue.put((self.transcription_queue, utterance, "transcription"))
+        self.report_depth()
+
+    def submit_text(self, text, safe=False):
+        self.handoff_queue.put((self.typing_queue, OutputChunk(self.next_sequence(), text, final=True, safe=safe),
+                                "typing"))
+
+    def handoff_worker(self):
+        # Waits on full queues in place of the input thread, in the order things were submitted
+        while True:
+            handoff = self.handoff_queue.get()
+            if handoff is None:
+                break
+            self.put_with_backpressure(*handoff)
+
+    def emit(self, chunk):
+        self.put_with_backpressure(self.typing_queue, chunk, "typing")
+
+    def put_with_backpressure(self, target, item, stage):
+        try:
+            target.put_nowait(item)
+        except queue.Full:
+            self.message_queue.send_message("info", "Pipeline",
+                                            f"Backpressure: {stage} queue full ({target.qsize()}), waiting...")
+            target.put(item)
+
+    def report_depth(self):
+        transcription_depth = self.transcription_queue.qsize() + self.handoff_queue.qsize()
+        typing_depth = self.typing_queue.qsize() + len(self.held_chunks)
+        if transcription_depth or typing_depth:
+            self.message_queue.send_message("info", "Pipeline",
+                                            f"Queue depth: transcription {transcription_depth}, typing {typing_depth}")
+
+    def gather(self, source, first, pending, batchable):
+        # Collects utterances that are already waiting (or arrive within batch_wait) into one batch
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                if pending:
+                    item = pending.popleft()
+                elif self.batch_wait > 0:
+                    item = source.get(timeout=max(deadline - time.monotonic(), 0))
+                else:
+                    item = source.get_nowait()
+            except queue.Empty:
+                break
+            if not batchable(item):
+                # Handled on its own after this batch, in the order it arrived
+                pending.appendleft(item)
+                break
+            batch.append(item)
+        return batch
+
+    def transcribe_batch(self, utterances):
+        try:
+            return self.transcriber.transcribe_batch([utterance.audio for utterance in utterances],
+                                                     traces=[utterance.trace for utterance in utterances],
+                                                     vad_filters=[utterance.vad_filter for utterance in utterances])
+        except Exception as e:
+            print(f"Error while transcribing: {e}")
+            return [None] * len(utterances)
+
+    def transcription_worker(self):
+        pending = collections.deque()
+        while True:
+            utterance = pending.popleft() if pending else self.transcription_queue.get()
+            if utterance is None:
+                break
+            if self.skipped(utterance.sequence):
+                # Aborted before it was transcribed, nothing would be typed anyway
+                if utterance.stream_session is not None:
+                    utterance.stream_session.cancel()
+                self.emit(OutputChunk(utterance.sequence, "", final=True, trace=utterance.trace))
+                continue
+            self.message_queue.send_message("transcribing", "Pipeline", "Transcribing audio...")
+            if self.on_stage is not None:
+                self.on_stage("transcribing")
+            if utterance.stream_session is not None:
+                try:
+                    text = self.transcriber.finish_streaming(utterance.stream_session, utterance.audio,
+                                                             trace=utterance.trace)
+                except Exception as e:
+                    print(f"Error while transcribing: {e}")
+                    text = ""
+                self.deliver(utterance, text)
+                continue
+            batch = self.gather(self.transcription_queue, utterance, pending,
+                                lambda item: item is not None and item.stream_session is None)
+            undrafted = []
+            for utterance in batch:
+                try:
+                    draft = self.transcriber.transcribe_draft(utterance.audio, trace=utterance.trace,
+                                                              vad_filter=utterance.vad_filter)
+                except Exception as e:
+                    print(f"Error while transcribing draft: {e}")
+                    draft = None
+                if draft is None:
+                    undrafted.append(utterance)
+                    continue
+                draft_chunk = OutputChunk(utterance.sequence, draft, final=False, trace=utterance.trace, draft=True)
+                self.emit(draft_chunk)
+                # The next utterance's draft doesn't have to wait for the main model
+                self.put_with_backpressure(self.correction_queue, (utterance, draft_chunk), "correction")
+            if undrafted:
+                for utterance, text in zip(undrafted, self.transcribe_batch(undrafted)):
+                    self.deliver(utterance, text or "")
+
+    def deliver(self, utterance, text):
+        if self.on_transcribed is not None and text:
+            self.on_transcribed(text)
+        if utterance.agreement is not None:
+            # Live typing already typed the committed words, only the rest is left
+            remaining = utterance.agreement.flush(text.split())
+            text = " ".join(remaining) + " " if remaining else ""
+        self.emit(OutputChunk(utterance.sequence, text, final=True, trace=utterance.trace))
+
+    def correction_worker(self):
+        pending = collections.deque()
+        while True:
+            item = pending.popleft() if pending else self.correction_queue.get()
+            if item is None:
+                break
+            batch = self.gather(self.correction_queue, item, pending, lambda item: item is not None)
+            start = time.perf_counter()
+            texts = self.transcribe_batch([utterance for utterance, _ in batch])
+            self.correction_stats.decode_seconds.append((time.perf_counter() - start) / len(batch))
+            for (utterance, draft_chunk), text in zip(batch, texts):
+                if text is None:
+                    # Leave the draft as it is
+                    text = draft_chunk.text
+                if self.on_transcribed is not None and text:
+                    self.on_transcribed(text)
+                self.emit(OutputChunk(utterance.sequence, text, final=True, trace=utterance.trace,
+                                      replaces=draft_chunk))
+
+    def typing_worker(self):
+        while True:
+            chunk = self.typing_queue.get()
+            if chunk is None:
+                break
+            self.held_chunks.setdefault(chunk.sequence, []).append(chunk)
+            # Type everything that is next in line, newer utterances wait in held_chunks
+            while self.next_sequence_to_type in self.held_chunks:
+                chunks = self.held_chunks[self.next_sequence_to_type]
+                finished = None
+                while chunks:
+                    ready = chunks.pop(0)
+                    self.type_chunk(ready)
+                    ready.checkpoint = self.text_typer.checkpoint()
+                    if ready.final:
+                        finished = ready
+                        # Nothing to "delete that" in an aborted utterance, it may be partly typed
+                        self.last_checkpoint = ready.checkpoint if not self.skipped(ready.sequence) else None
+                if finished is None:
+                    break
+                if finished.trace is not None:
+                    self.finish_trace(finished.trace)
+                del self.held_chunks[self.next_sequence_to_type]
+                self.next_sequence_to_type += 1
+                with self.in_flight_lock:
+                    self.in_flight -= 1
+                    idle = self.in_flight == 0
+                if idle and self.on_idle is not None:
+                    self.on_idle()
+
+    def skipped(self, sequence):
+        return sequence < self.discard_before
+
+    def abort(self, before=None):
+        """
+        Drops the output of every utterance older than ``before`` (default: all of them), the text
+        being typed stops after the current keystroke.
+
+        :return: True if anything was waiting to be typed.
+        """
+        with self.job_lock:
+            before = self.last_sequence + 1 if before is None else before
+            self.discard_before = max(self.discard_before, before)
+            if self.typing_job is not None and self.typing_job.sequence < before:
+                self.typing_job.cancel()
+        return self.next_sequence_to_type < before
+
+    def hurry(self, before=None):
+        # Types the output of every utterance older than ``before`` without delays
+        with self.job_lock:
+            before = self.last_sequence + 1 if before is None else before
+            self.fast_before = max(self.fast_before, before)
+            if self.typing_job is not None and self.typing_job.sequence < before:
+                self.typing_job.hurry()
+        return self.next_sequence_to_type < before
+
+    def type_chunk(self, chunk):
+        if self.skipped(chunk.sequence):
+            if chunk.final:
+                self.post_sessions.pop(chunk.sequence, None)
+            return
+        backspaces, chunk.typed_text = self.post_process(chunk)
+        if chunk.replaces is not None:
+            self.correct_chunk(chunk)
+            return
+        if not chunk.typed_text and not backspaces:
+            return
+        self.message_queue.send_message("typing", "Pipeline", "Typing out transcription...")
+        if self.on_stage is not None:
+            self.on_stage("typing")
+        with self.job_lock:
+            if self.skipped(chunk.sequence):
+                return
+            job = TypingJob(chunk.sequence, fast=chunk.sequence < self.fast_before, on_progress=self.report_progress)
+            self.typing_job = job
+        try:
+            if backspaces:
+                self.text_typer.delete_text(backspaces)
+            if chunk.safe:
+                self.text_typer.safe_type_text(chunk.typed_text, trace=chunk.trace)
+            elif chunk.typed_text:
+                self.text_typer.type_text(chunk.typed_text, trace=chunk.trace, job=job)
+        except Exception as e:
+            print(f"Error while typing: {e}")
+        finally:
+            with self.job_lock:
+                self.typing_job = None
+        if job.cancelled:
+            self.message_queue.send_message("info", "Pipeline",
+                                            f"Typing cancelled after {job.typed}/{job.total} characters")
+
+    def report_progress(self, job):
+        self.message_queue.send_message("typing", "Pipeline", f"Typing... {job.typed}/{job.total} characters")
+
+    def post_process(self, chunk):
+        # Returns (characters to delete before typing, text to type)
+        if self.post_processor is None:
+            return 0, chunk.text
+        try:
+            if chunk.draft or chunk.replaces is not None or chunk.safe:
+                # Complete texts on their own, drafts are corrected word by word so they can't reach back
+                text = self.post_processor.process(chunk.text)
+                self.post_processor.last_output = text
+                return 0, text
+            session = self.post_sessions.get(chunk.sequence)
+            if session is None:
+                history = self.post_processor.last_output \
+                    if self.last_checkpoint is not None and self.last_checkpoint == self.text_typer.checkpoint() else ""
+                session = self.post_sessions[chunk.sequence] = self.post_processor.session(history)
+            edit = session.feed(chunk.text, final=chunk.final)
+            if chunk.final:
+                del self.post_sessions[chunk.sequence]
+                if session.output != session.history:
+                    # Empty utterances keep the previous one in reach
+                    self.post_processor.last_output = session.utterance_text()
+            return edit
+        except Exception as e:
+            print(f"Error while post-processing: {e}")
+            self.post_sessions.pop(chunk.sequence, None)
+            return 0, chunk.text
+
+    def correct_chunk(self, chunk):
+        draft = chunk.replaces
+        start = time.perf_counter()
+        try:
+            result = self.text_typer.correct_text(draft.typed_text, chunk.typed_text, draft.checkpoint, trace=chunk.trace)
+        except Exception as e:
+            print(f"Error while correcting: {e}")
+            result = "failed"
+        self.correction_stats.record(result, time.perf_counter() - start)
+        self.message_queue.send_message("info", "Pipeline",
+                                        f"Draft {result}, {self.correction_stats.summary()}")
+
+    def finish_trace(self, trace):
+        trace.mark("typing_done")
+        if self.trace_writer is not None:
+            try:
+                self.trace_writer.write(trace)
+            except OSError as e:
+                print(f"Error writing trace: {e}")
+        self.message_queue.send_message("info", "Trace", trace.summary())
+
+    def cancel(self, sequence):
+        # A capture that was started but never submitted still has to release its place in line
+        self.emit(OutputChunk(sequence, "", final=True))
+
+    def stop(self):
+        self.handoff_queue.put(None)
+        self.handoff_thread.join()
+        self.transcription_queue.put(None)
+        self.transcription_thread.join()
+        self.correction_queue.put(None)
+        self.correction_thread.join()
+        self.typing_queue.put(None)
+        self.typing_thread.join()
@@ -0,0 +1,289 @@
+import collections
+import json
+import re
+
+# Spoken phrase -> command, matched case-insensitively and ignoring the punctuation Whisper adds
+SPOKEN_COMMANDS = {
+    "new line": "newline",
+    "new paragraph": "paragraph",
+    "period": ".",
+    "full stop": ".",
+    "comma": ",",
+    "question mark": "?",
+    "exclamation mark": "!",
+    "exclamation point": "!",
+    "colon": ":",
+    "semicolon": ";",
+    "delete that": "delete",
+    "scratch that": "delete",
+    "cap next": "capitalize",
+    "all caps next": "upper",
+}
+SENTENCE_END = ".?!\n"
+TOKEN_PATTERN = re.compile(r"^(\W*)(.*?)(\W*)$", re.DOTALL)
+
+
+def normalize_word(word):
+    return TOKEN_PATTERN.match(word).group(2).lower()
+
+
+class Token:
+    def __init__(self, text):
+        self.lead, self.core, self.trail = TOKEN_PATTERN.match(text).groups()
+        self.key = self.core.lower()
+
+
+class PhraseAutomaton:
+    """
+    Aho-Corasick automaton over words, so any number of phrases is found in one pass over a text.
+
+    Phrases are added as word lists with a value, build() computes the failure links. Walking the
+    automaton with step() one word at a time, matches() lists the (length, value) of every phrase
+    that ends at the current word.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.depth = [0]
+        self.terminal = [None]
+        # Nearest state along the failure links that ends a phrase
+        self.output_link = [0]
+
+    def add(self, words, value):
+        state = 0
+        for word in words:
+            following = self.goto[state].get(word)
+            if following is None:
+                following = len(self.goto)
+                self.goto[state][word] = following
+                self.goto.append({})
+                self.fail.append(0)
+                self.depth.append(self.depth[state] + 1)
+                self.terminal.append(None)
+                self.output_link.append(0)
+            state = following
+        self.terminal[state] = (len(words), value)
+
+    def build(self):
+        pending = collections.deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for word, following in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(word, 0)
+                self.fail[following] = target if target != following else 0
+                self.output_link[following] = target if self.terminal[target] is not None else self.output_link[target]
+                pending.append(following)
+
+    def step(self, state, word):
+        while state and word not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(word, 0)
+
+    def matches(self, state):
+        if self.terminal[state] is not None:
+            yield self.terminal[state]
+        state = self.output_link[state]
+        while state:
+            yield self.terminal[state]
+            state = self.output_link[state]
+
+
+class PostProcessingSession:
+    """
+    Applies the rules to one utterance, which may arrive in pieces (live typing).
+
+    Words are only written out once no phrase that is still being matched can include them, so
+    at most the length of the longest phrase is held back. ``history`` is the already typed text
+    of the previous utterance, which "delete that" at the start of this one removes.
+    """
+
+    def __init__(self, automaton, history=""):
+        self.automaton = automaton
+        self.state = 0
+        self.tokens = []
+        # Absolute index of self.tokens[0] and of the next token
+        self.base = 0
+        self.position = 0
+        # Start index -> longest (length, value) phrase starting there
+        self.candidates = {}
+        self.history = history
+        self.output = history
+        self.history_length = len(history)
+        self.typed_length = len(history)
+        # Everything before this position in output is typed already and unchanged
+        self.dirty = len(history)
+        # Where the phrases "delete that" removes start
+        self.boundaries = [0, len(history)] if history else [0]
+        self.capitalize_next = False
+        self.case_next = None
+
+    def feed(self, text, final=False):
+        """
+        :return: (backspaces, text): delete this many typed characters, then type the text.
+        """
+        for word in text.split():
+            self.push(Token(word))
+        if final:
+            self.resolve(self.position)
+            self.state = 0
+            if self.output and not self.output[-1].isspace():
+                self.output += " "
+        else:
+            self.resolve(self.position - self.automaton.depth[self.state])
+        backspaces = self.typed_length - self.dirty
+        text = self.output[self.dirty:]
+        self.typed_length = len(self.output)
+        self.dirty = len(self.output)
+        return backspaces, text
+
+    def utterance_text(self):
+        # This utterance's part of the output, without the history
+        return self.output[self.history_length:]
+
+    def push(self, token):
+        self.tokens.append(token)
+        self.state = self.automaton.step(self.state, token.key)
+        for length, value in self.automaton.matches(self.state):
+            start = self.position + 1 - length
+            if self.candidates.get(start, (0,))[0] < length:
+                self.candidates[start] = (length, value)
+        self.position += 1
+
+    def resolve(self, safe):
+        # Leftmost-longest: at each position the longest phrase starting there wins
+        index = self.base
+        while index < safe:
+            match = self.candidates.pop(index, None)
+            offset = index - self.base
+            if match is None:
+                self.append_word(self.tokens[offset])
+                index += 1
+                continue
+            length, (kind, value) = match
+            tokens = self.tokens[offset:offset + length]
+            if kind == "command":
+                self.apply_command(value)
+            else:
+                self.append_text(tokens[0].lead + value + tokens[-1].trail)
+            index += length
+        del self.tokens[:index - self.base]
+        self.base = index
+        for start in [start for start in self.candidates if start < index]:
+            del self.candidates[start]
+
+    def append_word(self, token):
+        core = token.core
+        if self.case_next == "upper":
+            core = core.upper()
+        elif self.case_next == "capitalize" or self.capitalize_next:
+            core = core[:1].upper() + core[1:]
+        if core:
+            self.capitalize_next = False
+            self.case_next = None
+        self.append_text(token.lead + core + token.trail)
+
+    def append_text(self, text):
+        if self.case_next == "upper":
+            text = text.upper()
+        self.case_next = None
+        self.capitalize_next = False
+        if self.output and not self.output[-1].isspace():
+            self.output += " "
+        self.output += text
+        if text[-1:] in SENTENCE_END:
+            self.boundaries.append(len(self.output))
+
+    def strip_end(self, characters):
+        self.truncate(len(self.output.rstrip(" ").rstrip(characters)))
+
+    def truncate(self, length):
+        self.output = self.output[:length]
+        self.dirty = min(self.dirty, length)
+        self.history_length = min(self.history_length, length)
+
+    def apply_command(self, command):
+        if command in ("newline", "paragraph"):
+            self.strip_end(",")
+            self.output += "\n" if command == "newline" else "\n\n"
+        elif command == "delete":
+            self.delete_phrase()
+        elif command in ("capitalize", "upper"):
+            self.case_next = command
+            return
+        else:
+            # Replaces the punctuation Whisper guessed at this point
+            self.strip_end(",.;:!?")
+            self.output += command
+        if self.output[-1:] in SENTENCE_END or not self.output.strip():
+            self.capitalize_next = True
+            self.boundaries.append(len(self.output))
+
+    def delete_phrase(self):
+        end = len(self.output.rstrip(" "))
+        while self.boundaries and self.boundaries[-1] >= end:
+            self.boundaries.pop()
+        self.truncate(self.boundaries[-1] if self.boundaries else 0)
+        self.boundaries.append(len(self.output))
+
+
+class PostProcessor:
+    """
+    Spoken commands ("new line", "period", "delete that", "cap next" ...), replacements and casing,
+    applied to the transcript before it is typed.
+
+    All phrases are compiled into one PhraseAutomaton, so the cost per utterance grows with the
+    length of the text and not with the number of rules. Replacements take precedence over
+    commands with the same phrase.
+    """
+
+    def __init__(self, replacements=None, spoken_commands=True):
+        self.automaton = PhraseAutomaton()
+        self.rule_count = 0
+        if spoken_commands:
+            for phrase, command in SPOKEN_COMMANDS.items():
+                self.add_rule(phrase, ("command", command))
+        for phrase, text in (replacements or {}).items():
+            self.add_rule(phrase, ("replace", text))
+        self.automaton.build()
+        # Output of the last utterance, what "delete that" at the start of the next one removes
+        self.last_output = ""
+
+    def add_rule(self, phrase, value):
+        words = [word for word in (normalize_word(word) for word in phrase.split()) if word]
+        if words:
+            self.automaton.add(words, value)
+            self.rule_count += 1
+
+    def session(self, history=""):
+        return PostProcessingSession(self.automaton, history)
+
+    def process(self, text):
+        # A whole transcript on its own, without deleting into earlier output
+        return self.session().feed(text, final=True)[1]
+
+
+def load_replacements(path):
+    # JSON object, or one "phrase<TAB>replacement" per line
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            return json.load(f)
+        replacements = {}
+        for line in f:
+            if "\t" in line and not line.startswith("#"):
+                phrase, text = line.rstrip("\r\n").split("\t", 1)
+                replacements[phrase] = text
+        return replacements
+
+
+def build_post_processor(spoken_commands=False, replacements=None, replacements_file=None):
+    # None when there is nothing to do, so the pipeline skips the stage entirely
+    replacements = dict(replacements or {})
+    if replacements_file:
+        replacements = {**load_replacements(replacements_file), **replacements}
+    if not spoken_commands and not replacements:
+        return None
+    return PostProcessor(replacements, spoken_commands=spoken_commands)
@@ -1,67 +1,279 @@
 import pyaudio
 import numpy as np
 import threading
+import time
 import io
 import wave
-import collections
-import time
+from .audiobuffer import AudioRingBuffer
+from .resampler import BLOCK_SAMPLES, PolyphaseResampler, downmix
+from .vad import IncrementalVad
 from .whisperqueue import WhisperQueue
 
+# What Whisper expects, captures at other rates are converted to this
+SAMPLE_RATE = 16000
+
+
+def input_devices(p):
+    devices = []
+    for index in range(p.get_device_count()):
+        info = p.get_device_info_by_index(index)
+        if info.get("maxInputChannels", 0) > 0:
+            devices.append(info)
+    return devices
+
+
+def list_input_devices():
+    p = pyaudio.PyAudio()
+    try:
+        return [{"index": info["index"], "name": info["name"], "channels": int(info["maxInputChannels"]),
+                 "rate": int(info["defaultSampleRate"])} for info in input_devices(p)]
+    finally:
+        p.terminate()
+
+
+def find_input_device(p, device=None):
+    # device is an index, part of a device name, or None for the system default
+    if device is not None and str(device).strip().isdigit():
+        return p.get_device_info_by_index(int(device))
+    if device:
+        for info in input_devices(p):
+            if str(device).lower() in info["name"].lower():
+                return info
+        print(f"No input device matching '{device}', using the default")
+    try:
+        return p.get_default_input_device_info()
+    except (IOError, OSError):
+        return None
+
 
 class Recorder:
-    def __init__(self, buffer, message_queue: WhisperQueue = None):
+    def __init__(self, buffer, message_queue: WhisperQueue = None, preroll_seconds=1.0, vad=True, speech_padding=0.2,
+                 input_device=None, block_ms=20, resample_mode="callback", ram_budget_mb=32, max_capture_minutes=30):
         self.p = pyaudio.PyAudio()
-        self.frames = []
         self.buffer = buffer
         self.is_recording = False
+        self.suspended = False
         self.lock = threading.Lock()
-        self.circular_buffer = collections.deque(maxlen=8)
         self.message_queue = message_queue
+        self.device_info = find_input_device(self.p, input_device)
+        # The device's own rate and up to two channels, PortAudio's conversion is slow or fails for many mics
+        self.input_rate = int(self.device_info["defaultSampleRate"]) if self.device_info else SAMPLE_RATE
+        self.channels = min(int(self.device_info["maxInputChannels"]), 2) if self.device_info else 1
+        self.stream = self.open_stream(block_ms)
+        # "callback" resamples each block as it arrives, "stop" keeps the native rate and resamples when it is read
+        self.resample_mode = resample_mode if self.input_rate != SAMPLE_RATE else "callback"
+        self.buffer_rate = SAMPLE_RATE if self.resample_mode == "callback" else self.input_rate
+        self.resampler = PolyphaseResampler(self.input_rate, SAMPLE_RATE) \
+            if self.resample_mode == "callback" and self.input_rate != SAMPLE_RATE else None
+        self.resample_seconds = 0.0
+        # Long captures continue on disk past ram_budget_mb and end after max_capture_minutes
+        self.audio_buffer = AudioRingBuffer(sample_rate=self.buffer_rate, preroll_seconds=preroll_seconds,
+                                            ram_budget_mb=ram_budget_mb, max_seconds=max_capture_minutes * 60)
+        # "stop" mode: the capture converted to 16 kHz so far, snapshots only convert what arrived since the last one
+        self.converted_buffer = None
+        self.capture_resampler = None
+        self.converted_samples = 0
+        self.convert_lock = threading.Lock()
+        if self.buffer_rate != SAMPLE_RATE:
+            self.converted_buffer = AudioRingBuffer(sample_rate=SAMPLE_RATE, preroll_seconds=0,
+                                                    ram_budget_mb=ram_budget_mb, max_seconds=max_capture_minutes * 60)
+            self.capture_resampler = PolyphaseResampler(self.buffer_rate, SAMPLE_RATE)
+        self.max_capture_minutes = max_capture_minutes
+        # Called from the audio thread, once per capture, so they must return quickly
+        self.on_spill = None
+        self.on_limit = None
+        self.spill_notified = False
+        self.limit_notified = False
+        # Speech detection runs as the audio arrives so nothing is left to do at key release
+        self.vad = IncrementalVad(sample_rate=self.buffer_rate) if vad else None
+        self.speech_padding = int(speech_padding * self.buffer_rate)
+        self.capture_start = 0
+        self.last_speech_segments = []
+        # Whether the last capture was cut down to the detected speech, if not the transcriber should run its own VAD
+        self.last_capture_trimmed = False
 
-        self.stream = self.p.open(format=pyaudio.paInt16,
-                                  channels=1,
-                                  rate=16000,
-                                  input=True,
-                                  frames_per_buffer=1000,
-                                  stream_callback=self.audio_callback,
-                                  start=False)
         if self.buffer:
             self.stream.start_stream()
 
+    def open_stream(self, block_ms):
+        device_index = self.device_info["index"] if self.device_info else None
+        try:
+            return self.p.open(format=pyaudio.paInt16, channels=self.channels, rate=self.input_rate, input=True,
+                               frames_per_buffer=max(int(self.input_rate * block_ms / 1000), 1),
+                               input_device_index=device_index, stream_callback=self.audio_callback, start=False)
+        except (IOError, OSError, ValueError) as e:
+            if self.input_rate == SAMPLE_RATE and self.channels == 1:
+                raise
+            # Let the host convert after all
+            print(f"Could not open the input device at {self.input_rate} Hz, {self.channels} channels ({e}), "
+                  f"using 16 kHz mono")
+            self.input_rate = SAMPLE_RATE
+            self.channels = 1
+            return self.open_stream(block_ms)
+
     def audio_callback(self, in_data, frame_count, time_info, status):
         data = np.frombuffer(in_data, dtype=np.int16)
+        cost = 0.0
+        if self.channels > 1 or self.resampler is not None:
+            start = time.perf_counter()
+            data = downmix(data, self.channels)
+            if self.resampler is not None:
+                data = self.resampler.process(data)
+            cost = time.perf_counter() - start
+        callbacks = []
         with self.lock:
             if self.is_recording:
-                self.frames.append(data)
-            else:
-                self.circular_buffer.append(data)
+                self.resample_seconds += cost
+            # Outside a capture the buffer only keeps the pre-roll window
+            written = self.audio_buffer.write(data)
+            if self.vad is not None:
+                self.vad.process(written)
+                if not self.is_recording:
+                    self.vad.prune(self.vad.received - len(self.audio_buffer))
+            if self.is_recording and self.audio_buffer.spilled and not self.spill_notified:
+                self.spill_notified = True
+                callbacks.append(self.on_spill)
+            if self.is_recording and self.audio_buffer.limit_reached and not self.limit_notified:
+                self.limit_notified = True
+                callbacks.append(self.on_limit)
+        for callback in callbacks:
+            if callback is not None:
+                callback()
         return None, pyaudio.paContinue
 
-    def start_audio_capture(self):
+    def suspend(self):
+        # Idle power saving: stops the always-on stream until the next capture, the pre-roll is lost
+        with self.lock:
+            if not self.buffer or self.is_recording or self.suspended:
+                return False
+            self.suspended = True
+        self.stream.stop_stream()
+        with self.lock:
+            self.audio_buffer.clear()
+            if self.resampler is not None:
+                self.resampler.reset()
+            if self.vad is not None:
+                self.vad.reset_state()
+        return True
+
+    def resume(self):
+        with self.lock:
+            if not self.suspended:
+                return False
+            self.suspended = False
+        self.stream.start_stream()
+        return True
+
+    def start_audio_capture(self, trace=None):
+        self.resume()
         with self.lock:
             if self.buffer:
-                self.frames = []
-                self.frames.extend(self.circular_buffer)
-                self.circular_buffer.clear()
+                self.audio_buffer.start_capture(keep_preroll=True)
             else:
-                self.frames = []
+                self.audio_buffer.clear()
+                self.audio_buffer.start_capture(keep_preroll=False)
+                if self.resampler is not None:
+                    self.resampler.reset()
+                if self.vad is not None:
+                    self.vad.reset_state()
                 self.stream.start_stream()
+            if self.vad is not None:
+                # Absolute position of the first captured sample, pre-roll included
+                self.capture_start = self.vad.received - len(self.audio_buffer)
+            self.resample_seconds = 0.0
+            self.reset_conversion()
+            self.spill_notified = False
+            self.limit_notified = False
             self.is_recording = True
+        if trace is not None:
+            trace.mark("capture_started")
+
+    def snapshot(self):
+        # Zero-copy view of the audio captured so far, safe to read while recording continues
+        with self.lock:
+            audio = self.audio_buffer.snapshot()
+        if self.buffer_rate != SAMPLE_RATE:
+            audio = self.convert_capture(audio)
+        return audio
 
+    def convert_capture(self, audio, finish=False):
+        # Converts the part of the native rate capture that wasn't converted yet, then views all of it.
+        # finish hands the converted capture over like AudioRingBuffer.stop_capture
+        with self.convert_lock:
+            start = time.perf_counter()
+            for offset in range(self.converted_samples, len(audio), BLOCK_SAMPLES):
+                self.converted_buffer.write(self.capture_resampler.process(audio[offset:offset + BLOCK_SAMPLES]))
+            self.converted_samples = max(self.converted_samples, len(audio))
+            self.resample_seconds += time.perf_counter() - start
+            if finish:
+                return self.converted_buffer.stop_capture()
+            return self.converted_buffer.snapshot()
 
-    def stop_audio_capture(self):
+    def reset_conversion(self):
+        if self.converted_buffer is None:
+            return
+        with self.convert_lock:
+            # A new array, views a streaming session still holds keep the previous capture
+            self.converted_buffer.stop_capture()
+            self.converted_buffer.start_capture(keep_preroll=False)
+            self.capture_resampler.reset()
+            self.converted_samples = 0
+
+    def stop_audio_capture(self, trim=True, trace=None):
+        if not self.buffer and self.stream.is_active():
+            self.stream.stop_stream()
         with self.lock:
+            was_recording = self.is_recording
             self.is_recording = False
-        if not self.buffer:
-            self.stream.stop_stream()
-        audio_data = b''.join(self.frames)
-        audio_buffer = io.BytesIO(audio_data)
+            # Normalized float32 samples, handed over without copying
+            audio = self.audio_buffer.stop_capture()
+            if self.vad is not None:
+                capture_end = self.capture_start + len(audio)
+                self.last_speech_segments = [(start - self.capture_start, end - self.capture_start) for start, end
+                                             in self.vad.speech_segments(self.capture_start, capture_end)]
+        if self.buffer_rate != SAMPLE_RATE:
+            # Converted a block at a time into a buffer that spills like the capture, never all of it in RAM
+            audio = self.convert_capture(audio, finish=True)
+        self.last_capture_trimmed = bool(trim and self.vad is not None and self.last_speech_segments)
+        if trim and self.vad is not None:
+            audio = self.trim_to_speech(audio)
+        if trace is not None:
+            trace.mark("capture_stopped")
+        if was_recording:
+            self.report_resampling(len(audio))
+        return audio
+
+    def report_resampling(self, samples):
+        if self.input_rate == SAMPLE_RATE and self.channels == 1:
+            return
+        message = (f"Converted {self.input_rate} Hz, {self.channels} ch to 16 kHz mono ({self.resample_mode}) in "
+                   f"{self.resample_seconds * 1000:.1f} ms for {samples / SAMPLE_RATE:.1f} s of audio")
+        if self.message_queue is not None:
+            self.message_queue.send_message("info", "Recorder", message)
+        else:
+            print(message)
+
+    def trim_to_speech(self, audio):
+        if not self.last_speech_segments:
+            # Quiet speech can be missed, the whole capture goes to the transcriber's VAD instead
+            return audio
+        # Cut leading and trailing silence (including the pre-roll) with a view, no copy.
+        # Segments count samples at the buffer rate, the audio is at 16 kHz by now
+        scale = SAMPLE_RATE / self.buffer_rate
+        start = int(max(self.last_speech_segments[0][0] - self.speech_padding, 0) * scale)
+        end = min(int((self.last_speech_segments[-1][1] + self.speech_padding) * scale), len(audio))
+        return audio[start:end]
+
+    def to_wav(self, audio):
+        # Only needed when a real WAV file is wanted (e.g. saving a capture to disk)
+        samples = np.clip(audio * 32768.0, -32768, 32767).astype(np.int16)
+        audio_buffer = io.BytesIO()
 
         wave_file = wave.open(audio_buffer, 'wb')
         wave_file.setnchannels(1)
         wave_file.setsampwidth(self.p.get_sample_size(pyaudio.paInt16))
         wave_file.setframerate(16000)
-        wave_file.writeframes(audio_data)
+        wave_file.writeframes(samples.tobytes())
         wave_file.close()
 
         audio_buffer.seek(0)  # Move the cursor to the start of the BytesIO buffer
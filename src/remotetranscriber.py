@@ -0,0 +1,104 @@
+import json
+import socket
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .serversocket import DEFAULT_SOCKET_PATH, require_unix_sockets
+from .transcriber import Transcriber
+from .whisperqueue import WhisperQueue
+
+
+class RemoteTranscriber(Transcriber):
+    """
+    Client for a TranscriptionServer running in another process on the same machine.
+    """
+
+    def __init__(self, language=None, socket_path=None, message_queue: WhisperQueue = None, timeout=120):
+        require_unix_sockets()
+        self.language = language
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self.message_queue = message_queue
+        self.timeout = timeout
+        self.connection = None
+        self.stream = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.settimeout(self.timeout)
+        self.connection.connect(self.socket_path)
+        self.stream = self.connection.makefile("rwb")
+
+    def request(self, message):
+        with self.lock:
+            # Reconnect once if the server was restarted since the last request
+            for attempt in range(2):
+                try:
+                    if self.connection is None:
+                        self.connect()
+                    self.stream.write(json.dumps(message).encode("utf-8") + b"\n")
+                    self.stream.flush()
+                    line = self.stream.readline()
+                    if not line:
+                        raise ConnectionError("Transcription server closed the connection")
+                    return json.loads(line)
+                except (OSError, ConnectionError):
+                    self.close()
+                    if attempt == 1:
+                        raise
+
+    def health(self):
+        try:
+            return self.request({"op": "health"})
+        except (OSError, ConnectionError) as e:
+            return {"status": "unreachable", "error": str(e)}
+
+    def transcribe_audio(self, audio, trace=None):
+        if not isinstance(audio, np.ndarray):
+            from faster_whisper import decode_audio
+            audio = decode_audio(audio)
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.size == 0:
+            print("Error transcribing. Blank audio?")
+            return ""
+        if trace is not None:
+            trace.mark("transcribe_start")
+        shm = shared_memory.SharedMemory(create=True, size=audio.nbytes)
+        try:
+            np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+            response = self.request({"op": "transcribe", "shm": shm.name, "samples": int(audio.size),
+                                     "language": self.language})
+            if trace is not None:
+                # The server answers with the whole text at once
+                trace.mark("first_segment")
+                trace.mark("transcribe_end")
+        except (OSError, ConnectionError) as e:
+            print(f"Error reaching transcription server at {self.socket_path}: {e}")
+            return ""
+        finally:
+            shm.close()
+            shm.unlink()
+        if response.get("status") != "ok":
+            print(f"Transcription server error: {response.get('error')}")
+            return ""
+        return response["text"]
+
+    def set_backend(self, backend):
+        pass
+
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except OSError:
+                pass
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        self.stream = None
+
+    def stop(self):
+        with self.lock:
+            self.close()
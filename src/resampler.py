@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+
+# Input samples converted per step, which bounds the windows copied for the dot products to a few hundred KB
+BLOCK_SAMPLES = 16384
+
+
+def downmix(samples, channels):
+    # Interleaved frames to mono float32 in [-1, 1)
+    scale = 1.0 / 32768.0 if samples.dtype == np.int16 else 1.0
+    if channels == 1:
+        return np.multiply(samples, scale, dtype=np.float32)
+    frames = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    return np.multiply(frames.mean(axis=1, dtype=np.float32), scale, dtype=np.float32)
+
+
+class PolyphaseResampler:
+    """
+    Converts a stream of blocks from ``source_rate`` to ``target_rate``.
+
+    Works like upsampling by ``up``, low-pass filtering and keeping every ``down``-th sample,
+    but only the kept samples are computed: each is the dot product of ``taps`` input samples
+    with one phase of the filter, for a whole block at once. The last ``taps - 1`` input samples
+    are carried over, so blocks of any size give the same result as resampling all at once.
+    Longer inputs are worked through BLOCK_SAMPLES at a time.
+    """
+
+    def __init__(self, source_rate, target_rate=16000, taps=24, rolloff=0.9, beta=8.0):
+        source_rate = int(source_rate)
+        target_rate = int(target_rate)
+        common = math.gcd(source_rate, target_rate)
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.up = target_rate // common
+        self.down = source_rate // common
+        self.taps = taps
+        # Kaiser windowed sinc at the upsampled rate, cut off just below the lower Nyquist frequency
+        length = taps * self.up
+        cutoff = rolloff / max(self.up, self.down)
+        n = np.arange(length) - (length - 1) / 2
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(length, beta) * self.up
+        # phases[p] is applied to the input window in time order, so taps are reversed
+        self.phases = np.ascontiguousarray(h.reshape(taps, self.up).T[:, ::-1], dtype=np.float32)
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+        self.received = 0
+        self.produced = 0
+
+    def process(self, samples):
+        if self.up == self.down:
+            return np.asarray(samples, dtype=np.float32)
+        if len(samples) <= BLOCK_SAMPLES:
+            return self.process_block(samples)
+        return np.concatenate([self.process_block(samples[start:start + BLOCK_SAMPLES])
+                               for start in range(0, len(samples), BLOCK_SAMPLES)])
+
+    def process_block(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        # x[0] is input sample received - (taps - 1)
+        x = np.concatenate((self.history, samples))
+        total = self.received + len(samples)
+        # Every output whose newest input sample has arrived
+        end = (total * self.up - 1) // self.down + 1
+        n = np.arange(self.produced, end, dtype=np.int64)
+        t = n * self.down
+        starts = t // self.up - self.received
+        windows = np.lib.stride_tricks.sliding_window_view(x, self.taps)
+        out = np.einsum("ij,ij->i", windows[starts], self.phases[t % self.up])
+        self.history = x[len(x) - (self.taps - 1):].copy()
+        self.received = total
+        self.produced = end
+        return out
+
+    def reset(self):
+        self.history[:] = 0
+        self.received = 0
+        self.produced = 0
+
+
+def resample(audio, source_rate, target_rate=16000):
+    # Whole recording in one call, the filter delays it by taps / 2 input samples
+    return PolyphaseResampler(source_rate, target_rate).process(audio)
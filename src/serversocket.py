@@ -0,0 +1,12 @@
+import os
+import socket
+import tempfile
+
+# Shared by the server, the client and the CLI --help, kept free of numpy and the model code
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "whisperspeechtyping.sock")
+
+
+def require_unix_sockets():
+    # Windows builds of Python have no AF_UNIX, and socketserver has no UnixStreamServer there
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("The remote backend needs Unix domain sockets, which this platform does not have")
@@ -1,12 +1,17 @@
+import threading
 import time
 
-from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal, Slot
 from PySide6.QtWidgets import QWidgetAction, QWidget, QVBoxLayout, QLabel, QComboBox, QHBoxLayout, QLineEdit, \
-    QPushButton
+    QPushButton, QSpinBox
 
 from hotkeysaver import HotkeySaver
 
 class SettingsInterface(QWidgetAction):
+    # The autotuner runs on its own thread, its result (None if it failed) is saved on the GUI thread through
+    # this signal, so the settings subscribers never run next to a Save
+    autotune_finished = Signal(str, str, object)
+
     def __init__(self, config_manager, parent=None, save_settings_callback=None):
         super(SettingsInterface, self).__init__(parent)
         self.config_manager = config_manager
@@ -69,6 +74,34 @@ class SettingsInterface(QWidgetAction):
         model_size_layout.addWidget(self.model_size_input)
         layout.addLayout(model_size_layout)
 
+        # Benchmarks compute types and thread counts for the selected model, takes a few minutes
+        autotune_layout = QHBoxLayout()
+        self.autotune_button = QPushButton("Autotune")
+        self.autotune_button.clicked.connect(self.start_autotune)
+        autotune_layout.addWidget(self.autotune_button)
+        self.autotune_label = QLabel(self.describe_tuning())
+        autotune_layout.addWidget(self.autotune_label)
+        layout.addLayout(autotune_layout)
+        self.autotune_finished.connect(self.finish_autotune)
+
+        # Output mode settings
+        output_mode_layout = QHBoxLayout()
+        output_mode_layout.addWidget(QLabel("Output:"))
+        self.output_mode_input = QComboBox()
+        self.output_mode_input.addItems(["type", "paste"])
+        self.output_mode_input.setCurrentText(self.config_manager.get_setting('output_mode'))
+        output_mode_layout.addWidget(self.output_mode_input)
+        layout.addLayout(output_mode_layout)
+
+        # Texts shorter than this are still typed in paste mode
+        paste_threshold_layout = QHBoxLayout()
+        paste_threshold_layout.addWidget(QLabel("Paste from (characters):"))
+        self.paste_threshold_input = QSpinBox()
+        self.paste_threshold_input.setRange(0, 10000)
+        self.paste_threshold_input.setValue(self.config_manager.get_setting('paste_threshold'))
+        paste_threshold_layout.addWidget(self.paste_threshold_input)
+        layout.addLayout(paste_threshold_layout)
+
         # Save button
         save_button = QPushButton("Save")
         save_button.clicked.connect(self.save_settings)
@@ -94,14 +127,56 @@ class SettingsInterface(QWidgetAction):
         print("Recording Retype Hotkey...")
         self.record_hotkey(self.retype_hotkey_input, self.record_retype_hotkey_button)
 
+    def selected_device(self):
+        return 'cuda' if self.device_input.currentText() == 'gpu' else self.device_input.currentText()
+
+    def describe_tuning(self):
+        from .autotuner import tuned_settings
+        tuned = tuned_settings(self.config_manager, self.model_size_input.currentText(), self.selected_device())
+        if tuned is None:
+            return "Not tuned"
+        return f"{tuned['compute_type']}, {tuned['cpu_threads']} threads, {tuned['num_workers']} workers"
+
+    @Slot()
+    def start_autotune(self):
+        self.autotune_button.setEnabled(False)
+        self.autotune_label.setText("Tuning...")
+        threading.Thread(target=self.run_autotune,
+                         args=(self.model_size_input.currentText(), self.selected_device()), daemon=True).start()
+
+    def run_autotune(self, model_size, device):
+        from .autotuner import autotune
+        try:
+            result, _ = autotune(model_size, device, language=self.config_manager.get_setting('language'),
+                                 clip=self.config_manager.get_setting('autotune_clip'))
+        except Exception as e:
+            print(f"Autotune failed: {e}")
+            result = None
+        self.autotune_finished.emit(model_size, device, result)
+
+    @Slot(str, str, object)
+    def finish_autotune(self, model_size, device, result):
+        from .autotuner import save_tuning
+        if result is None:
+            self.autotune_label.setText("Autotune failed")
+        else:
+            save_tuning(self.config_manager, model_size, device, result)
+            self.autotune_label.setText(f"{result['compute_type']}, {result['cpu_threads']} threads, "
+                                        f"{result['num_workers']} workers")
+        self.autotune_button.setEnabled(True)
+
     @Slot()
     def save_settings(self):
         print("Saving settings...")
-        # Update settings using config manager
-        self.config_manager.update_setting('device', self.device_input.currentText())
-        self.config_manager.update_setting('model_size', self.model_size_input.currentText())
-        self.config_manager.update_setting('hotkey', self.hotkey_input.text())
-        self.config_manager.update_setting('type_hotkey', self.retype_hotkey_input.text())
+        # One write of the settings file, the running components only rebuild what the changes affect
+        self.config_manager.update_settings({
+            'device': self.device_input.currentText(),
+            'model_size': self.model_size_input.currentText(),
+            'hotkey': self.hotkey_input.text(),
+            'type_hotkey': self.retype_hotkey_input.text(),
+            'output_mode': self.output_mode_input.currentText(),
+            'paste_threshold': self.paste_threshold_input.value(),
+        })
         if self.save_callback is not None:
             self.save_callback()
         print("Settings saved.")
@@ -0,0 +1,89 @@
+import contextlib
+import importlib
+import sys
+import threading
+import time
+
+# Import this module before anything heavy so the report starts close to process start
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfiler:
+    """
+    Records how long the startup phases and imports took, for ``--profile-startup``.
+
+    Phases may overlap, e.g. the model loading on a background thread while the hotkeys are
+    already armed, so every record keeps the thread it ran on.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = []
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        with self.lock:
+            self.records.append((name, threading.current_thread().name, start, end))
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    def report(self):
+        with self.lock:
+            records = sorted(self.records, key=lambda record: record[2])
+        lines = [f"{'phase':<40} {'thread':<16} {'start ms':>10} {'took ms':>10}"]
+        for name, thread, start, end in records:
+            lines.append(f"{name:<40} {thread[:16]:<16} {(start - PROCESS_START) * 1000:>10.1f} "
+                         f"{(end - start) * 1000:>10.1f}")
+        return "\n".join(lines)
+
+
+startup_profiler = StartupProfiler()
+
+
+class LazyModule:
+    # Stands in for a module until an attribute is first used, then imports it for real
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                already_imported = self._name in sys.modules
+                with startup_profiler.phase(f"import {self._name}") if not already_imported \
+                        else contextlib.nullcontext():
+                    module = importlib.import_module(self._name)
+                if self._on_load is not None:
+                    self._on_load(module)
+                self._module = module
+        return self._module
+
+    def preload(self):
+        # Imports on a background thread so the first real use doesn't pay for it
+        threading.Thread(target=self._preload, name=f"import {self._name}", daemon=True).start()
+
+    def _preload(self):
+        try:
+            self._load()
+        except Exception as e:
+            # Raised again where the module is actually used
+            print(f"Error importing {self._name}: {e}")
+
+    def __getattr__(self, attribute):
+        return getattr(self._module or self._load(), attribute)
+
+
+def lazy_import(name, on_load=None):
+    return LazyModule(name, on_load)
@@ -0,0 +1,124 @@
+import threading
+
+import numpy as np
+
+
+def find_last_pause(audio, sample_rate=16000, min_silence_seconds=0.4, frame_seconds=0.02):
+    # Returns the sample index in the middle of the last pause in the audio, or None.
+    frame = int(frame_seconds * sample_rate)
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return None
+    energy = np.sqrt(np.mean(np.square(audio[:frame_count * frame].reshape(frame_count, frame)), axis=1))
+    # Adaptive threshold relative to the quietest frames, so it works with noisy microphones too
+    threshold = max(np.percentile(energy, 10) * 3.0, 0.004)
+    silent = energy < threshold
+    min_frames = max(int(min_silence_seconds / frame_seconds), 1)
+    run_end = None
+    for i in range(frame_count - 1, -1, -1):
+        if silent[i]:
+            if run_end is None:
+                run_end = i + 1
+            if run_end - i >= min_frames and (i == 0 or not silent[i - 1]):
+                return ((i + run_end) // 2) * frame
+        elif run_end is not None:
+            run_end = None
+    return None
+
+
+def find_quietest_point(audio, sample_rate=16000, frame_seconds=0.02):
+    # Fallback cut when someone talks for a long time without pausing
+    frame = int(frame_seconds * sample_rate)
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return len(audio)
+    energy = np.mean(np.square(audio[:frame_count * frame].reshape(frame_count, frame)), axis=1)
+    # Ignore the first half so chunks don't become tiny
+    start = frame_count // 2
+    return (start + int(np.argmin(energy[start:]))) * frame
+
+
+class StreamingSession:
+    """
+    Transcribes a recording incrementally while it is still being captured.
+
+    Every ``interval`` seconds the audio captured so far is read from ``source`` (a callable
+    returning a view of the recording) and everything up to the last detected pause is
+    transcribed and confirmed. When the recording ends only the unconfirmed tail is left.
+
+    If ``on_partial`` is given, the unconfirmed tail is also decoded on every step and the
+    callback receives the running hypothesis (confirmed text plus tail) for live typing.
+    """
+
+    def __init__(self, transcriber, source, sample_rate=16000, interval=1.0, min_chunk_seconds=3.0,
+                 max_chunk_seconds=25.0, on_partial=None, min_partial_seconds=1.0):
+        self.transcriber = transcriber
+        self.source = source
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.min_chunk = int(min_chunk_seconds * sample_rate)
+        self.max_chunk = int(max_chunk_seconds * sample_rate)
+        self.on_partial = on_partial
+        self.min_partial = int(min_partial_seconds * sample_rate)
+        self.confirmed_samples = 0
+        self.confirmed_text = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.step(self.source())
+            except Exception as e:
+                print(f"Error during streaming transcription: {e}")
+
+    def step(self, audio):
+        with self.lock:
+            if self.stop_event.is_set():
+                return
+            pending = audio[self.confirmed_samples:]
+            if len(pending) >= self.min_chunk:
+                cut = find_last_pause(pending, self.sample_rate)
+                if cut is not None and cut < self.min_chunk:
+                    cut = None
+                if cut is None and len(pending) >= self.max_chunk:
+                    cut = find_quietest_point(pending, self.sample_rate)
+                if cut is not None:
+                    text = self.transcriber.transcribe_chunk(pending[:cut], prompt=self.prompt())
+                    if text:
+                        self.confirmed_text.append(text)
+                    self.confirmed_samples += cut
+                    pending = pending[cut:]
+            if self.on_partial is not None:
+                hypothesis = list(self.confirmed_text)
+                if len(pending) >= self.min_partial:
+                    tail = self.transcriber.transcribe_chunk(pending, prompt=self.prompt())
+                    if tail:
+                        hypothesis.append(tail)
+                self.on_partial(" ".join(hypothesis))
+
+    def prompt(self):
+        # Condition each chunk on what was already confirmed to keep casing and punctuation consistent
+        return " ".join(self.confirmed_text)[-200:] or None
+
+    def finish(self, audio, trace=None):
+        self.stop_event.set()
+        # Waits for a chunk that is being decoded right now, then decodes only the rest
+        with self.lock:
+            if trace is not None:
+                trace.mark("transcribe_start")
+            tail = audio[self.confirmed_samples:]
+            if len(tail) > 0:
+                text = self.transcriber.transcribe_chunk(tail, prompt=self.prompt(), trace=trace)
+                if text:
+                    self.confirmed_text.append(text)
+            text = " ".join(self.confirmed_text)
+            if trace is not None:
+                trace.mark("transcribe_end")
+        self.thread.join()
+        return text
+
+    def cancel(self):
+        self.stop_event.set()
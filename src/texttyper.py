@@ -1,50 +1,221 @@
-import pyautogui
-import pyperclip
+import contextlib
+import functools
+import re
+import sys
+import threading
 import time
-import random
+
+from .startupprofile import lazy_import
+from .typingbackends import create_delay_policy, create_typing_backend
+
+# Imported in the background when the first TextTyper is created, not at startup
+pyperclip = lazy_import("pyperclip")
+
+
+PASTE_KEYS = ('command', 'v') if sys.platform == 'darwin' else ('ctrl', 'v')
+
+
+def minimal_edit(old, new):
+    """
+    Keystrokes that turn the already typed ``old`` into ``new`` with the cursor at the end.
+
+    Whole words are kept when they match at the start or the end. Returns (left, backspaces, insert):
+    move the cursor left ``left`` times, delete ``backspaces`` characters, type ``insert`` and
+    move right ``left`` times again. Moving around the unchanged end is only done when that is
+    cheaper than deleting and retyping it.
+    """
+    old_words = re.findall(r"\s*\S+\s*|\s+", old)
+    new_words = re.findall(r"\s*\S+\s*|\s+", new)
+    prefix = 0
+    while prefix < min(len(old_words), len(new_words)) and old_words[prefix] == new_words[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(old_words), len(new_words)) - prefix
+           and old_words[-1 - suffix] == new_words[-1 - suffix]):
+        suffix += 1
+    prefix_length = sum(len(word) for word in old_words[:prefix])
+    suffix_length = sum(len(word) for word in old_words[len(old_words) - suffix:])
+    retype = (0, len(old) - prefix_length, new[prefix_length:])
+    around = (suffix_length, len(old) - prefix_length - suffix_length, new[prefix_length:len(new) - suffix_length])
+    retype_cost = retype[1] + len(retype[2])
+    around_cost = 2 * around[0] + around[1] + len(around[2])
+    return around if around_cost < retype_cost else retype
+
+
+def produces_output(method):
+    # Keystrokes sent from these methods don't count as the user typing
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.output():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class TypingJob:
+    """
+    One text being typed, controlled from other threads. cancel() stops it after the keystroke being
+    sent, hurry() types the rest without delays. Both cut a running delay short.
+    """
+
+    def __init__(self, sequence=None, fast=False, on_progress=None, progress_interval=0.5):
+        self.sequence = sequence
+        self.cancelled = False
+        self.fast = fast
+        self.typed = 0
+        self.total = 0
+        self.wake = threading.Event()
+        # Called with the job at most every progress_interval seconds while typing
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.last_progress = time.monotonic()
+
+    def cancel(self):
+        self.cancelled = True
+        self.wake.set()
+
+    def hurry(self):
+        self.fast = True
+        self.wake.set()
+
+    def wait(self, delay):
+        self.wake.wait(delay)
+
+    def progress(self, typed):
+        self.typed = typed
+        now = time.monotonic()
+        if self.on_progress is not None and now - self.last_progress >= self.progress_interval:
+            self.last_progress = now
+            self.on_progress(self)
 
 
 class TextTyper:
-    def __init__(self):
-        pyautogui.PAUSE = 0
-        pass
+    def __init__(self, output_mode="type", paste_threshold=0, restore_delay=0.15, activity_monitor=None,
+                 backend="pyautogui", delay="human"):
+        pyperclip.preload()
+        # Sends the keystrokes (see typingbackends.py), the delay policy spaces them out
+        self.backend = create_typing_backend(backend)
+        self.delay_policy = create_delay_policy(delay)
+        # "type" simulates keystrokes, "paste" inserts texts of at least paste_threshold characters via the clipboard
+        self.output_mode = output_mode
+        self.paste_threshold = paste_threshold
+        self.restore_delay = restore_delay
+        # Needed to tell whether the user typed something since a draft was typed
+        self.activity_monitor = activity_monitor
+        self.output_serial = 0
+
+    @contextlib.contextmanager
+    def output(self):
+        self.output_serial += 1
+        if self.activity_monitor is None:
+            yield
+        else:
+            with self.activity_monitor.output():
+                yield
 
-    def type_text(self, text):
+    def checkpoint(self):
+        # Changes whenever anything was typed, by us or by the user
+        user_serial = self.activity_monitor.user_serial if self.activity_monitor is not None else None
+        return self.output_serial, user_serial
+
+    @produces_output
+    def type_text(self, text, trace=None, job=None):
+        """
+        :param job: TypingJob that can cancel or speed up typing from another thread.
+        :return: How many characters were typed.
+        """
         if text is None:
             print("Error, text empty.")
-            return
+            return 0
 
-        try:
-
-            # Base typing speed: ~80 WPM (0.15 seconds per character)
-            base_delay = 0.10
+        if self.output_mode == "paste" and len(text) >= self.paste_threshold:
+            self.paste_text(text, trace=trace)
+            return len(text)
 
+        start = 0
+        if job is not None:
+            job.total = len(text)
+        try:
+            # Characters without a delay between them are sent to the backend in one batch
             for i, char in enumerate(text):
-                # Add natural variation to typing speed
-                # Faster for common letters, slower for punctuation and capitals
-                if char.isupper():
-                    delay = base_delay * random.uniform(1.2, 1.8)  # Slower for capitals
-                elif char in 'aeioutnshrdl':  # Common letters
-                    delay = base_delay * random.uniform(0.7, 1.0)  # Faster for common letters
-                else:
-                    delay = base_delay * random.uniform(0.9, 1.3)  # Normal variation
-
-                # Occasionally add longer pauses (like thinking pauses)
-                if random.random() < 0.04:  # 2% chance
-                    delay += random.uniform(0.6, 0.9)
-                # Type the character
-                pyautogui.write(char)
-                # Delay after typing.
-                if char == ' ':
-                    delay = base_delay * random.uniform(1, 1.9)  # Slight variation for spaces
-                elif char in '.,!?;:\n':
-                    delay = base_delay * random.uniform(1.5, 2.5)  # Pause at punctuation
-                # Don't add delay after the last character
-                if i < len(text) - 1:
-                    time.sleep(delay)
+                if job is not None and job.cancelled:
+                    break
+                last = i == len(text) - 1
+                delay = 0.0 if last or (job is not None and job.fast) else self.delay_policy(char)
+                if delay <= 0 and not last:
+                    continue
+                self.backend.write(text[start:i + 1])
+                if start == 0 and trace is not None:
+                    trace.mark("first_char")
+                start = i + 1
+                if job is not None:
+                    job.progress(start)
+                if delay > 0:
+                    if job is not None:
+                        job.wait(delay)
+                    else:
+                        time.sleep(delay)
 
         except Exception as e:
             print(f"Error while typing: {e}")
-    def safe_type_text(self, text):
-        pyautogui.typewrite(text)
+        return start
+
+    @produces_output
+    def paste_text(self, text, trace=None):
+        try:
+            previous = pyperclip.paste()
+        except pyperclip.PyperclipException:
+            previous = None
+        try:
+            pyperclip.copy(text)
+            self.backend.hotkey(*PASTE_KEYS)
+            if trace is not None:
+                trace.mark("first_char")
+            # Give the target application a moment to read the clipboard before restoring it
+            time.sleep(self.restore_delay)
+        except Exception as e:
+            print(f"Error while pasting: {e}")
+        finally:
+            if previous is not None:
+                pyperclip.copy(previous)
+
+    @produces_output
+    def safe_type_text(self, text, trace=None):
+        self.backend.write(text)
+        if trace is not None:
+            trace.mark("first_char")
+
+    @produces_output
+    def delete_text(self, count):
+        # Backspaces over the last ``count`` typed characters, e.g. for "delete that"
+        self.backend.press('backspace', presses=count)
+
+    def correct_text(self, old, new, checkpoint, trace=None):
+        """
+        Replace the just typed ``old`` with ``new`` by editing only the words that differ.
+
+        :param checkpoint: The checkpoint() taken right after ``old`` was typed. If anything was typed
+                           since, the cursor may be somewhere else and nothing is changed.
+        :return: "unchanged", "skipped" or "corrected".
+        """
+        if old == new:
+            return "unchanged"
+        if checkpoint != self.checkpoint():
+            return "skipped"
+        left, backspaces, insert = minimal_edit(old, new)
+        with self.output():
+            if left:
+                self.backend.press('left', presses=left)
+            if backspaces:
+                self.backend.press('backspace', presses=backspaces)
+            if insert:
+                self.backend.write(insert)
+                if trace is not None:
+                    trace.mark("first_char")
+            if left:
+                self.backend.press('right', presses=left)
+        return "corrected"
 
+    def stop(self):
+        if self.activity_monitor is not None:
+            self.activity_monitor.stop()
+        self.backend.close()
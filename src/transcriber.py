@@ -8,11 +8,13 @@ class Transcriber(ABC):
     """
 
     @abstractmethod
-    def transcribe_audio(self, audio):
+    def transcribe_audio(self, audio, trace=None):
         """
         Transcribe the given audio. This method should be implemented by all subclasses.
 
-        :param audio: The audio to transcribe.
+        :param audio: The audio to transcribe, either a 16 kHz mono float32 NumPy array
+                      or a file-like object / path that faster_whisper can decode.
+        :param trace: Optional UtteranceTrace to mark the transcription stages on.
         :return: The transcribed text.
         """
         pass
@@ -23,7 +25,62 @@ class Transcriber(ABC):
         Set the transcription backend (local or remote).
         """
         pass
-    # TODO: start and stop methods to release resources
+    def start_streaming(self, source, on_partial=None):
+        """
+        Start transcribing a recording while it is still being captured.
+
+        :param source: Callable returning the audio captured so far.
+        :param on_partial: Optional callback receiving the running transcription after each decode.
+        :return: A session to pass to finish_streaming, or None if streaming is not supported.
+        """
+        return None
+
+    def finish_streaming(self, session, audio, trace=None):
+        """
+        Finish a streaming session once the recording has stopped.
+
+        :param session: The session returned by start_streaming.
+        :param audio: The complete recording.
+        :param trace: Optional UtteranceTrace to mark the transcription stages on.
+        :return: The transcribed text.
+        """
+        return self.transcribe_audio(audio, trace=trace)
+
+    def transcribe_batch(self, audios, traces=None, vad_filters=None):
+        """
+        Transcribe several recordings, batched together if the implementation supports it.
+
+        :param audios: List of recordings, see transcribe_audio.
+        :param traces: Optional list of UtteranceTraces, one per recording.
+        :param vad_filters: Optional list, True for recordings that still contain silence and need voice
+                            activity detection, None to leave it to the transcriber's own setting.
+        :return: List of transcribed texts in the same order.
+        """
+        traces = traces or [None] * len(audios)
+        return [self.transcribe_audio(audio, trace=trace) for audio, trace in zip(audios, traces)]
+
+    def transcribe_draft(self, audio, trace=None, vad_filter=None):
+        """
+        Quickly transcribe the given audio with a smaller model, to be corrected by transcribe_audio later.
+
+        :param audio: The audio to transcribe.
+        :param trace: Optional UtteranceTrace to mark the transcription stages on.
+        :param vad_filter: See transcribe_batch.
+        :return: The draft text, or None if this transcriber has no draft model.
+        """
+        return None
+
+    def unload(self):
+        """
+        Release the model while the application is idle. Does nothing for transcribers without a local model.
+        """
+        pass
+
+    def resume(self):
+        """
+        Load the model again after unload. Blocks until it is ready.
+        """
+        pass
 
     @abstractmethod
     def stop(self):
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from .serversocket import DEFAULT_SOCKET_PATH, require_unix_sockets
+
+# The server class below can only be defined where Unix domain sockets exist
+require_unix_sockets()
+
+
+def attach_shared_memory(name):
+    # The client owns the block. Before Python 3.13 attaching registers it with this process's
+    # resource tracker too, which would unlink it behind the client's back on exit.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class TranscriptionRequestHandler(socketserver.StreamRequestHandler):
+    # One JSON object per line in each direction, a connection can send any number of requests
+    def handle(self):
+        server = self.server
+        server.client_connected(1)
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    response = server.handle_request_message(request)
+                except Exception as e:
+                    response = {"status": "error", "error": str(e)}
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        finally:
+            server.client_connected(-1)
+
+
+class TranscriptionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-lived local server that keeps a model loaded for any number of front-ends.
+
+    Clients connect over a Unix domain socket and pass the audio in a shared memory block,
+    only its name and length travel over the socket.
+    """
+    daemon_threads = True
+
+    def __init__(self, transcriber, socket_path=DEFAULT_SOCKET_PATH):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.transcriber = transcriber
+        self.socket_path = socket_path
+        self.started = time.time()
+        self.clients = 0
+        self.requests = 0
+        self.stats_lock = threading.Lock()
+        super().__init__(socket_path, TranscriptionRequestHandler)
+        # Localhost only, but still no reason to let other users talk to it
+        os.chmod(socket_path, 0o600)
+
+    def client_connected(self, delta):
+        with self.stats_lock:
+            self.clients += delta
+
+    def handle_request_message(self, request):
+        op = request.get("op")
+        if op == "health":
+            return self.health()
+        if op == "transcribe":
+            with self.stats_lock:
+                self.requests += 1
+            return {"status": "ok", "text": self.transcribe_shared(request)}
+        return {"status": "error", "error": f"Unknown op: {op}"}
+
+    def health(self):
+        with self.stats_lock:
+            return {
+                "status": "ok",
+                "ready": self.transcriber.model is not None,
+                "model_size": self.transcriber.model_size,
+                "device": self.transcriber.device,
+                "compute_type": self.transcriber.compute_type,
+                "clients": self.clients,
+                "requests": self.requests,
+                "uptime": time.time() - self.started,
+            }
+
+    def transcribe_shared(self, request):
+        shm = attach_shared_memory(request["shm"])
+        try:
+            audio = np.ndarray((request["samples"],), dtype=np.float32, buffer=shm.buf)
+            text = self.transcriber.transcribe_audio(audio, language=request.get("language"))
+            # The view has to be gone before the block can be closed
+            del audio
+            return text
+        finally:
+            shm.close()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def serve(model_size, compute_type, language, device, socket_path=DEFAULT_SOCKET_PATH, cpu_threads=0, num_workers=1):
+    from .localtranscriber import LocalTranscriber
+
+    # num_workers > 1 lets several clients decode at the same time
+    transcriber = LocalTranscriber(model_size=model_size, compute_type=compute_type, language=language, device=device,
+                                   cpu_threads=cpu_threads, num_workers=num_workers)
+    server = TranscriptionServer(transcriber, socket_path)
+    print(f"Transcription server listening on {socket_path}. Press Ctrl + C to exit")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Keyboard interrupt detected. Stopping server...")
+    finally:
+        server.server_close()
+        transcriber.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local transcription server.')
+    parser.add_argument('--model_size', type=str, default='medium', help='Size of the Whisper model')
+    parser.add_argument('--device', type=str, default='cuda', help='Device to run the Whisper model on')
+    parser.add_argument('--compute_type', type=str, default='float16', help='Compute datatype for the Whisper model')
+    parser.add_argument('--language', type=str, default='en', help='Language for the Whisper model')
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET_PATH, help='Path of the Unix domain socket')
+    parser.add_argument('--num_workers', type=int, default=2, help='Number of transcriptions that can run in parallel')
+    args = parser.parse_args()
+    serve(args.model_size, args.compute_type, args.language, args.device, socket_path=args.socket,
+          num_workers=args.num_workers)
@@ -0,0 +1,325 @@
+import collections
+import os
+import random
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from .startupprofile import lazy_import
+
+# Imported in the background when the first backend is created, not at startup
+pyautogui = lazy_import("pyautogui", on_load=lambda module: setattr(module, "PAUSE", 0))
+
+# pyautogui key names -> X keysym names
+X_KEY_NAMES = {
+    "backspace": "BackSpace", "left": "Left", "right": "Right", "up": "Up", "down": "Down", "enter": "Return",
+    "return": "Return", "tab": "Tab", "esc": "Escape", "escape": "Escape", "delete": "Delete", "home": "Home",
+    "end": "End", "ctrl": "Control_L", "shift": "Shift_L", "alt": "Alt_L", "command": "Super_L", "win": "Super_L",
+    "space": "space",
+}
+X_CHAR_KEYSYMS = {"\n": 0xff0d, "\t": 0xff09}
+
+
+class TypingMetrics:
+    # Keystrokes sent and the time the backend spent sending them, deliberate delays not included
+    def __init__(self, history=1000):
+        self.lock = threading.Lock()
+        self.characters = 0
+        self.events = 0
+        self.send_seconds = 0.0
+        self.event_seconds = collections.deque(maxlen=history)
+
+    def record(self, characters, events, seconds):
+        with self.lock:
+            self.characters += characters
+            self.events += events
+            self.send_seconds += seconds
+            if events:
+                self.event_seconds.append(seconds / events)
+
+    def as_dict(self):
+        with self.lock:
+            latencies = sorted(self.event_seconds)
+            return {
+                "characters": self.characters,
+                "events": self.events,
+                "chars_per_second": self.characters / self.send_seconds if self.send_seconds else None,
+                "event_us_p50": latencies[len(latencies) // 2] * 1e6 if latencies else None,
+                "event_us_p99": latencies[int(len(latencies) * 0.99)] * 1e6 if latencies else None,
+            }
+
+    def summary(self):
+        metrics = self.as_dict()
+        if not metrics["events"]:
+            return "nothing typed"
+        return (f"{metrics['characters']} chars in {metrics['events']} key events, "
+                f"{metrics['chars_per_second']:.0f} chars/s while sending, "
+                f"{metrics['event_us_p50']:.0f} us per event (p99 {metrics['event_us_p99']:.0f} us)")
+
+
+class TypingBackend(ABC):
+    """
+    Sends keystrokes to the focused window. Subclasses implement send_text, send_key and send_hotkey,
+    write, press and hotkey wrap them with the metrics.
+    """
+    name = None
+
+    def __init__(self):
+        self.metrics = TypingMetrics()
+
+    def write(self, text):
+        start = time.perf_counter()
+        self.send_text(text)
+        self.metrics.record(len(text), len(text), time.perf_counter() - start)
+
+    def press(self, key, presses=1):
+        start = time.perf_counter()
+        self.send_key(key, presses)
+        self.metrics.record(0, presses, time.perf_counter() - start)
+
+    def hotkey(self, *keys):
+        start = time.perf_counter()
+        self.send_hotkey(keys)
+        self.metrics.record(0, len(keys), time.perf_counter() - start)
+
+    @abstractmethod
+    def send_text(self, text):
+        """
+        Type the text as it is, newlines and tabs included.
+        """
+        pass
+
+    @abstractmethod
+    def send_key(self, key, presses):
+        """
+        Tap a key given by its pyautogui name ("backspace", "left", ...) ``presses`` times.
+        """
+        pass
+
+    @abstractmethod
+    def send_hotkey(self, keys):
+        """
+        Press the keys in order and release them in reverse, e.g. ("ctrl", "v").
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(TypingBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        super().__init__()
+        pyautogui.preload()
+
+    def send_text(self, text):
+        pyautogui.write(text)
+
+    def send_key(self, key, presses):
+        pyautogui.press(key, presses=presses)
+
+    def send_hotkey(self, keys):
+        pyautogui.hotkey(*keys)
+
+
+class XTestBackend(TypingBackend):
+    """
+    X11 XTEST through python-xlib (optional). All key events of a string are queued on the X
+    connection and flushed with one round trip, instead of one library call per character.
+
+    Characters without a key in the current layout are typed by briefly mapping them to a spare
+    keycode, like xdotool does.
+    """
+    name = "xtest"
+
+    def __init__(self):
+        super().__init__()
+        if not sys.platform.startswith("linux") or not os.environ.get("DISPLAY"):
+            raise RuntimeError("XTest needs an X11 display")
+        try:
+            from Xlib import X, XK, display
+            from Xlib.ext import xtest
+        except ImportError:
+            raise RuntimeError("XTest needs python-xlib (pip install python-xlib)")
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+        self.display = display.Display()
+        if not self.display.has_extension("XTEST"):
+            raise RuntimeError("The X server has no XTEST extension")
+        self.keycodes = {}
+        self.spare_keycode = self.find_spare_keycode()
+
+    def find_spare_keycode(self):
+        first = self.display.display.info.min_keycode
+        count = self.display.display.info.max_keycode - first + 1
+        for offset, keysyms in enumerate(self.display.get_keyboard_mapping(first, count)):
+            if not any(keysyms):
+                return first + offset
+        return None
+
+    def keycode(self, keysym):
+        # (keycode, needs shift), None if the layout has no key for it
+        if keysym not in self.keycodes:
+            code = self.display.keysym_to_keycode(keysym)
+            if not code:
+                self.keycodes[keysym] = None
+            elif self.display.keycode_to_keysym(code, 0) == keysym:
+                self.keycodes[keysym] = (code, False)
+            elif self.display.keycode_to_keysym(code, 1) == keysym:
+                self.keycodes[keysym] = (code, True)
+            else:
+                self.keycodes[keysym] = None
+        return self.keycodes[keysym]
+
+    def char_keysym(self, char):
+        if char in X_CHAR_KEYSYMS:
+            return X_CHAR_KEYSYMS[char]
+        code = ord(char)
+        # Latin-1 keysyms are the code points, everything else is 0x01000000 + code point
+        return code if 0x20 <= code <= 0x7e or 0xa0 <= code <= 0xff else 0x01000000 + code
+
+    def key_keysym(self, key):
+        return self.XK.string_to_keysym(X_KEY_NAMES.get(key.lower(), key))
+
+    def tap(self, code, shift=False):
+        shift_code = self.display.keysym_to_keycode(self.XK.XK_Shift_L) if shift else None
+        if shift_code:
+            self.xtest.fake_input(self.display, self.X.KeyPress, shift_code)
+        self.xtest.fake_input(self.display, self.X.KeyPress, code)
+        self.xtest.fake_input(self.display, self.X.KeyRelease, code)
+        if shift_code:
+            self.xtest.fake_input(self.display, self.X.KeyRelease, shift_code)
+
+    def send_text(self, text):
+        for char in text:
+            keysym = self.char_keysym(char)
+            mapped = self.keycode(keysym)
+            if mapped is not None:
+                self.tap(*mapped)
+            elif self.spare_keycode is not None:
+                self.tap_remapped(keysym)
+        self.display.sync()
+
+    def tap_remapped(self, keysym):
+        # The mapping change has to reach the server before the key event, and be undone after it
+        self.display.sync()
+        self.display.change_keyboard_mapping(self.spare_keycode, [(keysym, keysym)])
+        self.display.sync()
+        self.tap(self.spare_keycode)
+        self.display.sync()
+        self.display.change_keyboard_mapping(self.spare_keycode, [(0, 0)])
+
+    def send_key(self, key, presses):
+        mapped = self.keycode(self.key_keysym(key))
+        if mapped is None:
+            raise ValueError(f"No key for {key}")
+        for _ in range(presses):
+            self.tap(*mapped)
+        self.display.sync()
+
+    def send_hotkey(self, keys):
+        codes = [self.keycode(self.key_keysym(key)) for key in keys]
+        if None in codes:
+            raise ValueError(f"No key for one of {keys}")
+        for code, _ in codes:
+            self.xtest.fake_input(self.display, self.X.KeyPress, code)
+        for code, _ in reversed(codes):
+            self.xtest.fake_input(self.display, self.X.KeyRelease, code)
+        self.display.sync()
+
+    def close(self):
+        self.display.close()
+
+
+class RecordingBackend(TypingBackend):
+    # Sends nothing, keeps every event with a timestamp, for tests and benchmarks
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def send_text(self, text):
+        self.events.append((time.monotonic(), "text", text))
+
+    def send_key(self, key, presses):
+        self.events.append((time.monotonic(), "key", (key, presses)))
+
+    def send_hotkey(self, keys):
+        self.events.append((time.monotonic(), "hotkey", tuple(keys)))
+
+    def text(self):
+        # What the focused field would contain after the texts, backspaces and left/right cursor moves
+        typed = ""
+        cursor = 0
+        for _, kind, value in self.events:
+            if kind == "text":
+                typed = typed[:cursor] + value + typed[cursor:]
+                cursor += len(value)
+            elif kind == "key" and value[0] == "backspace":
+                start = max(cursor - value[1], 0)
+                typed = typed[:start] + typed[cursor:]
+                cursor = start
+            elif kind == "key" and value[0] == "left":
+                cursor = max(cursor - value[1], 0)
+            elif kind == "key" and value[0] == "right":
+                cursor = min(cursor + value[1], len(typed))
+        return typed
+
+
+TYPING_BACKENDS = {backend.name: backend for backend in (PyAutoGuiBackend, XTestBackend, RecordingBackend)}
+
+
+def create_typing_backend(name="pyautogui"):
+    # "auto" prefers XTest on X11, anything that can't be used falls back to pyautogui
+    if name == "auto":
+        name = "xtest" if sys.platform.startswith("linux") and os.environ.get("DISPLAY") else "pyautogui"
+    try:
+        return TYPING_BACKENDS[name]()
+    except KeyError:
+        print(f"Unknown typing backend '{name}', using pyautogui")
+    except RuntimeError as e:
+        print(f"{e}, using pyautogui")
+    return PyAutoGuiBackend()
+
+
+class HumanDelay:
+    # About 80 WPM with natural variation: faster for common letters, slower for capitals and punctuation
+    def __init__(self, base_delay=0.10):
+        self.base_delay = base_delay
+
+    def __call__(self, char):
+        if char == ' ':
+            return self.base_delay * random.uniform(1, 1.9)
+        if char in '.,!?;:\n':
+            return self.base_delay * random.uniform(1.5, 2.5)
+        if char.isupper():
+            delay = self.base_delay * random.uniform(1.2, 1.8)
+        elif char in 'aeioutnshrdl':
+            delay = self.base_delay * random.uniform(0.7, 1.0)
+        else:
+            delay = self.base_delay * random.uniform(0.9, 1.3)
+        # Occasionally a longer thinking pause
+        if random.random() < 0.04:
+            delay += random.uniform(0.6, 0.9)
+        return delay
+
+
+class NoDelay:
+    # Everything in one batch, as fast as the backend can send it
+    def __call__(self, char):
+        return 0.0
+
+
+DELAY_POLICIES = {"human": HumanDelay, "none": NoDelay}
+
+
+def create_delay_policy(name="human"):
+    if name not in DELAY_POLICIES:
+        print(f"Unknown typing delay '{name}', using human")
+        name = "human"
+    return DELAY_POLICIES[name]()
@@ -0,0 +1,110 @@
+import collections
+
+import numpy as np
+
+
+class IncrementalVad:
+    """
+    Energy based voice activity detection that runs on each audio block as it arrives.
+
+    Speech segments are kept as (start, end) sample positions counted from the first sample
+    ever processed, so they can be matched to any capture without another pass over the audio.
+
+    The noise floor starts at initial_floor, a quiet room, so speech right from the first frame is
+    still detected. It follows the background level down at once and up to the quietest frame of
+    each floor_window_seconds, which holds some background even while someone keeps talking.
+    """
+
+    def __init__(self, sample_rate=16000, frame_seconds=0.02, threshold_ratio=3.0, min_threshold=0.003,
+                 min_speech_seconds=0.06, hangover_seconds=0.3, initial_floor=0.001, floor_window_seconds=3.0):
+        self.sample_rate = sample_rate
+        self.frame = int(frame_seconds * sample_rate)
+        self.threshold_ratio = threshold_ratio
+        self.min_threshold = min_threshold
+        self.min_speech_frames = max(int(min_speech_seconds / frame_seconds), 1)
+        self.hangover_frames = max(int(hangover_seconds / frame_seconds), 1)
+        self.carry = np.zeros(self.frame, dtype=np.float32)
+        self.carry_length = 0
+        self.received = 0
+        self.noise_floor = initial_floor
+        self.floor_window_frames = max(int(floor_window_seconds / frame_seconds), 1)
+        self.window_frames = 0
+        self.window_minimum = float("inf")
+        self.segments = collections.deque()
+        self.segment_start = None
+        self.reset_state()
+
+    def reset_state(self):
+        self.close_segment(self.received - self.carry_length)
+        self.carry_length = 0
+        self.speech_run = 0
+        self.silence_run = 0
+        self.segment_start = None
+
+    def process(self, samples):
+        # Frames start where the carried-over remainder of the last block starts
+        position = self.received - self.carry_length
+        self.received += len(samples)
+        if self.carry_length:
+            samples = np.concatenate((self.carry[:self.carry_length], samples))
+        frame_count = len(samples) // self.frame
+        used = frame_count * self.frame
+        self.carry_length = len(samples) - used
+        self.carry[:self.carry_length] = samples[used:]
+        if frame_count == 0:
+            return
+        energy = np.sqrt(np.mean(np.square(samples[:used].reshape(frame_count, self.frame)), axis=1))
+        for i, frame_energy in enumerate(energy.tolist()):
+            self.update(frame_energy, position + i * self.frame)
+
+    def update(self, energy, position):
+        self.track_minimum(energy)
+        threshold = max(self.noise_floor * self.threshold_ratio, self.min_threshold)
+        if energy >= threshold:
+            self.speech_run += 1
+            self.silence_run = 0
+            if self.segment_start is None and self.speech_run >= self.min_speech_frames:
+                self.segment_start = position - (self.speech_run - 1) * self.frame
+        else:
+            self.speech_run = 0
+            self.silence_run += 1
+            # Track the background level only outside of speech, quickly downwards and slowly upwards
+            if energy < self.noise_floor:
+                self.noise_floor = energy
+            else:
+                self.noise_floor = 0.98 * self.noise_floor + 0.02 * energy
+            if self.segment_start is not None and self.silence_run >= self.hangover_frames:
+                self.close_segment(position - (self.silence_run - 1) * self.frame)
+
+    def track_minimum(self, energy):
+        self.window_minimum = min(self.window_minimum, energy)
+        self.window_frames += 1
+        if self.window_frames >= self.floor_window_frames:
+            # Half way up on a log scale per window, a single loud window can't make the floor jump
+            if self.window_minimum > self.noise_floor:
+                self.noise_floor = float(np.sqrt(self.noise_floor * self.window_minimum))
+            self.window_frames = 0
+            self.window_minimum = float("inf")
+
+    def close_segment(self, end):
+        if self.segment_start is not None:
+            self.segments.append((self.segment_start, end))
+            self.segment_start = None
+
+    def prune(self, before):
+        # Forget segments that ended before the given position
+        while self.segments and self.segments[0][1] < before:
+            self.segments.popleft()
+
+    def speech_segments(self, start, end):
+        segments = [(max(s, start), min(e, end)) for s, e in self.segments if e > start and s < end]
+        if self.segment_start is not None and self.segment_start < end:
+            segments.append((max(self.segment_start, start), end))
+        return segments
+
+    def speech_bounds(self, start, end):
+        # First and last speech sample between start and end, or None if it was all silence
+        segments = self.speech_segments(start, end)
+        if not segments:
+            return None
+        return segments[0][0], segments[-1][1]
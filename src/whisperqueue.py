@@ -1,15 +1,113 @@
-from queue import Queue
+import collections
+import queue
+import threading
 
 
-class WhisperQueue(Queue):
-    def __init__(self):
-        super().__init__()
+class BusMessage:
+    def __init__(self, status, component, message):
+        self.status = status
+        self.component = component
+        self.message = message
+
+    def __getitem__(self, key):
+        # Lets older code keep reading messages like the dicts they used to be
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.status!r}, {self.component!r}, {self.message!r})"
+
+
+class StatusMessage(BusMessage):
+    # Changes what the application is doing right now (recording, typing, ...), drives the status icons
+    pass
+
+
+class InfoMessage(BusMessage):
+    # Queue depths, traces, cache statistics and similar reports that don't change the status
+    pass
+
+
+class Subscription:
+    def __init__(self, callback, message_types, coalesce):
+        self.callback = callback
+        self.message_types = message_types
+        self.coalesce = coalesce
+        self.last_status = None
+
+
+class WhisperQueue:
+    """
+    Event bus for status and info messages between the components and the GUIs.
+
+    Messages are delivered synchronously to every subscriber on the sending thread, so nothing
+    polls and nothing wakes up while the application is idle. Subscribers that only care about
+    the current state can ask for coalescing, repeated messages with the same status are then
+    skipped for them.
+    """
+
+    def __init__(self, log_messages=True):
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.metrics = MetricsSink()
+        self.subscribe(self.metrics, message_types=(StatusMessage, InfoMessage))
+        if log_messages:
+            self.subscribe(log_sink, message_types=(StatusMessage,))
+
+    def subscribe(self, callback, message_types=(StatusMessage,), coalesce=False):
+        subscription = Subscription(callback, tuple(message_types), coalesce)
+        with self.lock:
+            # Copy on write, publishing never has to hold the lock
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+
+    def subscribe_queue(self, message_types=(StatusMessage,), maxsize=0):
+        # For consumers that would rather block on a queue than be called back
+        message_queue = queue.Queue(maxsize=maxsize)
+        self.subscribe(message_queue.put, message_types=message_types)
+        return message_queue
 
     def send_message(self, status, component, message):
-        self.put({"status": status, "component": component, "message": message})
-        print(message)
+        message_type = InfoMessage if status == "info" else StatusMessage
+        self.publish(message_type(status, component, message))
+
+    def publish(self, message):
+        for subscription in self.subscriptions:
+            if not isinstance(message, subscription.message_types):
+                continue
+            if subscription.coalesce:
+                if subscription.last_status == message.status:
+                    continue
+                subscription.last_status = message.status
+            try:
+                subscription.callback(message)
+            except Exception as e:
+                print(f"Error delivering {message!r}: {e}")
+
+
+class MetricsSink:
+    # Counts messages per component and status and remembers the latest info from every component
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.latest_info = {}
+
+    def __call__(self, message):
+        self.counts[(message.component, message.status)] += 1
+        if isinstance(message, InfoMessage):
+            self.latest_info[message.component] = message.message
+
+    def snapshot(self):
+        return {"counts": dict(self.counts), "latest_info": dict(self.latest_info)}
+
+
+def log_sink(message):
+    print(message.message)
 
 
 # Example usage
 # whisper_queue = WhisperQueue()
-# whisper_queue.send_message("INFO", "This is a test message.")
\ No newline at end of file
+# whisper_queue.subscribe(lambda message: print(message.status))
+# whisper_queue.send_message("ready", "Example", "This is a test message.")
@@ -0,0 +1,24 @@
+"""
+Shared test setup: the repository root on sys.path for ``src``, and the stand-ins from
+benchmarks/fakes.py for PyAudio, keyboard, pyautogui and pyperclip, so no test touches the
+microphone, the keyboard or the clipboard.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fakes  # noqa: E402
+
+# Before any test module imports something from src
+audio_source, fake_keyboard, fake_screen = fakes.install()
+
+
+@pytest.fixture
+def clipboard():
+    fake_screen.clipboard.text = ""
+    return fake_screen.clipboard
@@ -0,0 +1,74 @@
+import numpy as np
+
+from src.audiobuffer import AudioRingBuffer
+
+
+def ramp(start, count):
+    return np.arange(start, start + count, dtype=np.float32)
+
+
+def test_idle_keeps_only_preroll():
+    buffer = AudioRingBuffer(sample_rate=100, preroll_seconds=1.0, initial_seconds=5)
+    for start in range(0, 1000, 30):
+        buffer.write(ramp(start, 30))
+    assert len(buffer) == 100
+    np.testing.assert_array_equal(buffer.snapshot(), ramp(920, 100))
+
+
+def test_capture_keeps_preroll_and_grows():
+    buffer = AudioRingBuffer(sample_rate=100, preroll_seconds=1.0, initial_seconds=5)
+    buffer.write(ramp(0, 250))
+    buffer.start_capture(keep_preroll=True)
+    early = buffer.snapshot()
+    for start in range(250, 2000, 50):
+        buffer.write(ramp(start, 50))
+    # Grown well past the initial capacity, views handed out earlier still hold their samples
+    np.testing.assert_array_equal(early, ramp(150, 100))
+    audio = buffer.stop_capture()
+    np.testing.assert_array_equal(audio, ramp(150, 1850))
+    assert len(buffer) == 0 and not buffer.recording
+
+
+def test_capture_without_preroll():
+    buffer = AudioRingBuffer(sample_rate=100, preroll_seconds=1.0)
+    buffer.write(ramp(0, 100))
+    buffer.start_capture(keep_preroll=False)
+    buffer.write(ramp(100, 10))
+    np.testing.assert_array_equal(buffer.stop_capture(), ramp(100, 10))
+
+
+def test_int16_is_normalized():
+    buffer = AudioRingBuffer(sample_rate=100)
+    buffer.start_capture(keep_preroll=False)
+    written = buffer.write(np.array([-32768, 0, 16384], dtype=np.int16))
+    np.testing.assert_array_equal(written, [-1.0, 0.0, 0.5])
+
+
+def test_spills_to_memory_map_past_budget():
+    # 1 MB of RAM holds 262144 float32 samples
+    buffer = AudioRingBuffer(sample_rate=16000, preroll_seconds=0, initial_seconds=1, ram_budget_mb=1)
+    buffer.start_capture(keep_preroll=False)
+    for start in range(0, 200000, 10000):
+        buffer.write(ramp(start, 10000))
+    assert not buffer.spilled
+    for start in range(200000, 400000, 10000):
+        buffer.write(ramp(start, 10000))
+    assert buffer.spilled
+    audio = buffer.stop_capture()
+    assert isinstance(audio.base, np.memmap) or isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, ramp(0, 400000))
+    # The next capture starts in RAM again
+    assert not buffer.spilled and not isinstance(buffer.data, np.memmap)
+
+
+def test_limit_drops_samples_beyond_max():
+    buffer = AudioRingBuffer(sample_rate=100, preroll_seconds=0, initial_seconds=1, max_seconds=3)
+    buffer.start_capture(keep_preroll=False)
+    buffer.write(ramp(0, 250))
+    assert not buffer.limit_reached
+    written = buffer.write(ramp(250, 100))
+    assert buffer.limit_reached
+    assert len(written) == 50
+    buffer.write(ramp(350, 100))
+    np.testing.assert_array_equal(buffer.stop_capture(), ramp(0, 300))
+    assert not buffer.limit_reached
@@ -0,0 +1,44 @@
+from src.localagreement import LocalAgreement
+
+
+def test_commits_words_two_hypotheses_agree_on():
+    agreement = LocalAgreement(commit_lag=1)
+    assert agreement.insert("the".split()) == []
+    # Agreed, and not the last word of the newest hypothesis
+    assert agreement.insert("the quick".split()) == ["the"]
+    assert agreement.insert("the quick".split()) == []
+    assert agreement.insert("the quick brown fox".split()) == ["quick"]
+    assert agreement.insert("the quick brown fox".split()) == ["brown"]
+    assert agreement.committed_text() == "the quick brown"
+
+
+def test_disagreement_stops_the_commit():
+    agreement = LocalAgreement(commit_lag=0)
+    agreement.insert("I scream for".split())
+    assert agreement.insert("ice cream for".split()) == []
+    assert agreement.insert("ice cream for you".split()) == ["ice", "cream", "for"]
+
+
+def test_committed_words_are_never_taken_back():
+    agreement = LocalAgreement(commit_lag=0)
+    agreement.insert("hello world".split())
+    assert agreement.insert("hello world".split()) == ["hello", "world"]
+    # A later hypothesis that rewrites typed words only adds what comes after them
+    assert agreement.insert("yellow world again".split()) == []
+    assert agreement.insert("yellow world again".split()) == ["again"]
+    assert agreement.committed == ["hello", "world", "again"]
+
+
+def test_commit_lag():
+    agreement = LocalAgreement(commit_lag=2)
+    agreement.insert("one two three four".split())
+    assert agreement.insert("one two three four".split()) == ["one", "two"]
+
+
+def test_flush_returns_the_rest_of_the_final_transcript():
+    agreement = LocalAgreement(commit_lag=1)
+    agreement.insert("testing one".split())
+    agreement.insert("testing one two".split())
+    assert agreement.flush("testing one two three.".split()) == ["two", "three."]
+    assert agreement.committed_text() == "testing one two three."
+    assert agreement.flush("testing".split()) == []
@@ -0,0 +1,146 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from src.pipeline import OutputChunk, TranscriptionPipeline, Utterance
+from src.texttyper import TextTyper
+from src.transcriber import Transcriber
+
+
+class ScriptedTranscriber(Transcriber):
+    # The "audio" of each utterance is the text to return, held back until release(text) is called
+    def __init__(self, blocked=()):
+        self.gates = collections.defaultdict(threading.Event)
+        for text in blocked:
+            self.gates[text].clear()
+        self.blocked = set(blocked)
+
+    def release(self, text):
+        self.gates[text].set()
+
+    def transcribe_audio(self, audio, trace=None):
+        if audio in self.blocked:
+            self.gates[audio].wait(5)
+        return audio
+
+    def set_backend(self, backend):
+        pass
+
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def make_pipeline():
+    pipelines = []
+
+    def make(transcriber, **kwargs):
+        idle = threading.Event()
+        typer = TextTyper(backend="recording", delay="none")
+        pipeline = TranscriptionPipeline(transcriber, typer, on_idle=idle.set, batch_size=1, **kwargs)
+        pipeline.idle = idle
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.stop()
+
+
+def typed(pipeline):
+    return pipeline.text_typer.backend.text()
+
+
+def test_output_follows_capture_order(make_pipeline):
+    pipeline = make_pipeline(ScriptedTranscriber())
+    first, second, third = (pipeline.next_sequence() for _ in range(3))
+    # Handed over out of order, and the newest one has live text early
+    pipeline.emit(OutputChunk(third, "live ", final=False))
+    pipeline.submit(Utterance(second, "second "))
+    pipeline.submit(Utterance(third, "third "))
+    pipeline.submit(Utterance(first, "first "))
+    assert pipeline.idle.wait(5)
+    assert typed(pipeline) == "first second live third "
+
+
+def test_submit_never_blocks_on_a_full_queue(make_pipeline):
+    transcriber = ScriptedTranscriber(blocked=["a "])
+    pipeline = make_pipeline(transcriber, max_pending=1)
+    texts = ["a ", "b ", "c ", "d ", "e "]
+    sequences = [pipeline.next_sequence() for _ in texts]
+    start = time.monotonic()
+    for sequence, text in zip(sequences, texts):
+        pipeline.submit(Utterance(sequence, text))
+    assert time.monotonic() - start < 0.5
+    transcriber.release("a ")
+    assert pipeline.idle.wait(5)
+    assert typed(pipeline) == "a b c d e "
+
+
+def test_submit_text_is_typed_in_line(make_pipeline):
+    transcriber = ScriptedTranscriber(blocked=["spoken "])
+    pipeline = make_pipeline(transcriber)
+    pipeline.submit(Utterance(pipeline.next_sequence(), "spoken "))
+    pipeline.submit_text("retyped ", safe=True)
+    transcriber.release("spoken ")
+    assert pipeline.idle.wait(5)
+    assert typed(pipeline) == "spoken retyped "
+
+
+def test_cancelled_capture_releases_its_place(make_pipeline):
+    pipeline = make_pipeline(ScriptedTranscriber())
+    abandoned = pipeline.next_sequence()
+    pipeline.submit(Utterance(pipeline.next_sequence(), "after "))
+    pipeline.cancel(abandoned)
+    assert pipeline.idle.wait(5)
+    assert typed(pipeline) == "after "
+
+
+def slow_typing(pipeline, seconds_per_char):
+    pipeline.text_typer.delay_policy = lambda char: seconds_per_char
+
+
+def wait_for_typing(pipeline, text, timeout=5):
+    deadline = time.monotonic() + timeout
+    while text not in typed(pipeline) and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_abort_stops_typing_and_drops_waiting_output(make_pipeline):
+    transcriber = ScriptedTranscriber(blocked=["waiting "])
+    pipeline = make_pipeline(transcriber)
+    slow_typing(pipeline, 0.02)
+    long_text = "word " * 100
+    pipeline.submit(Utterance(pipeline.next_sequence(), long_text))
+    pipeline.submit(Utterance(pipeline.next_sequence(), "waiting "))
+    wait_for_typing(pipeline, "word word ")
+    newest = pipeline.next_sequence()
+    assert pipeline.abort(before=newest)
+    transcriber.release("waiting ")
+    pipeline.submit(Utterance(newest, "new "))
+    assert pipeline.idle.wait(5)
+    text = typed(pipeline)
+    assert text.endswith("new ") and "waiting" not in text
+    assert len(text) < len(long_text)
+
+
+def test_hurry_types_the_rest_without_delays(make_pipeline):
+    pipeline = make_pipeline(ScriptedTranscriber())
+    slow_typing(pipeline, 0.05)
+    long_text = "word " * 40
+    pipeline.submit(Utterance(pipeline.next_sequence(), long_text))
+    wait_for_typing(pipeline, "word ")
+    start = time.monotonic()
+    assert pipeline.hurry()
+    assert pipeline.idle.wait(5)
+    assert time.monotonic() - start < 1.0
+    assert typed(pipeline) == long_text
+
+
+def test_abort_with_nothing_pending(make_pipeline):
+    pipeline = make_pipeline(ScriptedTranscriber())
+    pipeline.submit(Utterance(pipeline.next_sequence(), "done "))
+    assert pipeline.idle.wait(5)
+    assert not pipeline.abort(before=pipeline.next_sequence())
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from src.postprocessor import PhraseAutomaton, PostProcessor, build_post_processor, load_replacements
+
+
+def find_all(automaton, words):
+    # (start, length, value) of every phrase occurrence, overlapping ones included
+    found = []
+    state = 0
+    for index, word in enumerate(words):
+        state = automaton.step(state, word)
+        for length, value in automaton.matches(state):
+            found.append((index + 1 - length, length, value))
+    return sorted(found)
+
+
+def naive_find_all(phrases, words):
+    return sorted((start, len(phrase), value) for phrase, value in phrases.items()
+                  for start in range(len(words) - len(phrase) + 1) if tuple(words[start:start + len(phrase)]) == phrase)
+
+
+def build(phrases):
+    automaton = PhraseAutomaton()
+    for words, value in phrases.items():
+        automaton.add(list(words), value)
+    automaton.build()
+    return automaton
+
+
+def test_automaton_finds_overlapping_and_nested_phrases():
+    phrases = {("new",): "A", ("new", "line"): "B", ("line",): "C", ("a", "new", "line", "please"): "D"}
+    automaton = build(phrases)
+    words = "a new line please new line".split()
+    assert find_all(automaton, words) == naive_find_all(phrases, words)
+
+
+def test_automaton_matches_naive_search_on_random_text():
+    rng = random.Random(0)
+    vocabulary = ["a", "b", "c", "d"]
+    phrases = {tuple(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))): index for index in range(30)}
+    automaton = build(phrases)
+    for _ in range(50):
+        words = [rng.choice(vocabulary) for _ in range(40)]
+        assert find_all(automaton, words) == naive_find_all(phrases, words)
+
+
+def test_spoken_commands():
+    processor = PostProcessor(spoken_commands=True)
+    assert processor.process("Hello comma world period how are you question mark") == \
+        "Hello, world. How are you? "
+    assert processor.process("First line. New line, second line.") == "First line.\nSecond line. "
+    assert processor.process("Keep this. Drop this, delete that. End.") == "Keep this. End. "
+    assert processor.process("cap next word and all caps next nasa") == "Word and NASA "
+
+
+def test_replacements_take_precedence_and_match_longest():
+    processor = PostProcessor({"new line": "NEWLINE", "open ai": "OpenAI", "open": "Open!"}, spoken_commands=True)
+    assert processor.process("Open AI said new line.") == "OpenAI said NEWLINE. "
+    assert processor.process("open the door") == "Open! the door "
+
+
+def test_incremental_feeding_matches_whole_text():
+    processor = PostProcessor({"machine learning": "ML", "big data set": "big dataset"}, spoken_commands=True)
+    text = ("we use machine learning comma on a big data set period new paragraph "
+            "cap next machine learning delete that then big data set question mark")
+    expected = processor.process(text)
+    rng = random.Random(1)
+    words = text.split()
+    for _ in range(50):
+        session = processor.session()
+        typed = ""
+        position = 0
+        while position < len(words):
+            size = rng.randint(1, 4)
+            backspaces, chunk = session.feed(" ".join(words[position:position + size]) + " ",
+                                             final=position + size >= len(words))
+            typed = typed[:len(typed) - backspaces] + chunk
+            position += size
+        assert typed == expected
+
+
+def test_delete_that_reaches_into_the_previous_utterance():
+    processor = PostProcessor(spoken_commands=True)
+    # The history is the previous utterance as typed, removed as a whole
+    session = processor.session("Previous utterance. ")
+    backspaces, text = session.feed("delete that", final=True)
+    assert backspaces == len("Previous utterance. ")
+    assert text == ""
+
+
+def test_build_post_processor(tmp_path):
+    assert build_post_processor() is None
+    tsv = tmp_path / "words.tsv"
+    tsv.write_text("# comment\nkube\tKubernetes\n", encoding="utf-8")
+    processor = build_post_processor(replacements={"k eight s": "k8s"}, replacements_file=str(tsv))
+    assert processor.process("kube and k eight s") == "Kubernetes and k8s "
+    json_file = tmp_path / "words.json"
+    json_file.write_text('{"gee pee you": "GPU"}', encoding="utf-8")
+    assert load_replacements(str(json_file)) == {"gee pee you": "GPU"}
+
+
+@pytest.mark.parametrize("text", ["", "   "])
+def test_empty_text(text):
+    assert PostProcessor(spoken_commands=True).process(text) == ""
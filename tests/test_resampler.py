@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from src.resampler import BLOCK_SAMPLES, PolyphaseResampler, downmix, resample
+
+
+def noise(seconds, rate, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, int(seconds * rate)).astype(np.float32)
+
+
+@pytest.mark.parametrize("source_rate", [8000, 22050, 44100, 48000])
+def test_streaming_matches_bulk(source_rate):
+    audio = noise(1.5, source_rate)
+    bulk = resample(audio, source_rate)
+    resampler = PolyphaseResampler(source_rate)
+    sizes = np.random.default_rng(1).integers(1, 3000, size=len(audio))
+    blocks = []
+    position = 0
+    for size in sizes:
+        if position >= len(audio):
+            break
+        blocks.append(resampler.process(audio[position:position + size]))
+        position += size
+    np.testing.assert_allclose(np.concatenate(blocks), bulk, atol=1e-6)
+    assert len(bulk) == pytest.approx(len(audio) * 16000 / source_rate, abs=2)
+
+
+def test_long_input_goes_through_in_blocks():
+    audio = noise(3 * BLOCK_SAMPLES / 48000 + 0.01, 48000)
+    blocked = resample(audio, 48000)
+    resampler = PolyphaseResampler(48000)
+    whole = np.concatenate([resampler.process_block(audio[:len(audio) // 2]),
+                            resampler.process_block(audio[len(audio) // 2:])])
+    np.testing.assert_allclose(blocked, whole, atol=1e-6)
+
+
+def test_passes_tone_and_removes_alias():
+    rate = 48000
+    t = np.arange(rate) / rate
+    tone = resample(np.sin(2 * np.pi * 440 * t).astype(np.float32), rate)[1000:-1000]
+    # 12 kHz can't be represented at 16 kHz and has to be filtered out, not folded down to 4 kHz
+    alias = resample(np.sin(2 * np.pi * 12000 * t).astype(np.float32), rate)[1000:-1000]
+    assert np.sqrt(np.mean(tone ** 2)) == pytest.approx(np.sqrt(0.5), rel=0.02)
+    assert np.sqrt(np.mean(alias ** 2)) < 0.01
+
+
+def test_same_rate_is_unchanged():
+    audio = noise(0.1, 16000)
+    np.testing.assert_array_equal(resample(audio, 16000), audio)
+
+
+def test_reset_starts_a_new_stream():
+    audio = noise(0.2, 44100)
+    resampler = PolyphaseResampler(44100)
+    first = resampler.process(audio)
+    resampler.reset()
+    np.testing.assert_array_equal(resampler.process(audio), first)
+
+
+def test_downmix():
+    stereo = np.array([32767, -32768, 16384, 16384, 0], dtype=np.int16)
+    np.testing.assert_allclose(downmix(stereo, 2), [-0.5 / 32768, 0.5], atol=1e-6)
+    np.testing.assert_allclose(downmix(np.array([16384], dtype=np.int16), 1), [0.5])
+
+
+def test_recorder_stop_mode_converts_incrementally(monkeypatch):
+    import pyaudio
+    from src.recorder import Recorder
+
+    monkeypatch.setattr(pyaudio.PyAudio, "get_device_info_by_index", lambda self, index: {
+        "index": 0, "name": "48 kHz microphone", "maxInputChannels": 1, "defaultSampleRate": 48000.0})
+    recorder = Recorder(False, resample_mode="stop", vad=False)
+    try:
+        assert recorder.buffer_rate == 48000
+        recorder.reset_conversion()
+        capture = noise(2.0, 48000)
+        # Growing snapshots of the native capture, as a streaming session sees them
+        for end in range(4800, len(capture), 7000):
+            converted = recorder.convert_capture(capture[:end])
+            assert recorder.converted_samples == end
+            assert len(converted) == pytest.approx(end / 3, abs=2)
+        audio = recorder.convert_capture(capture, finish=True)
+        np.testing.assert_allclose(audio, resample(capture, 48000), atol=1e-6)
+    finally:
+        recorder.stream.close()
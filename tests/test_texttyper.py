@@ -0,0 +1,95 @@
+import pytest
+
+from src.texttyper import PASTE_KEYS, TextTyper, TypingJob, minimal_edit
+from src.typingbackends import RecordingBackend, TypingBackend
+
+
+def make_typer(**kwargs):
+    return TextTyper(backend="recording", delay="none", **kwargs)
+
+
+def test_backend_must_implement_sending():
+    with pytest.raises(TypeError):
+        TypingBackend()
+
+
+def test_type_text():
+    typer = make_typer()
+    assert isinstance(typer.backend, RecordingBackend)
+    assert typer.type_text("Hello world. ") == 13
+    assert typer.backend.text() == "Hello world. "
+    assert typer.backend.metrics.as_dict()["characters"] == 13
+
+
+def test_type_text_stops_when_cancelled():
+    typer = make_typer()
+    job = TypingJob()
+    job.cancel()
+    assert typer.type_text("never typed", job=job) == 0
+    assert typer.backend.text() == ""
+
+
+def test_delete_text():
+    typer = make_typer()
+    typer.type_text("one two three")
+    typer.delete_text(6)
+    assert typer.backend.text() == "one two"
+
+
+@pytest.mark.parametrize("old, new", [
+    ("the cat sat on the mat ", "the hat sat on the mat "),
+    ("I scream ", "ice cream "),
+    ("hello world ", "hello world, again "),
+    ("a b c d e f ", "a b "),
+])
+def test_correct_text(old, new):
+    typer = make_typer()
+    typer.type_text(old)
+    assert typer.correct_text(old, new, typer.checkpoint()) == "corrected"
+    assert typer.backend.text() == new
+
+
+def test_correct_text_skips_after_other_output():
+    typer = make_typer()
+    typer.type_text("draft ")
+    checkpoint = typer.checkpoint()
+    typer.type_text("more ")
+    assert typer.correct_text("draft ", "final ", checkpoint) == "skipped"
+    assert typer.backend.text() == "draft more "
+    assert typer.correct_text("same ", "same ", checkpoint) == "unchanged"
+
+
+def test_paste_restores_clipboard(clipboard):
+    typer = make_typer(output_mode="paste", paste_threshold=5, restore_delay=0)
+    clipboard.copy("previous")
+    pasted = []
+    send_hotkey = typer.backend.send_hotkey
+    typer.backend.send_hotkey = lambda keys: (pasted.append(clipboard.paste()), send_hotkey(keys))
+    assert typer.type_text("pasted text") == len("pasted text")
+    assert pasted == ["pasted text"]
+    assert typer.backend.events[-1][1:] == ("hotkey", PASTE_KEYS)
+    assert clipboard.paste() == "previous"
+    # Shorter than the threshold, typed instead
+    typer.type_text("hi")
+    assert typer.backend.text() == "hi"
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", "new text "),
+    ("same words ", "same words "),
+    ("the quick brown fox ", "the quick red fox "),
+    ("one two three four five ", "zero two three four five "),
+    ("keep this ", ""),
+    ("Hello world. ", "Hello, world. "),
+])
+def test_minimal_edit(old, new):
+    left, backspaces, insert = minimal_edit(old, new)
+    cursor = len(old) - left
+    assert old[:cursor - backspaces] + insert + old[cursor:] == new
+
+
+def test_minimal_edit_keeps_matching_words():
+    left, backspaces, insert = minimal_edit("the quick brown fox ", "the quick red fox ")
+    # The unchanged start is never retyped
+    assert backspaces + len(insert) <= len("brown fox ") + len("red fox ")
+    assert not insert.startswith("the")
@@ -0,0 +1,46 @@
+import numpy as np
+
+from src.vad import IncrementalVad
+
+RATE = 16000
+
+
+def noise(seconds, level, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(seconds * RATE)) * level).astype(np.float32)
+
+
+def segments(audio, block=320):
+    vad = IncrementalVad(RATE)
+    for start in range(0, len(audio), block):
+        vad.process(audio[start:start + block])
+    return vad.speech_segments(0, vad.received)
+
+
+def test_speech_from_the_first_frame_is_detected():
+    # Starts loud right away, at varying levels, nothing quiet to learn the background from first
+    levels = np.repeat(np.random.default_rng(1).uniform(0.02, 0.1, 50), RATE // 25)
+    audio = np.concatenate([noise(2, 1.0) * levels, noise(1, 0.0005, seed=2)])
+    found = segments(audio)
+    assert found and found[0][0] == 0
+    assert found[-1][1] >= 2 * RATE - RATE // 10
+
+
+def test_speech_after_silence():
+    audio = np.concatenate([noise(1, 0.0005), noise(1, 0.05, seed=1), noise(1, 0.0005, seed=2)])
+    found = segments(audio)
+    assert len(found) == 1
+    start, end = found[0]
+    assert abs(start - RATE) < RATE // 20
+    assert abs(end - 2 * RATE) < RATE // 2
+
+
+def test_noisy_microphone_is_learned():
+    # Background above the initial floor counts as speech at first, the floor catches up within seconds
+    audio = np.concatenate([noise(10, 0.006), noise(1, 0.1, seed=1), noise(2, 0.006, seed=2)])
+    found = segments(audio)
+    assert found[-1][0] >= 9.5 * RATE
+    assert found[-1][1] <= 11.5 * RATE
+
+
+def test_silence_has_no_segments():
+    assert segments(noise(2, 0.0003)) == []
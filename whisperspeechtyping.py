@@ -1,18 +1,30 @@
+from src.startupprofile import startup_profiler
 import signal
-import time
 import sys
+import threading
 
-from PySide6.QtWidgets import QApplication
+with startup_profiler.phase("import PySide6"):
+    from PySide6.QtWidgets import QApplication
 from src.configmanager import ConfigManager
-from src.hotkeyhandler import HotkeyHandler
-from src.localtranscriber import LocalTranscriber
-from src.recorder import Recorder
-from src.texttyper import TextTyper
 from src.whisperqueue import WhisperQueue
-import threading
 import gc
-from src.systemtray import SystemTrayApp
-from src.floatwindow import FloatWindow
+with startup_profiler.phase("import UI"):
+    from src.systemtray import SystemTrayApp
+    from src.floatwindow import FloatWindow
+
+
+# Settings the running components pick up in place
+LIVE_SETTINGS = {'hotkey', 'type_hotkey', 'cancel_hotkey', 'new_recording_policy', 'language', 'output_mode', 'paste_threshold', 'typing_backend',
+                 'typing_delay', 'stream_idle_minutes',
+                 'model_idle_minutes', 'batch_size', 'batch_wait', 'live_commit_lag', 'spoken_commands',
+                 'replacements', 'replacements_file', 'model_cache_mb'}
+# Need a new transcriber (and maybe a model load), the microphone and hotkeys keep running
+TRANSCRIBER_SETTINGS = {'model_size', 'device', 'compute_type', 'draft_compute_type', 'autotune', 'backend',
+                        'server_socket'}
+# Only read when the components are created, changing them restarts everything
+RESTART_SETTINGS = {'buffer', 'preroll_seconds', 'recorder_vad', 'streaming', 'live_typing', 'max_pending',
+                    'trace_file', 'draft_model_size', 'input_device', 'block_ms', 'resample_mode',
+                    'capture_ram_mb', 'max_capture_minutes'}
 
 
 class WhisperTypingApp(QApplication):
@@ -26,7 +38,7 @@ class WhisperTypingApp(QApplication):
         self.floating_window = FloatWindow(config_manager=self.config_manager, minimize_callback=self.switch_gui,
                                            close_callback=self.close_application, switch_ui_callback=self.switch_gui)
         self.system_tray = SystemTrayApp(message_queue=self.message_queue, config_manager=self.config_manager,
-                                         restart_callback=self.restart, start_stop_callback=self.start_stop_typing,
+                                         start_stop_callback=self.start_stop_typing,
                                          close_callback=self.close_application, switch_ui_callback=self.switch_gui)
         if self.config_manager.get_setting('active_gui') == 'floating':
             self.active_gui = self.floating_window
@@ -34,15 +46,83 @@ class WhisperTypingApp(QApplication):
             self.active_gui = self.system_tray
 
         self.active_gui.show()
-        self.display_thread = threading.Thread(target=self.display_state)
-        self.display_thread.start()
+        startup_profiler.mark("UI shown")
+        # Status changes arrive as callbacks and are handed to the GUI thread through Qt signals
+        self.status_subscription = self.message_queue.subscribe(self.display_state, coalesce=True)
+        self.init_thread = None
+        # Saved settings are applied to the running components, see apply_settings
+        self.settings_subscription = self.config_manager.subscribe(
+            self.apply_settings, keys=LIVE_SETTINGS | TRANSCRIBER_SETTINGS | RESTART_SETTINGS)
         self.start_typing()
-        self.message_queue.send_message("ready", "SystemTray", "Application initialized.")
 
 
     def load_and_initialize_components(self):
+        # Runs on a background thread, the heavy modules are imported here and not at startup
+        with startup_profiler.phase("import components"):
+            from src.activitymonitor import ActivityMonitor
+            from src.hotkeyhandler import HotkeyHandler
+            # Used by the create_ methods, imported here so their cost shows up in the startup profile
+            import src.localtranscriber
+            import src.postprocessor
+            from src.recorder import Recorder
+            from src.texttyper import TextTyper
+
         # Load and initialize components
-        # Access model size, device, language, and buffer settings from config
+        buffer = self.config_manager.get_setting('buffer')
+        preroll_seconds = self.config_manager.get_setting('preroll_seconds')
+        recorder_vad = self.config_manager.get_setting('recorder_vad')
+        draft_model_size = self.config_manager.get_setting('draft_model_size')
+
+        with startup_profiler.phase("open microphone"):
+            self.recorder = Recorder(buffer=buffer, message_queue=self.message_queue,
+                                     preroll_seconds=preroll_seconds, vad=recorder_vad,
+                                     input_device=self.config_manager.get_setting('input_device'),
+                                     block_ms=self.config_manager.get_setting('block_ms'),
+                                     resample_mode=self.config_manager.get_setting('resample_mode'),
+                                     ram_budget_mb=self.config_manager.get_setting('capture_ram_mb'),
+                                     max_capture_minutes=self.config_manager.get_setting('max_capture_minutes'))  # Pass buffer setting
+        # The model loads on its own thread, presses are captured and queued until it is ready
+        self.transcriber = self.create_transcriber()
+        # Drafts are only corrected if the user hasn't typed since, which needs watching the keyboard
+        activity_monitor = ActivityMonitor() if draft_model_size else None
+        self.texttyper = TextTyper(output_mode=self.config_manager.get_setting('output_mode'),
+                                   paste_threshold=self.config_manager.get_setting('paste_threshold'),
+                                   activity_monitor=activity_monitor,
+                                   backend=self.config_manager.get_setting('typing_backend'),
+                                   delay=self.config_manager.get_setting('typing_delay'))
+
+        # Initialize HotkeyHandler with start and stop capabilities
+        self.hotkey_handler = HotkeyHandler(hotkey=self.config_manager.get_setting('hotkey'),
+                                            retype_hotkey=self.config_manager.get_setting('type_hotkey'),
+                                            cancel_hotkey=self.config_manager.get_setting('cancel_hotkey'),
+                                            new_recording_policy=self.config_manager.get_setting('new_recording_policy'),
+                                            recorder=self.recorder,
+                                            transcriber=self.transcriber,
+                                            texttyper=self.texttyper,
+                                            message_queue=self.message_queue,
+                                            streaming=self.config_manager.get_setting('streaming'),
+                                            live_typing=self.config_manager.get_setting('live_typing'),
+                                            live_commit_lag=self.config_manager.get_setting('live_commit_lag'),
+                                            max_pending=self.config_manager.get_setting('max_pending'),
+                                            trace_file=self.config_manager.get_setting('trace_file'),
+                                            stream_idle_minutes=self.config_manager.get_setting('stream_idle_minutes'),
+                                            model_idle_minutes=self.config_manager.get_setting('model_idle_minutes'),
+                                            batch_size=self.config_manager.get_setting('batch_size'),
+                                            batch_wait=self.config_manager.get_setting('batch_wait'),
+                                            post_processor=self.create_post_processor())
+        startup_profiler.mark("hotkeys armed")
+        if startup_profiler.enabled:
+            self.transcriber.resume()
+            startup_profiler.mark("model ready")
+            print(startup_profiler.report())
+
+
+    def create_transcriber(self):
+        from src.autotuner import tuned_settings
+        from src.localtranscriber import LocalTranscriber
+        from src.modelregistry import model_registry
+
+        # Access model size, device and language settings from config
         model_size = self.config_manager.get_setting('model_size')
         device = self.config_manager.get_setting('device')
         if device == 'gpu':
@@ -50,50 +130,112 @@ class WhisperTypingApp(QApplication):
         # will need to be re-implemented if other backends are added
 
         language = self.config_manager.get_setting('language')
-        buffer = self.config_manager.get_setting('buffer')
         compute_type = self.config_manager.get_setting('compute_type')
+        cpu_threads, num_workers = 0, 1
+        tuned = tuned_settings(self.config_manager, model_size, device)
+        if tuned is not None:
+            # Found by the autotuner for this model on this machine
+            compute_type, cpu_threads, num_workers = tuned['compute_type'], tuned['cpu_threads'], tuned['num_workers']
 
-        self.recorder = Recorder(buffer=buffer, message_queue=self.message_queue)  # Pass buffer setting
-        self.transcriber = LocalTranscriber(
+        if self.config_manager.get_setting('backend') == 'remote':
+            # The model lives in a separate transcription server process, only imported when used
+            from src.remotetranscriber import RemoteTranscriber
+            try:
+                return RemoteTranscriber(language=language, socket_path=self.config_manager.get_setting('server_socket'),
+                                         message_queue=self.message_queue)
+            except RuntimeError as e:
+                self.message_queue.send_message("info", "WhisperTypingApp", f"{e}, loading the model locally")
+        # Models stay cached across restarts, only the budget is taken from the settings
+        model_registry.set_memory_budget(self.config_manager.get_setting('model_cache_mb'))
+        return LocalTranscriber(
             model_size=model_size, compute_type=compute_type, language=language, device=device,
-            message_queue=self.message_queue
+            message_queue=self.message_queue, cpu_threads=cpu_threads, num_workers=num_workers,
+            vad_filter=not self.config_manager.get_setting('recorder_vad'),
+            draft_model_size=self.config_manager.get_setting('draft_model_size'),
+            draft_compute_type=self.config_manager.get_setting('draft_compute_type')
         )  # Pass model settings
-        self.texttyper = TextTyper()
-
-        # Initialize HotkeyHandler with start and stop capabilities
-        self.hotkey_handler = HotkeyHandler(hotkey=self.config_manager.get_setting('hotkey'),
-                                            retype_hotkey=self.config_manager.get_setting('type_hotkey'),
-                                            recorder=self.recorder,
-                                            transcriber=self.transcriber,
-                                            texttyper=self.texttyper,
-                                            message_queue=self.message_queue)
 
+    def create_post_processor(self):
+        from src.postprocessor import build_post_processor
 
-    def display_state(self):
-        while not self.quitting:
-            if self.message_queue.qsize() > 0:
-                message = self.message_queue.get()
-                status = message["status"]
+        try:
+            return build_post_processor(spoken_commands=self.config_manager.get_setting('spoken_commands'),
+                                        replacements=self.config_manager.get_setting('replacements'),
+                                        replacements_file=self.config_manager.get_setting('replacements_file'))
+        except (OSError, ValueError) as e:
+            self.message_queue.send_message("info", "WhisperTypingApp", f"Could not load the replacements: {e}")
+            return None
 
-                # Mapping of status to icon names
-                status_to_icon = {
-                    "recording": "wsp_record",
-                    "ready": "wsp_ready",
-                    "typing": "wsp_type",
-                    "transcribing": "wsp_wait",
-                    "starting": "wsp_wait",
-                    "stopping": "wsp_wait",
-                    "loading": "wsp_wait",
-                    "disabled": "wsp_disabled"
-                }
+    def apply_settings(self, changes):
+        # Called by the ConfigManager with the settings that changed, only what they affect is rebuilt
+        if not self.enabled:
+            # Read from the settings when typing is enabled again
+            return
+        if self.init_thread is not None:
+            self.init_thread.join()
+        if changes.keys() & RESTART_SETTINGS:
+            self.restart()
+            return
+        if changes.keys() & TRANSCRIBER_SETTINGS:
+            # The microphone stream and the hotkeys keep running, the old model stays in the cache
+            previous = self.transcriber
+            self.transcriber = self.create_transcriber()
+            self.hotkey_handler.set_transcriber(self.transcriber)
+            previous.stop()
+        if changes.keys() & {'hotkey', 'type_hotkey', 'cancel_hotkey'}:
+            self.hotkey_handler.set_hotkeys(self.config_manager.get_setting('hotkey'),
+                                            self.config_manager.get_setting('type_hotkey'),
+                                            self.config_manager.get_setting('cancel_hotkey'))
+        if 'new_recording_policy' in changes:
+            self.hotkey_handler.new_recording_policy = changes['new_recording_policy']
+        if 'language' in changes:
+            self.transcriber.language = changes['language']
+        if 'output_mode' in changes or 'paste_threshold' in changes:
+            self.texttyper.output_mode = self.config_manager.get_setting('output_mode')
+            self.texttyper.paste_threshold = self.config_manager.get_setting('paste_threshold')
+        if 'typing_backend' in changes:
+            from src.typingbackends import create_typing_backend
+            # Picked up by the next chunk the pipeline types
+            self.texttyper.backend = create_typing_backend(changes['typing_backend'])
+        if 'typing_delay' in changes:
+            from src.typingbackends import create_delay_policy
+            self.texttyper.delay_policy = create_delay_policy(changes['typing_delay'])
+        if 'stream_idle_minutes' in changes or 'model_idle_minutes' in changes:
+            self.hotkey_handler.idle_manager.set_timeouts(self.config_manager.get_setting('stream_idle_minutes'),
+                                                          self.config_manager.get_setting('model_idle_minutes'))
+        if 'batch_size' in changes or 'batch_wait' in changes:
+            self.hotkey_handler.pipeline.batch_size = max(self.config_manager.get_setting('batch_size'), 1)
+            self.hotkey_handler.pipeline.batch_wait = self.config_manager.get_setting('batch_wait')
+        if 'live_commit_lag' in changes:
+            self.hotkey_handler.live_commit_lag = changes['live_commit_lag']
+        if 'model_cache_mb' in changes:
+            from src.modelregistry import model_registry
+            # Evicts cached models right away if the cache is now over the budget
+            model_registry.set_memory_budget(changes['model_cache_mb'])
+        if changes.keys() & {'spoken_commands', 'replacements', 'replacements_file'}:
+            # Swapped between two chunks, an utterance being typed keeps its session
+            self.hotkey_handler.pipeline.post_processor = self.create_post_processor()
+        self.message_queue.send_message("info", "WhisperTypingApp", f"Applied settings: {', '.join(sorted(changes))}")
 
-                # Default icon name if the status is not found in the dictionary
-                icon_name = status_to_icon.get(status, "wsp_disabled")
+    def display_state(self, message):
+        # Mapping of status to icon names
+        status_to_icon = {
+            "recording": "wsp_record",
+            "ready": "wsp_ready",
+            "typing": "wsp_type",
+            "transcribing": "wsp_wait",
+            "starting": "wsp_wait",
+            "stopping": "wsp_wait",
+            "loading": "wsp_wait",
+            "limit": "wsp_wait",
+            "disabled": "wsp_disabled"
+        }
 
-                self.floating_window.status_updated.emit(icon_name, status)
-                self.system_tray.status_updated.emit(icon_name, status)
+        # Default icon name if the status is not found in the dictionary
+        icon_name = status_to_icon.get(message.status, "wsp_disabled")
 
-            time.sleep(0.1)
+        self.floating_window.status_updated.emit(icon_name, message.status)
+        self.system_tray.status_updated.emit(icon_name, message.status)
 
     def switch_gui(self):
         self.active_gui.hide()
@@ -116,13 +258,16 @@ class WhisperTypingApp(QApplication):
             self.start_typing()
 
     def start_typing(self):
-        # TODO: start transcriber
-        self.load_and_initialize_components()
+        self.message_queue.send_message("loading", "WhisperTypingApp", "Starting speech typing...")
+        # Keeps the UI responsive, HotkeyHandler reports "ready" once the hotkeys are armed
+        self.init_thread = threading.Thread(target=self.load_and_initialize_components, name="startup", daemon=True)
+        self.init_thread.start()
         print("Speech typing started.")
         self.enabled = True
 
     def stop_typing(self):
-        # TODO:stop transcriber
+        if self.init_thread is not None:
+            self.init_thread.join()
         self.hotkey_handler.stop()
 
         self.transcriber.stop()
@@ -133,10 +278,13 @@ class WhisperTypingApp(QApplication):
     def close_application(self):
         self.stop_typing()
         self.quitting = True
-        time.sleep(.6)
+        self.message_queue.unsubscribe(self.status_subscription)
+        self.config_manager.unsubscribe(self.settings_subscription)
         self.quit()
 
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        startup_profiler.enabled = True
     app = WhisperTypingApp()
     sys.exit(app.exec_())
@@ -1,26 +1,184 @@
+from src.startupprofile import startup_profiler
+from src.serversocket import DEFAULT_SOCKET_PATH, require_unix_sockets
 import argparse
-from src.recorder import Recorder
-from src.localtranscriber import LocalTranscriber
-from src.texttyper import TextTyper
-from src.hotkeyhandler import HotkeyHandler
 
 if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Voice typing script.')
         parser.add_argument('--model_size', type=str, default='medium', help='Size of the Whisper model')
         parser.add_argument('--device', type=str, default='cuda', help='Device to run the Whisper model on')
-        parser.add_argument('--compute_type', type=str, default='float16', help='Compute datatype for the Whisper model')
+        parser.add_argument('--compute_type', type=str, default='float16',
+                            help='Compute datatype for the Whisper model, "auto" uses the --autotune result for this machine')
         parser.add_argument('--language', type=str, default='en', help='Language for the Whisper model')
         parser.add_argument('--hotkey', type=str, default='f4', help='Hotkey to start/stop audio capture')
         parser.add_argument('--type_hotkey', type=str, default='f2', help='Hotkey to just type the transcription')
+        parser.add_argument('--cancel_hotkey', type=str, default='f8',
+                            help='Hotkey to stop typing and drop the text that is still waiting (empty to disable)')
+        parser.add_argument('--new_recording_policy', type=str, default='queue', choices=['queue', 'finish_fast', 'abort'],
+                            help='What happens to text still being typed when a new recording starts')
         parser.add_argument('--no-buffer', action='store_false', dest='buffer', default=True,
                             help='Do not buffer one second of audio before hotkey is pressed. May reduce power usage at the expense of potentially losing audio at the beginning.')
+        parser.add_argument('--input_device', type=str, default=None,
+                            help='Index or part of the name of the microphone to record from (default: system default)')
+        parser.add_argument('--list_devices', action='store_true', default=False,
+                            help='List the microphones with their native sample rate and exit')
+        parser.add_argument('--block_ms', type=int, default=20,
+                            help='Milliseconds of audio per microphone callback, smaller blocks reach the recorder sooner')
+        parser.add_argument('--resample_mode', type=str, default='callback', choices=['callback', 'stop'],
+                            help='Convert non-16 kHz microphones block by block while recording or all at once at release')
+        parser.add_argument('--capture_ram_mb', type=float, default=32,
+                            help='Audio of longer recordings is kept in a temporary file beyond this many MB and transcribed at pauses')
+        parser.add_argument('--max_capture_minutes', type=float, default=30,
+                            help='Recordings end automatically after this many minutes (0 for no limit)')
+        parser.add_argument('--preroll_seconds', type=float, default=1.0, help='Seconds of audio kept from before the hotkey is pressed when buffering')
+        parser.add_argument('--no-recorder-vad', action='store_false', dest='recorder_vad', default=True,
+                            help='Do not detect speech while recording, let faster_whisper run its VAD after release instead.')
+        parser.add_argument('--streaming', action='store_true', default=False,
+                            help='Transcribe while the hotkey is still held so only the last few seconds are decoded after release.')
+        parser.add_argument('--live_typing', action='store_true', default=False,
+                            help='Type words while still speaking, as soon as consecutive partial transcriptions agree on them.')
+        parser.add_argument('--live_commit_lag', type=int, default=1,
+                            help='Number of agreed trailing words held back before typing them in live typing mode')
+        parser.add_argument('--output_mode', type=str, default='type', choices=['type', 'paste'],
+                            help='Type the transcription key by key or paste it through the clipboard')
+        parser.add_argument('--paste_threshold', type=int, default=0,
+                            help='In paste mode, transcriptions shorter than this many characters are still typed')
+        parser.add_argument('--typing_backend', type=str, default='pyautogui', choices=['pyautogui', 'xtest', 'auto'],
+                            help='How keystrokes are sent, xtest sends a whole text in one batch on X11 (needs python-xlib)')
+        parser.add_argument('--typing_delay', type=str, default='human', choices=['human', 'none'],
+                            help='Human-like pauses between keystrokes, or none to type as fast as the backend allows')
+        parser.add_argument('--trace_file', type=str, default='traces.jsonl',
+                            help='Append per-utterance latency traces to this JSONL file (empty to disable)')
+        parser.add_argument('--stream_idle_minutes', type=float, default=10,
+                            help='Stop the always-on microphone stream after this many idle minutes (0 to never stop)')
+        parser.add_argument('--model_idle_minutes', type=float, default=30,
+                            help='Unload the model after this many idle minutes, it is reloaded on the next press (0 to keep it loaded)')
+        parser.add_argument('--draft_model_size', type=str, default=None,
+                            help='Type a fast transcript from this smaller model first, then correct it with --model_size')
+        parser.add_argument('--draft_compute_type', type=str, default='int8', help='Compute datatype for the draft model')
+        parser.add_argument('--batch_size', type=int, default=4,
+                            help='Maximum number of waiting recordings transcribed together in one batch')
+        parser.add_argument('--batch_wait', type=float, default=0.0,
+                            help='Seconds to wait for more recordings before transcribing a batch (0 never delays a single recording)')
+        parser.add_argument('--spoken_commands', action='store_true', default=False,
+                            help='Turn spoken "new line", "period", "comma", "delete that", "cap next" ... into text and edits')
+        parser.add_argument('--replacements', type=str, default=None,
+                            help='JSON object or tab-separated file of spoken phrases and the text to type instead')
+        parser.add_argument('--backend', type=str, default='local', choices=['local', 'remote'],
+                            help='Load the model in this process or use a running transcription server')
+        parser.add_argument('--server_socket', type=str, default=DEFAULT_SOCKET_PATH,
+                            help='Unix domain socket of the transcription server')
+        parser.add_argument('--serve', action='store_true', default=False,
+                            help='Run a transcription server with the given model settings instead of typing')
+        parser.add_argument('--files', nargs='+', default=None,
+                            help='Transcribe these audio files to JSONL instead of typing')
+        parser.add_argument('--dir', type=str, default=None,
+                            help='Transcribe all audio files in this directory (recursively) to JSONL instead of typing')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes for --files/--dir, each loads its own model')
+        parser.add_argument('--cpu_threads', type=int, default=0,
+                            help='CPU threads per worker for --files/--dir (0: the --autotune result with one worker, '
+                                 'otherwise the cores split between the workers)')
+        parser.add_argument('--output', type=str, default=None, help='JSONL file for --files/--dir results (default: stdout)')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help='Skip files that already have a result in --output')
+        parser.add_argument('--autotune', action='store_true', default=False,
+                            help='Find the fastest compute type, CPU threads and workers for --model_size on this machine and save them to settings.json')
+        parser.add_argument('--autotune_clip', type=str, default=None,
+                            help='Recording to autotune on, needed to compare accuracy (default: a synthetic clip, speed only)')
+        parser.add_argument('--autotune_tolerance', type=float, default=0.05,
+                            help='Highest word error rate against the float32 transcript a tuned setting may have')
+        parser.add_argument('--profile-startup', action='store_true', dest='profile_startup', default=False,
+                            help='Print how long imports and initialization took once the model is ready')
         args = parser.parse_args()
+        startup_profiler.enabled = args.profile_startup
+        if args.serve or args.backend == 'remote':
+            try:
+                require_unix_sockets()
+            except RuntimeError as e:
+                parser.error(str(e))
 
-        recorder = Recorder(buffer=args.buffer)
-        transcriber = LocalTranscriber(model_size=args.model_size, compute_type=args.compute_type, language=args.language, device=args.device)
-        text_typer = TextTyper()
-        hotkey_handler = HotkeyHandler(hotkey=args.hotkey, retype_hotkey=args.type_hotkey, recorder=recorder, transcriber=transcriber, texttyper=text_typer)
+        if args.list_devices:
+            from src.recorder import list_input_devices
+            for device in list_input_devices():
+                print(f"{device['index']}: {device['name']} ({device['channels']} ch, {device['rate']} Hz)")
+            raise SystemExit(0)
+
+        if args.autotune:
+            from src.autotuner import autotune, save_tuning
+            from src.configmanager import ConfigManager
+            result, _ = autotune(args.model_size, args.device, language=args.language, clip=args.autotune_clip,
+                                 tolerance=args.autotune_tolerance)
+            save_tuning(ConfigManager(), args.model_size, args.device, result)
+            raise SystemExit(0)
+
+        # Like the GUI, the --autotune result for this model and machine is used wherever a model is loaded
+        from src.autotuner import default_compute_type, tuned_settings
+        from src.configmanager import ConfigManager
+        tuned = tuned_settings(ConfigManager(), args.model_size, args.device)
+        if args.compute_type == 'auto':
+            if tuned is None:
+                print(f"{args.model_size} is not tuned for this machine yet, run with --autotune")
+                args.compute_type = default_compute_type(args.device)
+            else:
+                args.compute_type = tuned['compute_type']
+        cpu_threads, num_workers = 0, 1
+        if tuned is not None and tuned['compute_type'] == args.compute_type:
+            # Threads and workers were tuned for that compute type, not for whatever --compute_type says
+            cpu_threads, num_workers = tuned['cpu_threads'], tuned['num_workers']
+
+        if args.serve:
+            from src.transcriptionserver import serve
+            serve(args.model_size, args.compute_type, args.language, args.device, socket_path=args.server_socket,
+                  cpu_threads=cpu_threads, num_workers=num_workers)
+            raise SystemExit(0)
+
+        if args.files or args.dir:
+            from src.bulktranscriber import find_audio_files, run_bulk
+            # The tuned threads are for one model on the whole machine, several workers split the cores instead
+            bulk_threads = args.cpu_threads or (cpu_threads if args.workers == 1 else 0)
+            run_bulk(find_audio_files(args.files, args.dir), args.model_size, args.compute_type, args.language,
+                     args.device, workers=args.workers, cpu_threads=bulk_threads, output=args.output,
+                     resume=args.resume)
+            raise SystemExit(0)
+
+        with startup_profiler.phase("import components"):
+            from src.recorder import Recorder
+            from src.localtranscriber import LocalTranscriber
+            from src.texttyper import TextTyper
+            from src.activitymonitor import ActivityMonitor
+            from src.hotkeyhandler import HotkeyHandler
+            from src.postprocessor import build_post_processor
+
+        with startup_profiler.phase("open microphone"):
+            recorder = Recorder(buffer=args.buffer, preroll_seconds=args.preroll_seconds, vad=args.recorder_vad,
+                                input_device=args.input_device, block_ms=args.block_ms,
+                                resample_mode=args.resample_mode, ram_budget_mb=args.capture_ram_mb,
+                                max_capture_minutes=args.max_capture_minutes)
+        # The model loads on its own thread, presses are captured and queued until it is ready
+        if args.backend == 'remote':
+            from src.remotetranscriber import RemoteTranscriber
+            transcriber = RemoteTranscriber(language=args.language, socket_path=args.server_socket)
+        else:
+            transcriber = LocalTranscriber(model_size=args.model_size, compute_type=args.compute_type, language=args.language, device=args.device, vad_filter=not args.recorder_vad,
+                                           cpu_threads=cpu_threads, num_workers=num_workers,
+                                           draft_model_size=args.draft_model_size, draft_compute_type=args.draft_compute_type)
+        activity_monitor = ActivityMonitor() if args.draft_model_size else None
+        text_typer = TextTyper(output_mode=args.output_mode, paste_threshold=args.paste_threshold,
+                               activity_monitor=activity_monitor, backend=args.typing_backend,
+                               delay=args.typing_delay)
+        post_processor = build_post_processor(spoken_commands=args.spoken_commands, replacements_file=args.replacements)
+        hotkey_handler = HotkeyHandler(hotkey=args.hotkey, retype_hotkey=args.type_hotkey, recorder=recorder, transcriber=transcriber, texttyper=text_typer, streaming=args.streaming,
+                                       live_typing=args.live_typing, live_commit_lag=args.live_commit_lag,
+                                       trace_file=args.trace_file, stream_idle_minutes=args.stream_idle_minutes,
+                                       model_idle_minutes=args.model_idle_minutes, batch_size=args.batch_size,
+                                       batch_wait=args.batch_wait, post_processor=post_processor,
+                                       cancel_hotkey=args.cancel_hotkey,
+                                       new_recording_policy=args.new_recording_policy)
+        startup_profiler.mark("hotkeys armed")
+        if args.profile_startup:
+            transcriber.resume()
+            startup_profiler.mark("model ready")
+            print(startup_profiler.report())
 
         hotkey_handler.main()
     except Exception as e: